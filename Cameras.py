@@ -1,33 +1,723 @@
-import cv2
 import customtkinter as ctk
-from PIL import Image, ImageTk
+import tkinter as tk
+from PIL import Image, ImageTk, ImageDraw, ImageEnhance
 import json
 import os
+import importlib
+import importlib.util
+import asyncio
 import threading
 import time
 import socket
 import queue
-import requests
-from requests.auth import HTTPDigestAuth
+import warnings
+import heapq
+import bisect
+import itertools
+import random
+import multiprocessing
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import shared_memory
+try:
+    import psutil  # (opcional): RSS do processo nas métricas fora do Linux
+except ImportError:
+    psutil = None
 # Configuração de baixa latência para OpenCV/FFMPEG
 os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = "rtsp_transport;tcp;stimeout;5000000;buffer_size;2048000;analyzeduration;100000;probesize;100000;fflags;discardcorrupt;max_delay;500000;reorder_queue_size;16;rtsp_flags;prefer_tcp;reconnect;1;reconnect_streamed;1;reconnect_at_eof;1"
-cv2.setNumThreads(1)
+
+class _ModuloAdiado:
+    """Importa o módulo só no primeiro acesso a um atributo e então se substitui pelo módulo real.
+
+    Tira cv2, requests, numpy e PyAV (centenas de ms de import) do caminho até a primeira
+    pintura da janela. `apelido` é o nome global quando difere do módulo (ex.: np).
+    """
+    def __init__(self, nome, ao_importar=None, apelido=None):
+        self._nome = nome
+        self._apelido = apelido or nome
+        self._ao_importar = ao_importar
+        self._lock = threading.Lock()
+
+    def carregar(self):
+        with self._lock:
+            modulo = importlib.import_module(self._nome)
+            if globals().get(self._apelido) is self:
+                if self._ao_importar: self._ao_importar(modulo)
+                globals()[self._apelido] = modulo
+        return modulo
+
+    def __getattr__(self, atributo):
+        if atributo.startswith("_"): raise AttributeError(atributo)
+        return getattr(self.carregar(), atributo)
+
+cv2 = _ModuloAdiado("cv2", ao_importar=lambda m: m.setNumThreads(1))
+requests = _ModuloAdiado("requests")
+np = _ModuloAdiado("numpy", apelido="np")
+# PyAV (opcional): habilita o modo miniatura com decodificação apenas de I-frames, o replay e a
+# gravação. Só importa quando um desses é usado; find_spec não carrega o módulo, então
+# `av is None` continua indicando que ele não está instalado.
+av = _ModuloAdiado("av") if importlib.util.find_spec("av") is not None else None
+
+def precarregar_modulos():
+    """Importa os módulos adiados (chamado em segundo plano logo após a primeira pintura)."""
+    for modulo in (np, cv2, requests):
+        if isinstance(modulo, _ModuloAdiado): modulo.carregar()
 
 # Semáforo global para limitar conexões simultâneas (evita travamentos)
 sem_conexao = threading.Semaphore(10)
 
+# --- LEITOR PYAV (DECODIFICAÇÃO SELETIVA DE I-FRAMES) ---
+class LeitorPyAV:
+    """Leitor de stream via PyAV com a interface mínima do cv2.VideoCapture usada pelo CameraHandler.
+
+    Permite decodificar apenas I-frames (equivalente ao skip_frame=nokey do FFmpeg),
+    recurso que o backend FFmpeg do OpenCV não expõe.
+    """
+    OPCOES = {"rtsp_transport": "tcp", "stimeout": "5000000", "fflags": "discardcorrupt",
+              "max_delay": "500000", "analyzeduration": "100000", "probesize": "100000"}
+
+    def __init__(self, url, timeout=5.0):
+        self.container = None
+        self.stream = None
+        self.pacotes = None
+        self.frame = None
+        self.somente_keyframes = False
+        self.aguardando_keyframe = False
+        # Média móvel do intervalo real (s) entre I-frames, usada para detectar GOP longo
+        self.intervalo_keyframes = 0.0
+        self.ultimo_keyframe = None
+        # AnelPacotes opcional: recebe todos os pacotes comprimidos (inclusive os não decodificados)
+        self.anel = None
+        # Pedido de outra thread (ver acordar) para o grab parar de descartar pacotes e voltar já
+        self.acordar_pedido = False
+        try:
+            self.container = av.open(url, options=self.OPCOES, timeout=timeout)
+            self.stream = self.container.streams.video[0]
+            self.pacotes = self.container.demux(self.stream)
+        except Exception as e:
+            print(f"Erro PyAV ao abrir stream: {e}")
+            self.release()
+
+    def isOpened(self):
+        return self.container is not None
+
+    def set(self, prop, valor):
+        return False
+
+    def get(self, prop):
+        """Subconjunto de cv2.VideoCapture.get: posição (ms) do último frame e FPS do stream."""
+        try:
+            if prop == cv2.CAP_PROP_POS_MSEC and self.frame is not None and self.frame.time is not None:
+                return self.frame.time * 1000.0
+            if prop == cv2.CAP_PROP_FPS and self.stream is not None and self.stream.average_rate:
+                return float(self.stream.average_rate)
+        except Exception: pass
+        return 0.0
+
+    def set_somente_keyframes(self, estado):
+        self.somente_keyframes = estado
+        try: self.stream.codec_context.skip_frame = "NONKEY" if estado else "DEFAULT"
+        except Exception: pass
+        # Ao voltar para decodificação completa, os P-frames só são válidos a partir do próximo I-frame
+        if not estado: self.aguardando_keyframe = True
+
+    def acordar(self):
+        """Faz o grab em andamento devolver o último frame decodificado em vez de esperar o próximo I-frame.
+
+        Usado na retomada de um leitor oculto (só I-frames): sem isso a câmera leva até um GOP para aparecer.
+        """
+        self.acordar_pedido = True
+
+    def _atender_acordar(self):
+        if not self.acordar_pedido: return False
+        self.acordar_pedido = False
+        return self.frame is not None
+
+    def grab(self):
+        """Lê pacotes até obter um frame decodificado (no modo I-frame, descarta os demais sem decodificar)."""
+        if self.pacotes is None: return False
+        if self._atender_acordar(): return True
+        try:
+            for pacote in self.pacotes:
+                if pacote.size == 0: continue
+                if self.anel is not None: self.anel.adicionar(pacote)
+                if pacote.is_keyframe:
+                    agora = time.time()
+                    if self.ultimo_keyframe is not None:
+                        intervalo = agora - self.ultimo_keyframe
+                        self.intervalo_keyframes = intervalo if not self.intervalo_keyframes else 0.7 * self.intervalo_keyframes + 0.3 * intervalo
+                    self.ultimo_keyframe = agora
+                    self.aguardando_keyframe = False
+                elif self.somente_keyframes or self.aguardando_keyframe:
+                    # Retomada: o último I-frame (self.frame) é publicado sem esperar o próximo
+                    if self._atender_acordar(): return True
+                    continue
+                frames = self.stream.codec_context.decode(pacote)
+                if not frames and self.somente_keyframes:
+                    # Decodificadores com reordenação (B-frames) seguram o I-frame; drena e reinicia
+                    frames = self.stream.codec_context.decode(None)
+                    self.stream.codec_context.flush_buffers()
+                if frames:
+                    self.frame = frames[-1]
+                    return True
+            return False
+        except Exception:
+            return False
+
+    def retrieve(self):
+        if self.frame is None: return False, None
+        try: return True, self.frame.to_ndarray(format="bgr24")
+        except Exception: return False, None
+
+    def release(self):
+        if self.container is not None:
+            try: self.container.close()
+            except Exception: pass
+        self.container = None
+        self.stream = None
+        self.pacotes = None
+
+# --- MÉTRICAS (FORMATO PROMETHEUS) ---
+class Histograma:
+    """Histograma cumulativo de durações (segundos) no formato de buckets do Prometheus."""
+    LIMITES_PADRAO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+    LIMITES_ABERTURA = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, limites=LIMITES_PADRAO):
+        self.limites = tuple(limites)
+        self.contagens = [0] * len(self.limites)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.contagens[i] += 1
+                break
+        self.soma += valor
+        self.total += 1
+
+    def copia(self):
+        h = Histograma(self.limites)
+        h.contagens, h.soma, h.total = list(self.contagens), self.soma, self.total
+        return h
+
+def memoria_residente():
+    """RSS atual do processo em bytes (psutil se instalado, senão /proc; None se indisponível)."""
+    if psutil is not None:
+        try: return psutil.Process().memory_info().rss
+        except Exception: pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+def _rotulos(**rotulos):
+    pares = []
+    for nome, valor in rotulos.items():
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pares.append(f'{nome}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+def formatar_metricas(handlers, estatisticas_ui, histograma_tick=None, agendador=None, pool_aquecido=None,
+                      gravadores=None, controles_ptz=None):
+    """Gera o texto de exposição do Prometheus a partir de {ip: handler} e das estatísticas da UI."""
+    contadores = (
+        ("grabs", "central_camera_pacotes_total", "Pacotes lidos (grab) do stream"),
+        ("frames", "central_camera_frames_total", "Frames decodificados (retrieve)"),
+        ("descartados_fps", "central_camera_descartados_fps_total", "Pacotes descartados pelo limite de FPS"),
+        ("saidas", "central_camera_saidas_total", "Frames redimensionados/convertidos entregues aos consumidores"),
+        ("reconexoes", "central_camera_reconexoes_total", "Reconexões por falta de frames"),
+        ("falhas_abertura", "central_camera_falhas_abertura_total", "Aberturas de stream que falharam"),
+        ("cpu_grab", "central_camera_cpu_grab_segundos_total", "CPU da thread de leitura gasta em grab"),
+        ("cpu_retrieve", "central_camera_cpu_retrieve_segundos_total", "CPU da thread de leitura gasta em retrieve"),
+        ("buffers_alocados", "central_camera_buffers_alocados_total", "Buffers de saída (ndarray/PIL) alocados"),
+        ("bytes_alocados", "central_camera_bytes_alocados_total", "Bytes alocados em buffers de saída"),
+    )
+    histogramas = (
+        ("resize", "central_camera_resize_segundos", "Duração do redimensionamento + overlay por saída"),
+        ("conversao", "central_camera_conversao_segundos", "Duração da conversão de cor por saída"),
+        ("abertura", "central_camera_abertura_segundos", "Latência de abertura do stream"),
+    )
+    itens = [(ip, h) for ip, h in list(handlers.items()) if not isinstance(h, str)]
+    # Uma cópia consistente por handler (as threads de leitura continuam contando durante a formatação)
+    metricas = {ip: h.copiar_metricas() for ip, h in itens}
+    linhas = []
+
+    def cabecalho(nome, ajuda, tipo):
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+
+    def escrever_histograma(nome, rot, h):
+        acumulado = 0
+        base = rot[:-1] + "," if rot != "{}" else "{"
+        for limite, contagem in zip(h.limites, h.contagens):
+            acumulado += contagem
+            linhas.append(f'{nome}_bucket{base}le="{limite}"}} {acumulado}')
+        linhas.append(f'{nome}_bucket{base}le="+Inf"}} {h.total}')
+        linhas.append(f"{nome}_sum{rot} {h.soma}")
+        linhas.append(f"{nome}_count{rot} {h.total}")
+
+    cabecalho("central_camera_conectado", "1 se o stream está conectado", "gauge")
+    for ip, h in itens:
+        linhas.append(f"central_camera_conectado{_rotulos(ip=ip, canal=h.canal)} {int(bool(h.conectado))}")
+    cabecalho("central_camera_visivel", "1 se a câmera aparece em algum slot na tela", "gauge")
+    for ip, h in itens:
+        linhas.append(f"central_camera_visivel{_rotulos(ip=ip, canal=h.canal)} {int(bool(h.visivel))}")
+    cabecalho("central_camera_ultimo_erro", "Último erro registrado pelo handler (rótulo erro)", "gauge")
+    for ip, h in itens:
+        if h.ultimo_erro:
+            linhas.append(f"central_camera_ultimo_erro{_rotulos(ip=ip, canal=h.canal, erro=h.ultimo_erro)} 1")
+
+    for campo, nome, ajuda in contadores:
+        cabecalho(nome, ajuda, "counter")
+        for ip, h in itens:
+            valor = metricas[ip][0].get(campo)
+            if valor is not None:
+                linhas.append(f"{nome}{_rotulos(ip=ip, canal=h.canal)} {valor}")
+
+    for campo, nome, ajuda in histogramas:
+        cabecalho(nome, ajuda, "histogram")
+        for ip, h in itens:
+            hist = metricas[ip][1].get(campo)
+            if hist is not None: escrever_histograma(nome, _rotulos(ip=ip, canal=h.canal), hist)
+
+    e = estatisticas_ui
+    for campo, nome, ajuda in (
+        ("ticks", "central_ui_ticks_total", "Ticks do loop de exibição"),
+        ("frames_renderizados", "central_ui_frames_renderizados_total", "Frames enviados ao Tk"),
+        ("chamadas_tk", "central_ui_chamadas_tk_total", "Chamadas configure/paste ao Tk"),
+        ("tempo_tk", "central_ui_tk_segundos_total", "Tempo gasto em chamadas Tk"),
+        ("tempo_tick", "central_ui_tick_segundos_total", "Tempo total gasto nos ticks"),
+    ):
+        cabecalho(nome, ajuda, "counter")
+        linhas.append(f"{nome} {e.get(campo, 0)}")
+    if histograma_tick is not None:
+        cabecalho("central_ui_tick_segundos", "Duração de cada tick do loop de exibição", "histogram")
+        escrever_histograma("central_ui_tick_segundos", "{}", histograma_tick)
+    if agendador is not None:
+        cabecalho("central_conexoes_fila", "Conexões aguardando no agendador", "gauge")
+        linhas.append(f"central_conexoes_fila {agendador.tamanho()}")
+        cabecalho("central_conexoes_em_andamento", "Conexões sendo abertas agora", "gauge")
+        linhas.append(f"central_conexoes_em_andamento {agendador.em_andamento}")
+        for campo in ("agendadas", "iniciadas", "canceladas"):
+            cabecalho(f"central_conexoes_{campo}_total", f"Conexões {campo} pelo agendador", "counter")
+            linhas.append(f"central_conexoes_{campo}_total {agendador.estatisticas[campo]}")
+        cabecalho("central_conexoes_espera_segundos", "Tempo de espera na fila de conexões", "histogram")
+        escrever_histograma("central_conexoes_espera_segundos", "{}", agendador.histograma_espera.copia())
+    if pool_aquecido is not None:
+        cabecalho("central_pool_aquecido_tamanho", "Câmeras fora do grid mantidas conectadas", "gauge")
+        linhas.append(f"central_pool_aquecido_tamanho {len(pool_aquecido.handlers)}")
+        for campo in ("guardados", "reusos", "despejos"):
+            cabecalho(f"central_pool_aquecido_{campo}_total", f"Handlers {campo} no pool aquecido", "counter")
+            linhas.append(f"central_pool_aquecido_{campo}_total {pool_aquecido.estatisticas[campo]}")
+    if gravadores:
+        itens_gravacao = list(gravadores.items())
+        cabecalho("central_gravacao_ativa", "1 se o gravador está conectado e gravando", "gauge")
+        for ip, g in itens_gravacao:
+            linhas.append(f"central_gravacao_ativa{_rotulos(ip=ip)} {int(g.gravando)}")
+        for campo in ("pacotes", "bytes", "descartados", "segmentos", "removidos"):
+            cabecalho(f"central_gravacao_{campo}_total", f"Gravação: {campo}", "counter")
+            for ip, g in itens_gravacao:
+                linhas.append(f"central_gravacao_{campo}_total{_rotulos(ip=ip)} {g.estatisticas[campo]}")
+    if controles_ptz:
+        itens_ptz = list(controles_ptz.items())
+        for campo in ("enviados", "coalescidos", "erros"):
+            cabecalho(f"central_ptz_{campo}_total", f"Comandos PTZ {campo}", "counter")
+            for ip, c in itens_ptz:
+                linhas.append(f"central_ptz_{campo}_total{_rotulos(ip=ip)} {c.estatisticas[campo]}")
+        cabecalho("central_ptz_latencia_segundos", "Latência de cada comando PTZ (requisição completa)", "histogram")
+        for ip, c in itens_ptz:
+            escrever_histograma("central_ptz_latencia_segundos", _rotulos(ip=ip), c.histograma_latencia.copia())
+    cabecalho("central_reconexoes_liberadas_total", "Reaberturas liberadas pelo limitador global", "counter")
+    linhas.append(f"central_reconexoes_liberadas_total {limitador_reconexoes.estatisticas['concedidas']}")
+    cabecalho("central_reconexoes_espera_segundos_total", "Tempo total de espera no limitador global", "counter")
+    linhas.append(f"central_reconexoes_espera_segundos_total {limitador_reconexoes.estatisticas['tempo_espera']}")
+    cabecalho("central_cameras_ativas", "Handlers de câmera ativos", "gauge")
+    linhas.append(f"central_cameras_ativas {len(itens)}")
+    # RSS da interface e de cada processo do pool (cópia que vem junto das métricas dos handlers remotos)
+    processos = {os.getpid(): memoria_residente()}
+    for ip, h in itens:
+        pid = metricas[ip][0].get("pid")
+        if pid: processos[pid] = metricas[ip][0].get("rss_processo")
+    cabecalho("central_processo_memoria_residente_bytes", "RSS de cada processo (interface e pool)", "gauge")
+    for pid, rss in sorted(processos.items()):
+        if rss is not None:
+            linhas.append(f"central_processo_memoria_residente_bytes{_rotulos(pid=pid)} {rss}")
+    return "\n".join(linhas) + "\n"
+
+class ServidorMetricas:
+    """Servidor HTTP opcional que expõe /metrics para o Prometheus (thread própria, daemon)."""
+    def __init__(self, gerar_texto, porta, endereco="0.0.0.0"):
+        class Requisicao(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                try: corpo = gerar_texto().encode("utf-8")
+                except Exception as e:
+                    self.send_error(500, str(e))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer((endereco, porta), Requisicao)
+        self.servidor.daemon_threads = True
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        print(f"Métricas disponíveis em http://{endereco}:{self.servidor.server_address[1]}/metrics")
+
+    def encerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+# --- RECONEXÃO: BACKOFF EXPONENCIAL E LIMITADOR GLOBAL ---
+class BackoffExponencial:
+    """Atraso entre tentativas que dobra a cada falha, com jitter para dessincronizar as câmeras."""
+    def __init__(self, base=1.0, maximo=30.0, fator=2.0):
+        self.base = base
+        self.maximo = maximo
+        self.fator = fator
+        self.falhas = 0
+
+    def proximo(self):
+        atraso = min(self.maximo, self.base * (self.fator ** self.falhas))
+        # Para de contar ao atingir o teto: o expoente não cresce sem limite (OverflowError após ~1000 falhas)
+        if atraso < self.maximo: self.falhas += 1
+        # "Equal jitter": metade fixa, metade aleatória
+        return atraso / 2 + random.uniform(0, atraso / 2)
+
+    def resetar(self):
+        self.falhas = 0
+
+class LimitadorReconexoes:
+    """Token bucket compartilhado: limita quantas reaberturas de stream começam por segundo."""
+    def __init__(self, taxa=2.0, rajada=4):
+        self.taxa = taxa
+        self.rajada = rajada
+        self.tokens = float(rajada)
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+        self.estatisticas = {"concedidas": 0, "tempo_espera": 0.0}
+
+    def adquirir(self, continuar=None):
+        """Bloqueia até haver um token; retorna False se `continuar()` ficar falso durante a espera."""
+        inicio = time.monotonic()
+        while True:
+            with self.lock:
+                agora = time.monotonic()
+                self.tokens = min(self.rajada, self.tokens + (agora - self.ultimo) * self.taxa)
+                self.ultimo = agora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.estatisticas["concedidas"] += 1
+                    self.estatisticas["tempo_espera"] += agora - inicio
+                    return True
+                espera = (1 - self.tokens) / self.taxa
+            if continuar is not None and not continuar(): return False
+            time.sleep(min(espera, 0.2))
+
+# Um limitador por processo (a interface e cada processo do pool de decodificação)
+limitador_reconexoes = LimitadorReconexoes()
+
+# --- MONITOR DE ALCANCE (ASYNCIO) ---
+class MonitorAlcance:
+    """Varre periodicamente a lista de IPs testando a porta RTSP em paralelo (asyncio, thread própria).
+
+    Guarda (online, rtt_ms, instante) por IP; consultas mais antigas que o TTL retornam None
+    para que o chamador faça o teste direto. `versao` muda a cada varredura concluída.
+    """
+    def __init__(self, porta=554, intervalo=15.0, timeout=0.8, ttl=None, max_simultaneos=256):
+        self.porta = porta
+        self.intervalo = intervalo
+        self.timeout = timeout
+        self.ttl = ttl if ttl is not None else max(2 * intervalo, 5.0)
+        self.max_simultaneos = max_simultaneos
+        self.ips = []
+        self.resultados = {}
+        self.versao = 0
+        self.duracao_ultima_varredura = None
+        self.ativo = True
+        self.loop = None
+        self._acordar = None
+        threading.Thread(target=self._executar, daemon=True).start()
+
+    def definir_ips(self, ips):
+        novos = list(dict.fromkeys(ip for ip in ips if ip and ip != "0.0.0.0"))
+        if novos != self.ips:
+            self.ips = novos
+            self.varrer_agora()
+
+    def consultar(self, ip):
+        """(online, rtt_ms) se houver resultado dentro do TTL, senão None."""
+        resultado = self.resultados.get(ip)
+        if resultado is None or time.time() - resultado[2] > self.ttl: return None
+        return resultado[0], resultado[1]
+
+    def registrar(self, ip, online, rtt_ms=None):
+        """Atualiza o cache com um resultado obtido fora da varredura (ex.: conexão real)."""
+        anterior = self.resultados.get(ip)
+        self.resultados[ip] = (online, rtt_ms, time.time())
+        if anterior is None or anterior[0] != online: self.versao += 1
+
+    def varrer_agora(self):
+        if self.loop is not None and self._acordar is not None:
+            try: self.loop.call_soon_threadsafe(self._acordar.set)
+            except RuntimeError: pass
+
+    def parar(self):
+        self.ativo = False
+        self.varrer_agora()
+
+    def _executar(self):
+        try: asyncio.run(self._loop_varredura())
+        except Exception as e: print(f"Erro no monitor de alcance: {e}")
+
+    async def _sondar(self, ip, limite):
+        async with limite:
+            t0 = time.perf_counter()
+            try:
+                _, escritor = await asyncio.wait_for(asyncio.open_connection(ip, self.porta), self.timeout)
+            except (asyncio.TimeoutError, OSError):
+                return ip, False, None
+            rtt = (time.perf_counter() - t0) * 1000.0
+            escritor.close()
+            try: await escritor.wait_closed()
+            except Exception: pass
+            return ip, True, rtt
+
+    async def _loop_varredura(self):
+        self.loop = asyncio.get_running_loop()
+        self._acordar = asyncio.Event()
+        limite = asyncio.Semaphore(self.max_simultaneos)
+        while self.ativo:
+            ips = list(self.ips)
+            if ips:
+                t0 = time.perf_counter()
+                resultados = await asyncio.gather(*(self._sondar(ip, limite) for ip in ips))
+                agora = time.time()
+                for ip, online, rtt in resultados:
+                    self.resultados[ip] = (online, rtt, agora)
+                self.duracao_ultima_varredura = time.perf_counter() - t0
+                self.versao += 1
+            try: await asyncio.wait_for(self._acordar.wait(), self.intervalo)
+            except asyncio.TimeoutError: pass
+            self._acordar.clear()
+
+# --- REPLAY (ANEL DE PACOTES COMPRIMIDOS) ---
+class OrcamentoReplay:
+    """Limite global de memória dos anéis de replay (bytes de pacotes comprimidos)."""
+    def __init__(self, limite=384 * 1024 * 1024):
+        self.limite = limite
+        self.uso = 0
+        self.lock = threading.Lock()
+
+    def alterar(self, delta):
+        with self.lock: self.uso += delta
+
+    def excedido(self):
+        return self.uso > self.limite
+
+# Um orçamento por processo (a interface e cada processo do pool recebe a sua parte)
+orcamento_replay = OrcamentoReplay()
+
+class AnelPacotes:
+    """Últimos N segundos de pacotes comprimidos de uma câmera, agrupados por GOP.
+
+    O anel sempre começa num I-frame: o corte é feito de GOP em GOP, por idade
+    (mantém pelo menos `segundos`), pelo limite da câmera e pelo orçamento global.
+    """
+    def __init__(self, segundos=30, max_bytes=24 * 1024 * 1024, orcamento=None):
+        self.segundos = segundos
+        self.max_bytes = max_bytes
+        self.orcamento = orcamento if orcamento is not None else orcamento_replay
+        # Cada GOP: [instante do I-frame, bytes, [(dados, pts, dts, keyframe, instante), ...]]
+        self.gops = deque()
+        self.bytes = 0
+        self.codec = None
+        self.extradata = None
+        self.time_base = None
+        self.lock = threading.Lock()
+
+    def reiniciar(self, stream):
+        """Novo stream (reconexão/troca de canal): descarta o conteúdo e guarda os parâmetros do codec."""
+        with self.lock:
+            self._descartar_tudo()
+            try:
+                self.codec = stream.codec_context.name
+                self.extradata = stream.codec_context.extradata
+                self.time_base = stream.time_base
+            except Exception:
+                self.codec = None
+
+    def adicionar(self, pacote):
+        agora = time.time()
+        with self.lock:
+            if pacote.is_keyframe:
+                self.gops.append([agora, 0, []])
+            elif not self.gops:
+                return
+            dados = bytes(pacote)
+            gop = self.gops[-1]
+            gop[1] += len(dados)
+            gop[2].append((dados, pacote.pts, pacote.dts, pacote.is_keyframe, agora))
+            self.bytes += len(dados)
+            self.orcamento.alterar(len(dados))
+            # Remove o GOP mais antigo enquanto o seguinte ainda cobre a janela ou algum limite estourou
+            while len(self.gops) > 1 and (self.gops[1][0] <= agora - self.segundos or self.bytes > self.max_bytes
+                                          or self.orcamento.excedido()):
+                self._descartar_gop()
+            # GOP único maior que o limite da câmera: recomeça no próximo I-frame
+            if self.bytes > self.max_bytes: self._descartar_tudo()
+
+    def _descartar_gop(self):
+        _, tamanho, _ = self.gops.popleft()
+        self.bytes -= tamanho
+        self.orcamento.alterar(-tamanho)
+
+    def _descartar_tudo(self):
+        self.orcamento.alterar(-self.bytes)
+        self.gops.clear()
+        self.bytes = 0
+
+    def limpar(self):
+        with self.lock: self._descartar_tudo()
+
+    def copiar(self):
+        """Instantâneo (picklável) do anel para o ReprodutorReplay, ou None se vazio."""
+        with self.lock:
+            if not self.gops or self.codec is None: return None
+            pacotes = [p for gop in self.gops for p in gop[2]]
+            return {"codec": self.codec, "extradata": self.extradata,
+                    "time_base": (self.time_base.numerator, self.time_base.denominator) if self.time_base else None,
+                    "pacotes": pacotes}
+
+class ReprodutorReplay:
+    """Decodifica um instantâneo do AnelPacotes em um slot, com velocidade ajustável.
+
+    Expõe a interface de consumidor do CameraHandler usada pelo loop de exibição; o handler
+    ao vivo continua capturando (e alimentando o anel) durante o replay.
+    """
+    def __init__(self, ip, obter_dados, velocidade=1.0, ao_frame_pronto=None):
+        self.ip = ip
+        self.obter_dados = obter_dados
+        self.velocidade = velocidade
+        self.ao_frame_pronto = ao_frame_pronto
+        self.consumidores = {}
+        self.lock = threading.Lock()
+        self.rodando = True
+        self.ultimo_erro = None
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def set_velocidade(self, velocidade):
+        self.velocidade = max(0.1, float(velocidade))
+
+    def parar(self):
+        self.rodando = False
+
+    def registrar_consumidor(self, chave, tamanho, interpolacao=None):
+        with self.lock:
+            consumidor = self.consumidores.setdefault(chave, {"frame": None, "novo": False, "ts": 0.0})
+            consumidor["tamanho"] = tamanho
+
+    def remover_consumidor(self, chave):
+        with self.lock:
+            self.consumidores.pop(chave, None)
+
+    def tem_frame_novo(self, chave=None):
+        consumidor = self.consumidores.get(chave)
+        return consumidor is not None and consumidor["novo"]
+
+    def idade_frame(self, chave=None):
+        return None
+
+    def pegar_frame(self, chave=None):
+        with self.lock:
+            consumidor = self.consumidores.get(chave)
+            if consumidor is None: return None
+            consumidor["novo"] = False
+            return consumidor["frame"]
+
+    def _publicar(self, frame):
+        with self.lock:
+            destinos = [(chave, c["tamanho"]) for chave, c in self.consumidores.items()]
+        texto = f"REPLAY {self.velocidade:g}x"
+        for chave, (w, h) in destinos:
+            # reformat + to_image: o PIL é gerado direto do plano rgb24, sem ndarray intermediário
+            img = frame.to_image(width=int(w), height=int(h))
+            if h > 50:
+                ImageDraw.Draw(img).text((10, 12), texto, fill=(255, 64, 64), stroke_width=2, stroke_fill=(0, 0, 0))
+            with self.lock:
+                consumidor = self.consumidores.get(chave)
+                if consumidor is not None:
+                    consumidor["frame"], consumidor["novo"], consumidor["ts"] = img, True, time.time()
+        if self.ao_frame_pronto is not None: self.ao_frame_pronto()
+
+    def _loop(self):
+        try:
+            dados = self.obter_dados()
+            if not dados:
+                self.ultimo_erro = "SEM REPLAY"
+                return
+            contexto = av.CodecContext.create(dados["codec"], "r")
+            if dados["extradata"]: contexto.extradata = dados["extradata"]
+            pacotes = dados["pacotes"]
+            # Linha do tempo pelo DTS do stream; sem time base, pelo instante de chegada
+            escala = dados["time_base"][0] / dados["time_base"][1] if dados["time_base"] else None
+            def tempo(p): return p[2] * escala if escala and p[2] is not None else p[4]
+            inicio = tempo(pacotes[0])
+            # Relógio do replay avança velocidade x tempo real (a velocidade pode mudar no meio)
+            posicao, relogio = 0.0, time.perf_counter()
+            for pacote_anel in pacotes:
+                if not self.rodando: return
+                dados_pacote, pts, dts = pacote_anel[:3]
+                alvo = tempo(pacote_anel) - inicio
+                while self.rodando:
+                    agora = time.perf_counter()
+                    posicao += (agora - relogio) * self.velocidade
+                    relogio = agora
+                    if posicao >= alvo: break
+                    time.sleep(min(0.05, (alvo - posicao) / self.velocidade))
+                pacote = av.Packet(dados_pacote)
+                pacote.pts, pacote.dts = pts, dts
+                frames = contexto.decode(pacote)
+                # Atrasado (velocidade alta): decodifica para manter a referência, mas não exibe
+                if frames and posicao - alvo < 0.1: self._publicar(frames[-1])
+            # Mantém o último frame um instante antes de voltar ao vivo
+            time.sleep(1.0)
+        except Exception as e:
+            self.ultimo_erro = "ERRO REPLAY"
+            print(f"Erro no replay de {self.ip}: {e}")
+        finally:
+            self.rodando = False
+            if self.ao_frame_pronto is not None: self.ao_frame_pronto()
+
 # --- CLASSE DE VÍDEO OTIMIZADA ---
+def imagem_de_rgb(rgb, tamanho=None):
+    """Imagem PIL a partir de um buffer RGB contíguo em uma única cópia (sem bytes intermediários)."""
+    if tamanho is None: tamanho = (rgb.shape[1], rgb.shape[0])
+    return Image.frombuffer("RGB", tamanho, rgb, "raw", "RGB", 0, 1)
+
 class CameraHandler:
-    def __init__(self, ip, canal=102, user="admin", password="password"):
+    def __init__(self, ip, canal=102, user="admin", password="password", url=None):
         self.ip = ip
         self.canal = canal
         self.user = user
         self.password = password
-        self.url = self._gerar_url(ip, canal)
+        # URL explícita (arquivo local/RTSP de testes) dispensa a URL Hikvision e o teste da porta 554
+        self.url_fixa = url
+        self.url = url or self._gerar_url(ip, canal)
         self.cap = None
         self.rodando = False
-        self.frame_pil = None
-        self.novo_frame = False
+        # Saídas por consumidor (slot do grid): decodifica uma vez e redimensiona para cada um.
+        # A chave None é o consumidor padrão de set_tamanho_alvo/pegar_frame() sem argumentos.
+        self.consumidores = {}
         self.lock = threading.Lock()
         self.conectado = False
         self.tamanho_alvo = (640, 480)
@@ -36,16 +726,58 @@ class CameraHandler:
         self.nome_display = ""
         self.exibir_info = False
         self.prioridade = False
+        # Oculto: nenhum slot na tela mostra esta câmera (só drena o stream, sem retrieve/resize)
+        self.visivel = True
+        self.forcar_frame = False
+        # Modo miniatura: fora de prioridade decodifica só I-frames (requer PyAV);
+        # volta à decodificação completa se o GOP for longo demais para a taxa mínima
+        self.modo_miniatura = False
+        self.usar_pyav = False
+        self.fps_min_miniatura = 0.5
         self.necessita_reconexao = False
+        # Troca de canal progressiva: canal pedido, captura já aquecida aguardando o corte e
+        # geração do pedido (pedidos mais novos invalidam aquecimentos em andamento)
+        self.canal_alvo = canal
+        self.cap_pendente = None
+        self._geracao_canal = 0
         self.ultimo_erro = None
+        # Cache de alcance compartilhado (MonitorAlcance); sem ele o teste da porta 554 é feito na hora
+        self.monitor_alcance = None
+        # Atraso entre reaberturas do stream (zerado quando voltam a chegar frames)
+        self.backoff = BackoffExponencial()
+        # Callback opcional (consumidor, frame RGB ndarray) em vez de gerar PIL (usado pelos processos do pool)
+        self.ao_publicar_frame = None
+        # Buffers de saída reutilizados por tamanho (ver _produzir_saida); as imagens PIL de cada
+        # consumidor ficam em consumidor["imagens"] (ver _imagem_livre)
+        self.buffers_saida = {}
+        # Callback opcional chamado (fora do lock) após publicar frames novos, ex.: SinalizadorFrames.sinalizar
+        self.ao_frame_pronto = None
+        # Contadores acumulados do pipeline (CPU da thread em grab/retrieve, tempo de parede em resize/conversão).
+        # Alterados e lidos sob self.lock: o /metrics lê de outra thread (ver copiar_metricas)
+        self.estatisticas = {"grabs": 0, "frames": 0, "descartados_fps": 0, "saidas": 0,
+                             "reconexoes": 0, "falhas_abertura": 0,
+                             "cpu_grab": 0.0, "cpu_retrieve": 0.0, "tempo_resize": 0.0, "tempo_conversao": 0.0,
+                             "buffers_alocados": 0, "bytes_alocados": 0}
+        self.histogramas = {"resize": Histograma(), "conversao": Histograma(),
+                            "abertura": Histograma(Histograma.LIMITES_ABERTURA)}
+        # Anel de pacotes comprimidos para replay instantâneo (opcional, requer PyAV)
+        self.anel_replay = None
 
     def verificar_alcance(self, timeout=1.0):
-        """Verifica se o IP e a porta RTSP (554) estão acessíveis."""
+        """Verifica se o IP e a porta RTSP (554) estão acessíveis (usa o cache do MonitorAlcance se válido)."""
+        monitor = self.monitor_alcance
+        if monitor is not None:
+            estado = monitor.consultar(self.ip)
+            if estado is not None: return estado[0]
+        t0 = time.perf_counter()
         try:
             with socket.create_connection((self.ip, 554), timeout=timeout):
-                return True
+                online = True
         except (socket.timeout, ConnectionRefusedError, OSError):
-            return False
+            online = False
+        if monitor is not None:
+            monitor.registrar(self.ip, online, (time.perf_counter() - t0) * 1000.0 if online else None)
+        return online
 
     def _gerar_url(self, ip, canal):
         # RTSP String Padrão Hikvision/Intelbras
@@ -61,17 +793,163 @@ class CameraHandler:
         with self.lock:
             self.exibir_info = estado
 
+    def set_visivel(self, estado):
+        with self.lock:
+            if estado and not self.visivel:
+                # Retomada instantânea: processa o próximo frame sem esperar o controle de FPS
+                self.forcar_frame = True
+                self._acordar_leitor()
+            self.visivel = estado
+
+    def _acordar_leitor(self):
+        """Tira a thread de leitura da espera pelo próximo I-frame (LeitorPyAV), se for o caso."""
+        acordar = getattr(self.cap, 'acordar', None)
+        if acordar is not None: acordar()
+
+    def set_tamanho_alvo(self, tamanho):
+        self.tamanho_alvo = tamanho
+        self.registrar_consumidor(None, tamanho, self.interpolation)
+
+    def set_interpolacao(self, interpolacao):
+        self.interpolation = interpolacao
+        with self.lock:
+            if None in self.consumidores: self.consumidores[None]["interpolacao"] = interpolacao
+
+    def set_nome_display(self, nome):
+        self.nome_display = nome
+
+    def set_modo_miniatura(self, estado):
+        with self.lock:
+            self.modo_miniatura = estado
+            if estado and av is not None and not self.usar_pyav:
+                # Troca de leitor exige reabrir o stream
+                self.usar_pyav = True
+                if self.rodando: self.necessita_reconexao = True
+
+    def set_replay(self, segundos, max_bytes=24 * 1024 * 1024, max_bytes_total=None):
+        """Liga (segundos > 0) ou desliga o anel de replay; ligar passa a leitura para o PyAV."""
+        if max_bytes_total is not None: orcamento_replay.limite = max_bytes_total
+        with self.lock:
+            if segundos <= 0 or av is None:
+                anel, self.anel_replay = self.anel_replay, None
+                if anel is not None: anel.limpar()
+                return
+            if self.anel_replay is None:
+                self.anel_replay = AnelPacotes(segundos, max_bytes)
+            else:
+                self.anel_replay.segundos, self.anel_replay.max_bytes = segundos, max_bytes
+            if not self.usar_pyav:
+                self.usar_pyav = True
+                if self.rodando: self.necessita_reconexao = True
+
+    def copiar_replay(self):
+        anel = self.anel_replay
+        return anel.copiar() if anel is not None else None
+
     def set_canal(self, novo_canal):
+        """Troca de stream sem apagar o slot: o canal atual segue exibindo enquanto o novo aquece."""
         with self.lock:
-            if self.canal != novo_canal:
+            if self.url_fixa or novo_canal == self.canal_alvo: return
+            self.canal_alvo = novo_canal
+            self._geracao_canal += 1
+            geracao = self._geracao_canal
+            # Voltou ao canal em exibição antes do corte: só descarta o aquecimento em andamento
+            if novo_canal == self.canal: return
+            if not self.rodando:
                 self.canal = novo_canal
                 self.url = self._gerar_url(self.ip, novo_canal)
-                self.necessita_reconexao = True
+                return
+        threading.Thread(target=self._aquecer_canal, args=(novo_canal, geracao), daemon=True).start()
+
+    def _aquecer_canal(self, canal, geracao, timeout=10.0):
+        """Abre o novo canal em paralelo e só o entrega ao loop de leitura após o primeiro frame decodificado."""
+        url = self._gerar_url(self.ip, canal)
+        print(f"Aquecendo canal {canal} de {self.ip_display}...")
+        cap = self._abrir_com_metricas(url)
+        limite = time.time() + timeout
+        decodificou = False
+        while cap.isOpened() and self.rodando and geracao == self._geracao_canal and time.time() < limite:
+            if cap.grab() and cap.retrieve()[0]:
+                decodificou = True
+                break
+            time.sleep(0.01)
+        with self.lock:
+            if decodificou and self.rodando and geracao == self._geracao_canal:
+                antigo, self.cap_pendente = self.cap_pendente, cap
+                self.canal = canal
+                self.url = url
+                cap = antigo
+            elif geracao == self._geracao_canal:
+                # Canal novo indisponível: continua no atual (um novo pedido tenta de novo)
+                print(f"Falha ao aquecer canal {canal} de {self.ip_display}, mantendo canal {self.canal}")
+                self.canal_alvo = self.canal
+        if cap is not None: cap.release()
+
+    def _abrir_captura(self, url=None):
+        """Abre o stream com o leitor configurado (PyAV no modo miniatura, senão OpenCV/FFMPEG)."""
+        url = url or self.url
+        if self.usar_pyav and av is not None:
+            with sem_conexao:
+                return LeitorPyAV(url)
+
+        with sem_conexao:
+            cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+
+        if hasattr(cv2, 'CAP_PROP_OPEN_TIMEOUT_USEC'):
+            try: cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_USEC, 5000000)
+            except: pass
+
+        if hasattr(cv2, 'CAP_PROP_BUFFERSIZE'):
+            try: cap.set(cv2.CAP_PROP_BUFFERSIZE, 3)
+            except: pass
+        return cap
+
+    def _abrir_com_metricas(self, url=None):
+        """Abre a captura registrando a latência de abertura e as falhas."""
+        t0 = time.perf_counter()
+        cap = self._abrir_captura(url)
+        dt = time.perf_counter() - t0
+        falhou = not cap.isOpened()
+        with self.lock:
+            self.histogramas["abertura"].observar(dt)
+            if falhou: self.estatisticas["falhas_abertura"] += 1
+        return cap
+
+    def copiar_metricas(self):
+        """(estatísticas, histogramas) copiados sob o lock, para o /metrics e o pool de processos."""
+        with self.lock:
+            return dict(self.estatisticas), {k: h.copia() for k, h in self.histogramas.items()}
+
+    def _reconectar_com_backoff(self):
+        """Aguarda o backoff da câmera e um token do limitador global antes de reabrir o stream."""
+        limite = time.time() + self.backoff.proximo()
+        while self.rodando and not self.necessita_reconexao and time.time() < limite:
+            time.sleep(0.1)
+        # Troca de canal pendente: o próprio loop reabre
+        if not self.rodando or self.necessita_reconexao: return
+        if not limitador_reconexoes.adquirir(lambda: self.rodando): return
+        with self.lock: self.estatisticas["reconexoes"] += 1
+        if self.cap: self.cap.release()
+        self.cap = self._abrir_com_metricas()
+
+    def _ajustar_decodificacao(self):
+        """Liga/desliga a decodificação só de I-frames conforme visibilidade, prioridade e GOP."""
+        cap = self.cap
+        if not hasattr(cap, "set_somente_keyframes"): return
+        # Captura nova (reconexão/corte de canal) ou replay ligado/desligado: religa o anel
+        anel = self.anel_replay
+        if cap.anel is not anel:
+            cap.anel = anel
+            if anel is not None: anel.reiniciar(cap.stream)
+        gop_longo = cap.intervalo_keyframes > 1.0 / self.fps_min_miniatura
+        desejado = (not self.visivel) or (self.modo_miniatura and not self.prioridade and not gop_longo)
+        if cap.somente_keyframes != desejado:
+            cap.set_somente_keyframes(desejado)
 
     def iniciar(self):
         try:
             # 1. Verifica se o dispositivo está na rede
-            if not self.verificar_alcance(timeout=0.8):
+            if not self.url_fixa and not self.verificar_alcance(timeout=0.8):
                 self.ultimo_erro = "OFFLINE"
                 print(f"Dispositivo offline: {self.ip_display}")
                 return False
@@ -80,16 +958,7 @@ class CameraHandler:
 
             # 2. Loop de retentativa para abrir o stream
             for tentativa in range(2):
-                with sem_conexao:
-                    self.cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
-
-                if hasattr(cv2, 'CAP_PROP_OPEN_TIMEOUT_USEC'):
-                    try: self.cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_USEC, 5000000)
-                    except: pass
-
-                if hasattr(cv2, 'CAP_PROP_BUFFERSIZE'):
-                    try: self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 3)
-                    except: pass
+                self.cap = self._abrir_com_metricas()
 
                 if self.cap.isOpened():
                     self.rodando = True
@@ -115,82 +984,89 @@ class CameraHandler:
         last_process_time = 0
 
         while self.rodando:
+            if self.cap_pendente is not None:
+                # Corte para o canal aquecido: o primeiro frame dele já foi decodificado
+                with self.lock:
+                    antigo, self.cap = self.cap, self.cap_pendente
+                    self.cap_pendente = None
+                    self.forcar_frame = True
+                if antigo: antigo.release()
+                consecutive_failures = 0
+                print(f"Canal de {self.ip_display} trocado para {self.canal}")
+
             if self.necessita_reconexao:
                 with self.lock:
                     print(f"Alterando canal de {self.ip_display} para {self.canal}...")
                     if self.cap: self.cap.release()
-                    with sem_conexao:
-                        self.cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
-                    if hasattr(cv2, 'CAP_PROP_BUFFERSIZE'):
-                        try: self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 3)
-                        except: pass
+                    self.cap = self._abrir_com_metricas()
                     self.necessita_reconexao = False
                     consecutive_failures = 0
 
             if not self.cap or not self.cap.isOpened():
-                time.sleep(0.5)
+                # Abertura falhou (troca de canal ou reconexão): tenta de novo com backoff
+                self._reconectar_com_backoff()
+                consecutive_failures = 0
                 continue
 
-            # Grab frame (rápido, não decodifica)
+            self._ajustar_decodificacao()
+
+            # Grab frame (no modo miniatura só retorna em I-frames; na retomada, set_visivel/registrar_consumidor
+            # acordam o leitor e ele devolve já o último I-frame decodificado)
+            cpu0 = time.thread_time()
             ret = self.cap.grab()
+            cpu_grab = time.thread_time() - cpu0
+            estat = self.estatisticas
+            with self.lock:
+                estat["cpu_grab"] += cpu_grab
+                if ret: estat["grabs"] += 1
 
             if ret:
                 consecutive_failures = 0
+                if self.backoff.falhas: self.backoff.resetar()
                 now = time.time()
 
-                # Controle de FPS Dinâmico (Reduzido para 7 em background para economizar CPU/Rede mas manter fluidez)
-                target_fps = 25 if self.prioridade else 7
-                if now - last_process_time < (1.0 / target_fps):
+                # Câmera fora da tela: mantém a conexão drenada, mas não gasta retrieve/resize/conversão
+                if not self.visivel:
                     continue
 
-                # Se a UI ainda não consumiu o frame anterior, e não é prioridade, podemos pular
-                # Mas forçamos a atualização se passou muito tempo (0.2s) para evitar congelamentos
-                if self.novo_frame and not self.prioridade:
-                    if now - last_process_time < 0.2:
+                forcar = self.forcar_frame or getattr(self.cap, 'somente_keyframes', False)
+                if forcar:
+                    # Retomada ou I-frame de miniatura: frames raros, nunca descarta
+                    self.forcar_frame = False
+                else:
+                    # Controle de FPS Dinâmico (Reduzido para 7 em background para economizar CPU/Rede mas manter fluidez)
+                    target_fps = 25 if self.prioridade else 7
+                    if now - last_process_time < (1.0 / target_fps):
+                        with self.lock: estat["descartados_fps"] += 1
                         continue
 
-                # Retrieve frame (decodifica)
+                # Só redimensiona para consumidores que vão exibir: se a UI ainda não consumiu o frame
+                # anterior (e não é prioridade), pula, mas força após 0.2s para evitar congelamentos
+                with self.lock:
+                    destinos = [(chave, c["tamanho"], c["interpolacao"]) for chave, c in self.consumidores.items()
+                                if forcar or self.prioridade or not c["novo"] or now - c["ts"] >= 0.2]
+                    if not destinos: estat["descartados_fps"] += 1
+                if not destinos:
+                    continue
+
+                # Retrieve frame (decodifica uma única vez para todos os consumidores)
+                cpu0 = time.thread_time()
                 ret_ret, frame = self.cap.retrieve()
+                cpu_retrieve = time.thread_time() - cpu0
+                with self.lock:
+                    estat["cpu_retrieve"] += cpu_retrieve
+                    if ret_ret: estat["frames"] += 1
                 if not ret_ret:
                     continue
 
                 last_process_time = now
-
-                try:
-                    w, h = self.tamanho_alvo
-                    w, h = int(w), int(h)
-
-                    if frame.shape[1] != w or frame.shape[0] != h:
-                        frame_res = cv2.resize(frame, (w, h), interpolation=self.interpolation)
-                    else:
-                        frame_res = frame
-
-                    # Adiciona Nome e IP para debug visual apenas se houver espaço e estiver habilitado
-                    if h > 50 and self.exibir_info:
-                        # Nome da Câmera (Superior Esquerda)
-                        if self.nome_display:
-                            cv2.putText(frame_res, self.nome_display, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,0), 2)
-                            cv2.putText(frame_res, self.nome_display, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
-
-                        # IP da Câmera (Linha abaixo)
-                        cv2.putText(frame_res, self.ip_display, (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,0), 2)
-                        cv2.putText(frame_res, self.ip_display, (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
-
-                    rgb = cv2.cvtColor(frame_res, cv2.COLOR_BGR2RGB)
-                    pil_img = Image.fromarray(rgb)
-
-                    with self.lock:
-                        self.frame_pil = pil_img
-                        self.novo_frame = True
-                except Exception as e:
-                    time.sleep(0.01)
+                self._publicar_frame(frame, destinos, now)
             else:
                 consecutive_failures += 1
                 if consecutive_failures > 100: # Reduzido para 100 para reconectar mais rápido
                     print(f"LOG: Camera {self.ip_display} sem frames. Tentando reconectar...")
-                    if self.cap: self.cap.release()
-                    with sem_conexao:
-                        self.cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
+                    self.ultimo_erro = "SEM FRAMES"
+                    self._reconectar_com_backoff()
                     consecutive_failures = 0
 
                 # Sleep progressivo em caso de falha para evitar overhead de CPU
@@ -199,17 +1075,1559 @@ class CameraHandler:
 
         if self.cap:
             self.cap.release()
+        with self.lock:
+            pendente, self.cap_pendente = self.cap_pendente, None
+        if pendente: pendente.release()
+        if self.anel_replay is not None: self.anel_replay.limpar()
+        self.rodando = False
+        self.conectado = False
+
+    def _buffer_saida(self, w, h):
+        """Buffer reutilizável por tamanho de saída (evita alocar um array por frame)."""
+        buf = self.buffers_saida.get((w, h))
+        if buf is None:
+            if len(self.buffers_saida) >= 8: self.buffers_saida.clear()
+            buf = self.buffers_saida[(w, h)] = np.empty((h, w, 3), dtype=np.uint8)
+            with self.lock:
+                self.estatisticas["buffers_alocados"] += 1
+                self.estatisticas["bytes_alocados"] += buf.nbytes
+        return buf
+
+    def _imagem_livre(self, chave, w, h):
+        """Imagem PIL do consumidor que pode ser sobrescrita (buffer triplo).
+
+        Nunca devolve a publicada (consumidor["frame"]) nem a última entregue por pegar_frame,
+        que a interface ainda pode estar usando; só aloca na troca de tamanho.
+        """
+        with self.lock:
+            consumidor = self.consumidores.get(chave)
+            if consumidor is None: return None
+            imagens = consumidor["imagens"]
+            if imagens and imagens[0].size != (w, h): imagens.clear()
+            for img in imagens:
+                if img is not consumidor["frame"] and img is not consumidor["entregue"]: return img
+            img = Image.new("RGB", (w, h))
+            imagens.append(img)
+            self.estatisticas["buffers_alocados"] += 1
+            self.estatisticas["bytes_alocados"] += w * h * 3
+        return img
+
+    def _produzir_saida(self, frame, tamanho, interpolacao):
+        """Redimensiona o frame para um consumidor, aplica o overlay e converte para RGB.
+
+        Tudo acontece em um buffer reutilizado por tamanho (a conversão é feita no
+        próprio buffer), então a saída deve ser consumida antes da próxima do mesmo tamanho.
+        """
+        w, h = int(tamanho[0]), int(tamanho[1])
+        t0 = time.perf_counter()
+        frame_res = self._buffer_saida(w, h)
+        if interpolacao is None:
+            interpolacao = cv2.INTER_LINEAR if self.prioridade else self.interpolation
+
+        redimensionar = frame.shape[1] != w or frame.shape[0] != h
+        if redimensionar:
+            cv2.resize(frame, (w, h), dst=frame_res, interpolation=interpolacao)
+        else:
+            # Mesmo tamanho: a conversão de cor já é a cópia que protege o frame compartilhado
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame_res)
+
+        # Adiciona Nome e IP para debug visual apenas se houver espaço e estiver habilitado
+        if h > 50 and self.exibir_info:
+            # Nome da Câmera (Superior Esquerda)
+            if self.nome_display:
+                cv2.putText(frame_res, self.nome_display, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,0), 2)
+                cv2.putText(frame_res, self.nome_display, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
+
+            # IP da Câmera (Linha abaixo)
+            cv2.putText(frame_res, self.ip_display, (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,0), 2)
+            cv2.putText(frame_res, self.ip_display, (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
+
+        t1 = time.perf_counter()
+        if redimensionar:
+            cv2.cvtColor(frame_res, cv2.COLOR_BGR2RGB, dst=frame_res)
+        t2 = time.perf_counter()
+        with self.lock:
+            self.estatisticas["tempo_resize"] += t1 - t0
+            self.estatisticas["tempo_conversao"] += t2 - t1
+            self.histogramas["resize"].observar(t1 - t0)
+            self.histogramas["conversao"].observar(t2 - t1)
+        return frame_res
+
+    def _publicar_frame(self, frame, destinos, now):
+        """Gera a saída de cada consumidor e a publica (callback do pool ou PIL no próprio consumidor)."""
+        estat = self.estatisticas
+        try:
+            publicar = self.ao_publicar_frame
+            for chave, tamanho, interpolacao in destinos:
+                rgb = self._produzir_saida(frame, tamanho, interpolacao)
+
+                if publicar is not None:
+                    publicar(chave, rgb)
+                    with self.lock: estat["saidas"] += 1
+                    continue
+
+                t0 = time.perf_counter()
+                pil_img = self._imagem_livre(chave, rgb.shape[1], rgb.shape[0])
+                if pil_img is None: continue
+                pil_img.frombytes(rgb, "raw", "RGB")
+                dt = time.perf_counter() - t0
+                with self.lock:
+                    estat["tempo_conversao"] += dt
+                    self.histogramas["conversao"].observar(dt)
+                    estat["saidas"] += 1
+
+                with self.lock:
+                    consumidor = self.consumidores.get(chave)
+                    if consumidor is not None:
+                        consumidor["frame"] = pil_img
+                        consumidor["novo"] = True
+                        consumidor["ts"] = now
+
+            if self.ao_frame_pronto is not None:
+                self.ao_frame_pronto()
+        except Exception as e:
+            time.sleep(0.01)
+
+    def registrar_consumidor(self, chave, tamanho, interpolacao=None):
+        """Registra (ou atualiza) uma saída com tamanho e interpolação próprios, ex.: um slot do grid.
+
+        Sem `interpolacao`, a thread de leitura escolhe a cada frame: LINEAR com prioridade
+        (câmera maximizada), senão a padrão do handler.
+        """
+        with self.lock:
+            consumidor = self.consumidores.get(chave)
+            if consumidor is None:
+                self.consumidores[chave] = {"tamanho": tamanho, "interpolacao": interpolacao,
+                                            "frame": None, "novo": False, "ts": 0.0,
+                                            "imagens": [], "entregue": None}
+                # Novo consumidor recebe frame já no próximo grab (o último I-frame, se o leitor só decodifica I-frames)
+                self.forcar_frame = True
+                self._acordar_leitor()
+            else:
+                consumidor["tamanho"] = tamanho
+                consumidor["interpolacao"] = interpolacao
+
+    def remover_consumidor(self, chave):
+        with self.lock:
+            self.consumidores.pop(chave, None)
+
+    def tem_frame_novo(self, chave=None):
+        consumidor = self.consumidores.get(chave)
+        return consumidor is not None and consumidor["novo"]
+
+    @property
+    def novo_frame(self):
+        return self.tem_frame_novo(None)
+
+    def idade_frame(self, chave=None):
+        """Segundos desde a captura do frame atual do consumidor (None se ainda não houver frame)."""
+        consumidor = self.consumidores.get(chave)
+        if consumidor is None or consumidor["frame"] is None: return None
+        return time.time() - consumidor["ts"]
+
+    def pegar_frame(self, chave=None):
+        """Frame atual do consumidor. A imagem é reaproveitada pelo handler: vale até a próxima
+        chamada com a mesma chave (quem precisa guardá-la por mais tempo deve copiá-la)."""
+        with self.lock:
+            consumidor = self.consumidores.get(chave)
+            if consumidor is None: return None
+            consumidor["novo"] = False
+            consumidor["entregue"] = consumidor["frame"]
+            return consumidor["frame"]
+
+    def parar(self):
+        self.rodando = False
+        self.conectado = False
+
+# --- ANEL DE FRAMES EM MEMÓRIA COMPARTILHADA ---
+class AnelFrames:
+    """Anel de frames RGB em multiprocessing.shared_memory (um escritor, um leitor).
+
+    Cabeçalho int64: [seq_global, (seq, largura, altura) * n_slots]. O leitor confere o
+    seq do slot antes e depois da cópia para descartar frames sobrescritos durante a leitura.
+    """
+    def __init__(self, nome=None, capacidade=0, n_slots=3):
+        self.n_slots = n_slots
+        self.tam_cabecalho = 8 * (1 + 3 * n_slots)
+        if nome is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.tam_cabecalho + capacidade * n_slots)
+            self.dono = True
+        else:
+            # Os processos "spawn" do pool usam o resource_tracker da interface: o registro feito
+            # ao abrir é o mesmo do criador (um conjunto por nome), então não se desregistra aqui.
+            # Assim o unlink do criador não gera KeyError no tracker e, se o processo do pool
+            # morrer, o tracker ainda remove o bloco de /dev/shm ao final.
+            self.shm = shared_memory.SharedMemory(name=nome)
+            self.dono = False
+        self.nome = self.shm.name
+        self.capacidade = (self.shm.size - self.tam_cabecalho) // n_slots
+        self.cabecalho = np.ndarray((1 + 3 * n_slots,), dtype=np.int64, buffer=self.shm.buf)
+        self.dados = np.ndarray((n_slots, self.capacidade), dtype=np.uint8, buffer=self.shm.buf, offset=self.tam_cabecalho)
+        if self.dono: self.cabecalho[:] = 0
+
+    def escrever(self, rgb):
+        h, w = rgb.shape[:2]
+        n = w * h * 3
+        if n > self.capacidade: return False
+        seq = int(self.cabecalho[0]) + 1
+        k = seq % self.n_slots
+        base = 1 + 3 * k
+        self.cabecalho[base] = -1  # Slot em escrita
+        self.dados[k, :n] = rgb.reshape(-1)
+        self.cabecalho[base + 1] = w
+        self.cabecalho[base + 2] = h
+        self.cabecalho[base] = seq
+        self.cabecalho[0] = seq
+        return True
+
+    def seq_atual(self):
+        cabecalho = self.cabecalho
+        return int(cabecalho[0]) if cabecalho is not None else 0
+
+    def ler(self, ultimo_seq, destino=None):
+        """Retorna (PIL Image, seq) do frame mais recente ou (None, ultimo_seq) se não houver novo.
+
+        Com `destino` (imagem PIL do mesmo tamanho) o frame é copiado nela em vez de alocar outra.
+        """
+        seq = int(self.cabecalho[0])
+        if seq <= ultimo_seq: return None, ultimo_seq
+        k = seq % self.n_slots
+        base = 1 + 3 * k
+        if int(self.cabecalho[base]) != seq: return None, ultimo_seq
+        w, h = int(self.cabecalho[base + 1]), int(self.cabecalho[base + 2])
+        # Copia direto da memória compartilhada para o PIL (sem o tobytes intermediário)
+        if destino is not None and destino.size == (w, h):
+            destino.frombytes(self.dados[k, :w * h * 3], "raw", "RGB")
+            img = destino
+        else:
+            img = imagem_de_rgb(self.dados[k, :w * h * 3], (w, h))
+        if int(self.cabecalho[base]) != seq: return None, ultimo_seq
+        return img, seq
+
+    def fechar(self):
+        # Libera as views numpy antes de fechar o mapeamento
+        self.cabecalho = None
+        self.dados = None
+        try: self.shm.close()
+        except Exception: pass
+        if self.dono:
+            try: self.shm.unlink()
+            except Exception: pass
+
+# --- PROCESSO DE DECODIFICAÇÃO (POOL) ---
+def _processo_decodificacao(fila_comandos, fila_eventos):
+    """Loop de um processo do pool: executa CameraHandlers e publica frames em anéis compartilhados."""
+    handlers = {}
+    aneis = {}
+    estados = {}
+
+    def criar_publicador(chave):
+        def publicar(consumidor, rgb):
+            if chave not in handlers: return
+            anel = aneis.get((chave, consumidor))
+            if anel is None or rgb.nbytes > anel.capacidade:
+                # Aloca (ou realoca) o anel do consumidor com folga para o tamanho atual
+                novo = AnelFrames(capacidade=int(rgb.nbytes * 1.25))
+                aneis[(chave, consumidor)] = novo
+                fila_eventos.put(("anel", chave, consumidor, novo.nome))
+                if anel is not None: anel.fechar()
+                anel = novo
+            anel.escrever(rgb)
+        return publicar
+
+    def fechar_anel(chave_anel):
+        anel = aneis.pop(chave_anel, None)
+        # Aguarda a thread de leitura parar de escrever antes de liberar a memória
+        if anel: threading.Timer(1.0, anel.fechar).start()
+
+    def criar_notificador(chave):
+        ultimo = [0.0]
+        def notificar():
+            # Limita as notificações por câmera; a UI lê sempre o frame mais recente do anel
+            agora = time.time()
+            if agora - ultimo[0] >= 0.015:
+                ultimo[0] = agora
+                fila_eventos.put(("frame", chave))
+        return notificar
+
+    def conectar(chave, handler):
+        sucesso = handler.iniciar()
+        fila_eventos.put(("conexao", chave, sucesso, handler.ultimo_erro))
+
+    def encerrar(chave):
+        handler = handlers.pop(chave, None)
+        if handler: handler.parar()
+        estados.pop(chave, None)
+        for chave_anel in [k for k in aneis if k[0] == chave]:
+            fechar_anel(chave_anel)
+
+    while True:
+        try:
+            cmd = fila_comandos.get(timeout=1.0)
+        except queue.Empty:
+            # Encerra se a interface morreu sem avisar (ex.: os._exit)
+            pai = multiprocessing.parent_process()
+            if pai is not None and not pai.is_alive(): break
+            pid, rss = os.getpid(), memoria_residente()
+            for chave, handler in list(handlers.items()):
+                estado = (handler.rodando, handler.conectado)
+                if estados.get(chave) != estado:
+                    estados[chave] = estado
+                    fila_eventos.put(("estado", chave) + estado)
+                # Cópias das métricas para o /metrics da interface (os contadores vivem neste processo)
+                estatisticas, histogramas = handler.copiar_metricas()
+                estatisticas.update(pid=pid, rss_processo=rss)
+                fila_eventos.put(("metricas", chave, estatisticas, histogramas, handler.ultimo_erro))
+            continue
+
+        if cmd is None: break
+        tipo, chave = cmd[0], cmd[1]
+        try:
+            if tipo == "abrir":
+                ip, canal, user, password, nome = cmd[2:]
+                handler = CameraHandler(ip, canal, user=user, password=password)
+                handler.set_nome_display(nome)
+                handler.ao_publicar_frame = criar_publicador(chave)
+                handler.ao_frame_pronto = criar_notificador(chave)
+                handlers[chave] = handler
+                threading.Thread(target=conectar, args=(chave, handler), daemon=True).start()
+            elif tipo == "chamar":
+                metodo, args = cmd[2], cmd[3]
+                handler = handlers.get(chave)
+                if handler: getattr(handler, metodo)(*args)
+                if metodo == "remover_consumidor": fechar_anel((chave, args[0]))
+            elif tipo == "replay":
+                handler = handlers.get(chave)
+                fila_eventos.put(("replay", chave, handler.copiar_replay() if handler else None))
+            elif tipo == "parar":
+                encerrar(chave)
+        except Exception as e:
+            print(f"Erro no processo de decodificação ({chave}): {e}")
+
+    for chave in list(handlers.keys()):
+        encerrar(chave)
+
+class PoolDecodificacao:
+    """Pool de processos que decodificam as câmeras fora do GIL da interface."""
+    def __init__(self, n_processos=0):
+        n = n_processos or max(1, (os.cpu_count() or 2) - 1)
+        # spawn em todas as plataformas: fork com threads do Tk/FFmpeg ativas não é seguro
+        ctx = multiprocessing.get_context("spawn")
+        self.fila_eventos = ctx.Queue()
+        self.filas = []
+        self.processos = []
+        for _ in range(n):
+            fila = ctx.Queue()
+            proc = ctx.Process(target=_processo_decodificacao, args=(fila, self.fila_eventos), daemon=True)
+            proc.start()
+            self.filas.append(fila)
+            self.processos.append(proc)
+        self.carga = [0] * n
+        self.atribuicoes = {}
+        self.handlers = {}
+        self.contador = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self._loop_eventos, daemon=True).start()
+        print(f"Pool de decodificação iniciado com {n} processos")
+
+    def registrar(self, handler):
+        """Atribui o handler ao processo menos carregado e devolve a chave única dele."""
+        with self.lock:
+            self.contador += 1
+            chave = f"{handler.ip}#{self.contador}"
+            idx = self.carga.index(min(self.carga))
+            self.carga[idx] += 1
+            self.atribuicoes[chave] = idx
+            self.handlers[chave] = handler
+        return chave
+
+    def liberar(self, chave):
+        with self.lock:
+            idx = self.atribuicoes.pop(chave, None)
+            self.handlers.pop(chave, None)
+            if idx is not None: self.carga[idx] -= 1
+        if idx is not None: self.filas[idx].put(("parar", chave))
+
+    def enviar(self, chave, *cmd):
+        idx = self.atribuicoes.get(chave)
+        if idx is not None: self.filas[idx].put((cmd[0], chave) + tuple(cmd[1:]))
+
+    def _loop_eventos(self):
+        while True:
+            try:
+                evento = self.fila_eventos.get()
+                handler = self.handlers.get(evento[1])
+                if handler: handler._ao_evento(evento[0], *evento[2:])
+            except (EOFError, OSError):
+                break
+            except Exception as e:
+                print(f"Erro no pool de decodificação: {e}")
+
+    def encerrar(self):
+        for fila in self.filas:
+            try: fila.put(None)
+            except Exception: pass
+        for proc in self.processos:
+            proc.join(timeout=2)
+            if proc.is_alive(): proc.terminate()
+
+class CameraHandlerRemoto:
+    """Mesma interface do CameraHandler, mas a leitura roda em um processo do PoolDecodificacao.
+
+    A interface apenas mapeia o anel compartilhado e converte o frame mais recente em PIL.
+    """
+    def __init__(self, pool, ip, canal=102, user="admin", password="password"):
+        self.pool = pool
+        self.ip = ip
+        self.canal = canal
+        self.user = user
+        self.password = password
+        self.chave = None
         self.rodando = False
         self.conectado = False
+        self.ultimo_erro = None
+        self.tamanho_alvo = (640, 480)
+        self.interpolation = None
+        self.ip_display = ip
+        self.nome_display = ""
+        self.exibir_info = False
+        self.prioridade = False
+        self.visivel = True
+        self.lock = threading.Lock()
+        # Um anel por consumidor (slot), espelhando CameraHandler.consumidores
+        self.consumidores = {}
+        self.aneis = {}
+        self.ultimos_seq = {}
+        self.ultimos_frames = {}
+        # Segunda imagem de cada consumidor (buffer duplo com ultimos_frames, ver pegar_frame)
+        self.imagens_livres = {}
+        self.modo_miniatura = False
+        self.ao_frame_pronto = None
+        self.monitor_alcance = None
+        # Última cópia das métricas do handler no processo (atualizada a cada ~1 s)
+        self.estatisticas = {}
+        self.histogramas = {}
+        # Chamadas feitas antes do registro no pool (reenviadas logo após o "abrir")
+        self._chamadas_pendentes = []
+        self._conexao_concluida = threading.Event()
+        # Resposta do pedido de replay (instantâneo do anel que vive no processo)
+        self._replay = None
+        self._replay_pronto = threading.Event()
+
+    def iniciar(self):
+        # Offline no cache de alcance: nem ocupa o processo do pool
+        estado = self.monitor_alcance.consultar(self.ip) if self.monitor_alcance else None
+        if estado is not None and not estado[0]:
+            self.ultimo_erro = "OFFLINE"
+            return False
+        self.chave = self.pool.registrar(self)
+        self.pool.enviar(self.chave, "abrir", self.ip, self.canal, self.user, self.password, self.nome_display)
+        for metodo, args in self._chamadas_pendentes:
+            self.pool.enviar(self.chave, "chamar", metodo, args)
+        self._chamadas_pendentes = []
+        if not self._conexao_concluida.wait(timeout=30):
+            self.ultimo_erro = "ERRO DRIVER"
+        if not self.rodando:
+            self.pool.liberar(self.chave)
+        return self.rodando
+
+    def _ao_evento(self, tipo, *args):
+        if tipo == "frame":
+            if self.ao_frame_pronto is not None: self.ao_frame_pronto()
+        elif tipo == "conexao":
+            sucesso, erro = args
+            self.rodando = self.conectado = bool(sucesso)
+            self.ultimo_erro = erro
+            self._conexao_concluida.set()
+        elif tipo == "estado":
+            self.rodando, self.conectado = args
+        elif tipo == "metricas":
+            estatisticas, histogramas, erro = args
+            with self.lock: self.estatisticas, self.histogramas = estatisticas, histogramas
+            if erro: self.ultimo_erro = erro
+        elif tipo == "replay":
+            self._replay = args[0]
+            self._replay_pronto.set()
+        elif tipo == "anel":
+            consumidor, nome = args
+            try: novo = AnelFrames(nome=nome)
+            except Exception as e:
+                print(f"Erro ao mapear anel de {self.ip_display}: {e}")
+                return
+            with self.lock:
+                antigo = self.aneis.get(consumidor)
+                self.aneis[consumidor] = novo
+                self.ultimos_seq[consumidor] = 0
+            if antigo: antigo.fechar()
+
+    def _chamar(self, metodo, *args):
+        if self.chave: self.pool.enviar(self.chave, "chamar", metodo, args)
+        else: self._chamadas_pendentes.append((metodo, args))
+
+    def set_prioridade(self, estado):
+        if self.prioridade != estado:
+            self.prioridade = estado
+            self._chamar("set_prioridade", estado)
+
+    def set_exibir_info(self, estado):
+        if self.exibir_info != estado:
+            self.exibir_info = estado
+            self._chamar("set_exibir_info", estado)
+
+    def set_visivel(self, estado):
+        if self.visivel != estado:
+            self.visivel = estado
+            self._chamar("set_visivel", estado)
+
+    def set_modo_miniatura(self, estado):
+        if self.modo_miniatura != estado:
+            self.modo_miniatura = estado
+            self._chamar("set_modo_miniatura", estado)
+
+    def set_replay(self, segundos, max_bytes=24 * 1024 * 1024, max_bytes_total=None):
+        self._chamar("set_replay", segundos, max_bytes, max_bytes_total)
 
-    def pegar_frame(self):
+    def copiar_metricas(self):
+        """A cópia recebida do processo não é alterada depois: basta ler o par sob o lock."""
         with self.lock:
-            self.novo_frame = False
-            return self.frame_pil
+            return self.estatisticas, self.histogramas
+
+    def copiar_replay(self, timeout=5.0):
+        if not self.chave: return None
+        self._replay_pronto.clear()
+        self.pool.enviar(self.chave, "replay")
+        if not self._replay_pronto.wait(timeout): return None
+        dados, self._replay = self._replay, None
+        return dados
+
+    def set_canal(self, novo_canal):
+        if self.canal != novo_canal:
+            self.canal = novo_canal
+            self._chamar("set_canal", novo_canal)
+
+    def set_tamanho_alvo(self, tamanho):
+        if self.tamanho_alvo != tamanho or None not in self.consumidores:
+            self.tamanho_alvo = tamanho
+            self.consumidores[None] = (tamanho, self.interpolation)
+            self._chamar("set_tamanho_alvo", tamanho)
+
+    def registrar_consumidor(self, chave, tamanho, interpolacao=None):
+        if self.consumidores.get(chave) != (tamanho, interpolacao):
+            self.consumidores[chave] = (tamanho, interpolacao)
+            self._chamar("registrar_consumidor", chave, tamanho, interpolacao)
+
+    def remover_consumidor(self, chave):
+        if self.consumidores.pop(chave, None) is None: return
+        self._chamar("remover_consumidor", chave)
+        with self.lock:
+            anel = self.aneis.pop(chave, None)
+            self.ultimos_frames.pop(chave, None)
+            self.imagens_livres.pop(chave, None)
+        if anel: anel.fechar()
+
+    def set_interpolacao(self, interpolacao):
+        if self.interpolation != interpolacao:
+            self.interpolation = interpolacao
+            self._chamar("set_interpolacao", interpolacao)
+
+    def set_nome_display(self, nome):
+        self.nome_display = nome
+        self._chamar("set_nome_display", nome)
+
+    def tem_frame_novo(self, chave=None):
+        anel = self.aneis.get(chave)
+        return anel is not None and anel.seq_atual() > self.ultimos_seq.get(chave, 0)
+
+    @property
+    def novo_frame(self):
+        return self.tem_frame_novo(None)
+
+    def pegar_frame(self, chave=None):
+        with self.lock:
+            anel = self.aneis.get(chave)
+            if anel is not None:
+                # Escreve na imagem que não foi entregue por último (a interface pode estar usando-a)
+                img, self.ultimos_seq[chave] = anel.ler(self.ultimos_seq.get(chave, 0), self.imagens_livres.get(chave))
+                if img is not None:
+                    self.imagens_livres[chave] = self.ultimos_frames.get(chave)
+                    self.ultimos_frames[chave] = img
+            return self.ultimos_frames.get(chave)
 
     def parar(self):
         self.rodando = False
         self.conectado = False
+        if self.chave: self.pool.liberar(self.chave)
+        with self.lock:
+            aneis, self.aneis = self.aneis, {}
+        for anel in aneis.values(): anel.fechar()
+
+# --- GRAVAÇÃO EM SEGMENTOS (CÓPIA DE STREAM, SEM RECODIFICAR) ---
+class _SaidaBufferizada:
+    """Arquivo de saída do muxer: cada write vira um bloco na fila da thread de disco."""
+    def __init__(self, fila, caminho):
+        self.fila = fila
+        self.caminho = caminho
+
+    def write(self, dados):
+        self.fila.put((self.caminho, bytes(dados)))
+        return len(dados)
+
+class GravadorCamera:
+    """Grava os pacotes do stream em segmentos MKV/MP4 por cópia (remux), sem decodificar.
+
+    Usa conexão própria (PyAV), ou seja, uma sessão RTSP a mais com a câmera no canal de
+    gravação. A thread de rede só faz demux/remux para memória; a escrita em disco fica numa
+    segunda thread. Se a fila do disco passar de `max_blocos_pendentes`, fecha o segmento e
+    descarta pacotes (sem bloquear) até ela baixar a `max_blocos_pendentes // 4`; o próximo
+    segmento começa no I-frame seguinte. Ao fechar cada segmento aplica a retenção por idade e por cota.
+    """
+    FORMATOS = {"mkv": ("matroska", {}),
+                "mp4": ("mp4", {"movflags": "frag_keyframe+empty_moov+default_base_moof"})}
+
+    def __init__(self, url, pasta, duracao_segmento=60, retencao_horas=24, cota_mb=2048, formato="mkv",
+                 nome="", max_blocos_pendentes=2000):
+        self.url = url
+        self.pasta = pasta
+        self.duracao_segmento = duracao_segmento
+        self.retencao_horas = retencao_horas
+        self.cota_mb = cota_mb
+        self.formato = formato if formato in self.FORMATOS else "mkv"
+        self.nome = nome
+        self.max_blocos_pendentes = max_blocos_pendentes
+        self.min_blocos_pendentes = max_blocos_pendentes // 4
+        self.fila_disco = queue.Queue()
+        self.rodando = True
+        self.gravando = False
+        self.ultimo_erro = None
+        self.backoff = BackoffExponencial()
+        self.estatisticas = {"pacotes": 0, "bytes": 0, "descartados": 0, "segmentos": 0, "removidos": 0}
+        os.makedirs(pasta, exist_ok=True)
+        self.thread_rede = threading.Thread(target=self._loop_rede, daemon=True)
+        self.thread_disco = threading.Thread(target=self._loop_disco, daemon=True)
+        self.thread_rede.start()
+        self.thread_disco.start()
+
+    def parar(self, aguardar=0.0):
+        self.rodando = False
+        if aguardar: self.thread_disco.join(aguardar)
+
+    def _abrir_entrada(self):
+        with sem_conexao:
+            return av.open(self.url, options=LeitorPyAV.OPCOES, timeout=5.0)
+
+    def _abrir_segmento(self, stream_entrada, agora):
+        nome = time.strftime("%Y%m%d-%H%M%S", time.localtime(agora)) + f"-{int(agora * 1000) % 1000:03d}.{self.formato}"
+        caminho = os.path.join(self.pasta, nome)
+        formato, opcoes = self.FORMATOS[self.formato]
+        saida = av.open(_SaidaBufferizada(self.fila_disco, caminho), "w", format=formato, options=opcoes)
+        try: stream_saida = saida.add_stream_from_template(stream_entrada)
+        except AttributeError: stream_saida = saida.add_stream(template=stream_entrada)
+        return caminho, saida, stream_saida
+
+    def _fechar_segmento(self, segmento):
+        caminho, saida, _ = segmento
+        try: saida.close()
+        except Exception as e: print(f"Erro ao fechar segmento {caminho}: {e}")
+        self.fila_disco.put((caminho, None))
+
+    def _loop_rede(self):
+        while self.rodando:
+            entrada = segmento = None
+            try:
+                entrada = self._abrir_entrada()
+                stream = entrada.streams.video[0]
+                self.gravando = True
+                self.ultimo_erro = None
+                inicio = offset = 0
+                atrasado = False
+                for pacote in entrada.demux(stream):
+                    if not self.rodando: break
+                    if pacote.dts is None or pacote.size == 0: continue
+                    if self.backoff.falhas: self.backoff.resetar()
+                    pendentes = self.fila_disco.qsize()
+                    if pendentes > self.max_blocos_pendentes:
+                        # Disco não acompanha: fecha o segmento e só volta a gravar quando a fila esvaziar
+                        if segmento is not None: self._fechar_segmento(segmento)
+                        segmento = None
+                        atrasado = True
+                    elif atrasado and pendentes <= self.min_blocos_pendentes:
+                        atrasado = False
+                    if pacote.is_keyframe and not atrasado:
+                        agora = time.time()
+                        if segmento is None or agora - inicio >= self.duracao_segmento:
+                            if segmento is not None: self._fechar_segmento(segmento)
+                            segmento = self._abrir_segmento(stream, agora)
+                            inicio, offset = agora, pacote.dts
+                    # Segmentos sempre começam num I-frame
+                    if segmento is None:
+                        if atrasado: self.estatisticas["descartados"] += 1
+                        continue
+                    pacote.dts -= offset
+                    if pacote.pts is not None: pacote.pts -= offset
+                    pacote.stream = segmento[2]
+                    segmento[1].mux(pacote)
+                    self.estatisticas["pacotes"] += 1
+            except Exception as e:
+                self.ultimo_erro = str(e)
+                print(f"Erro na gravação de {self.nome or self.url}: {e}")
+            finally:
+                if segmento is not None: self._fechar_segmento(segmento)
+                if entrada is not None:
+                    try: entrada.close()
+                    except Exception: pass
+                self.gravando = False
+
+            if not self.rodando: break
+            limite = time.time() + self.backoff.proximo()
+            while self.rodando and time.time() < limite: time.sleep(0.1)
+            if not limitador_reconexoes.adquirir(lambda: self.rodando): break
+        self.fila_disco.put(None)
+
+    def _loop_disco(self):
+        abertos = {}
+        while True:
+            item = self.fila_disco.get()
+            if item is None: break
+            caminho, dados = item
+            try:
+                arquivo = abertos.get(caminho)
+                if arquivo is None:
+                    arquivo = abertos[caminho] = open(caminho, "wb", buffering=1 << 20)
+                if dados is None:
+                    arquivo.close()
+                    del abertos[caminho]
+                    self.estatisticas["segmentos"] += 1
+                    self._aplicar_retencao(abertos)
+                else:
+                    arquivo.write(dados)
+                    self.estatisticas["bytes"] += len(dados)
+            except Exception as e:
+                print(f"Erro ao gravar {caminho}: {e}")
+        for arquivo in abertos.values():
+            try: arquivo.close()
+            except Exception: pass
+
+    def _aplicar_retencao(self, abertos=()):
+        """Remove os segmentos mais antigos que a retenção e, depois, os mais antigos até caber na cota."""
+        try:
+            segmentos = []
+            for nome in os.listdir(self.pasta):
+                if not nome.endswith((".mkv", ".mp4")): continue
+                caminho = os.path.join(self.pasta, nome)
+                if caminho in abertos: continue
+                info = os.stat(caminho)
+                segmentos.append((info.st_mtime, info.st_size, caminho))
+        except OSError: return
+        segmentos.sort()
+        total = sum(tamanho for _, tamanho, _ in segmentos)
+        limite_idade = time.time() - self.retencao_horas * 3600
+        cota = self.cota_mb * 1024 * 1024
+        for mtime, tamanho, caminho in segmentos:
+            if mtime >= limite_idade and total <= cota: break
+            try:
+                os.remove(caminho)
+                total -= tamanho
+                self.estatisticas["removidos"] += 1
+            except OSError: pass
+
+# --- PERSISTÊNCIA (ESCRITA ADIADA E ATÔMICA) ---
+class PersistenciaAdiada:
+    """Grava os arquivos JSON de configuração fora da thread da interface.
+
+    Cada `agendar` serializa o estado atual (na thread de quem chama) e substitui o pedido
+    pendente do mesmo arquivo; a thread grava após `atraso` s sem mudanças (no máximo
+    `atraso_max` s após a primeira), sempre via arquivo temporário + os.replace.
+    """
+    def __init__(self, atraso=0.5, atraso_max=2.0):
+        self.atraso = atraso
+        self.atraso_max = atraso_max
+        self.pendentes = {}
+        self.primeiro = self.ultimo = 0.0
+        self.rodando = True
+        self.cond = threading.Condition()
+        # Serializa as escritas da thread com o descarregar() do encerramento. Ordem: lock_escrita
+        # antes de cond, e o pedido pendente só é retirado com lock_escrita em mãos (ver _gravar)
+        self.lock_escrita = threading.Lock()
+        self.estatisticas = {"agendados": 0, "gravados": 0, "erros": 0}
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def agendar(self, caminho, dados):
+        texto = json.dumps(dados, ensure_ascii=False, indent=4)
+        with self.cond:
+            agora = time.monotonic()
+            if not self.pendentes: self.primeiro = agora
+            self.ultimo = agora
+            self.pendentes[caminho] = texto
+            self.estatisticas["agendados"] += 1
+            self.cond.notify()
+
+    @staticmethod
+    def gravar_atomico(caminho, texto):
+        temporario = caminho + ".tmp"
+        with open(temporario, "w", encoding='utf-8') as f:
+            f.write(texto)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+
+    def _gravar(self):
+        # Retirar e gravar sob o mesmo lock: um instantâneo mais antigo nunca é gravado por
+        # cima de um mais novo (thread x descarregar() do encerramento)
+        with self.lock_escrita:
+            with self.cond:
+                pendentes, self.pendentes = self.pendentes, {}
+            for caminho, texto in pendentes.items():
+                try:
+                    self.gravar_atomico(caminho, texto)
+                    self.estatisticas["gravados"] += 1
+                except Exception as e:
+                    self.estatisticas["erros"] += 1
+                    print(f"Erro ao salvar {caminho}: {e}")
+
+    def descarregar(self):
+        """Grava já tudo o que estiver pendente (usado no encerramento)."""
+        self._gravar()
+
+    def parar(self):
+        with self.cond:
+            self.rodando = False
+            self.cond.notify()
+        self.descarregar()
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while self.rodando and not self.pendentes:
+                    self.cond.wait()
+                if not self.rodando: return
+                # Debounce: espera a rajada de mudanças acabar, sem adiar indefinidamente
+                agora = time.monotonic()
+                prazo = min(self.ultimo + self.atraso, self.primeiro + self.atraso_max)
+                if agora < prazo:
+                    self.cond.wait(prazo - agora)
+                    continue
+            self._gravar()
+
+# --- CACHE DE MINIATURAS (ÚLTIMO FRAME POR CÂMERA) ---
+class CacheMiniaturas:
+    """Guarda em disco um JPEG pequeno do último frame de cada câmera, para a próxima abertura.
+
+    `oferecer` só copia o frame (no máximo um por câmera a cada `intervalo` s; os handlers
+    reaproveitam as imagens); a redução, a compressão e a escrita atômica ficam numa thread própria.
+    """
+    def __init__(self, pasta, intervalo=15.0, tamanho_max=(480, 270), qualidade=70):
+        self.pasta = pasta
+        self.intervalo = intervalo
+        self.tamanho_max = tamanho_max
+        self.qualidade = qualidade
+        self.ultimos = {}
+        self.pendentes = {}
+        self.cond = threading.Condition()
+        self.lock_escrita = threading.Lock()
+        self.rodando = True
+        os.makedirs(pasta, exist_ok=True)
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def caminho(self, ip):
+        return os.path.join(self.pasta, ip.replace(":", "_") + ".jpg")
+
+    def oferecer(self, ip, img):
+        agora = time.monotonic()
+        if agora - self.ultimos.get(ip, -self.intervalo) < self.intervalo: return False
+        self.ultimos[ip] = agora
+        img = img.copy()
+        with self.cond:
+            self.pendentes[ip] = img
+            self.cond.notify()
+        return True
+
+    def carregar(self, ip):
+        """(imagem PIL, horário do arquivo) da última miniatura salva, ou None."""
+        caminho = self.caminho(ip)
+        try:
+            with Image.open(caminho) as img:
+                img.load()
+                return img.convert("RGB"), os.path.getmtime(caminho)
+        except (OSError, ValueError):
+            return None
+
+    def _gravar(self, pendentes):
+        with self.lock_escrita:
+            for ip, img in pendentes.items():
+                caminho = self.caminho(ip)
+                try:
+                    img.thumbnail(self.tamanho_max)
+                    img.save(caminho + ".tmp", "JPEG", quality=self.qualidade)
+                    os.replace(caminho + ".tmp", caminho)
+                except Exception as e:
+                    print(f"Erro ao salvar miniatura de {ip}: {e}")
+
+    def descarregar(self):
+        with self.cond:
+            pendentes, self.pendentes = self.pendentes, {}
+        self._gravar(pendentes)
+
+    def parar(self):
+        with self.cond:
+            self.rodando = False
+            self.cond.notify()
+        self.descarregar()
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while self.rodando and not self.pendentes:
+                    self.cond.wait()
+                if not self.rodando: return
+                pendentes, self.pendentes = self.pendentes, {}
+            self._gravar(pendentes)
+
+# --- CONTROLE PTZ (CANAL PERSISTENTE POR CÂMERA) ---
+class ControlePTZ:
+    """Envia os comandos PTZ (ISAPI) de uma câmera por uma única thread e conexão.
+
+    A Session mantém a conexão aberta e o HTTPDigestAuth reaproveita o nonce (sem o 401 de
+    desafio a cada comando). A fila preserva a ordem: um movimento ainda não enviado é
+    substituído pelo mais recente, STOPs seguidos viram um só e nada passa à frente de um STOP.
+    """
+    VETORES = {"UP": (0, 100), "DOWN": (0, -100), "LEFT": (-100, 0), "RIGHT": (100, 0), "STOP": (0, 0)}
+    LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+    def __init__(self, ip, user, password, url=None, timeout=1.0):
+        self.ip = ip
+        self.url = url or f"http://{ip}/ISAPI/PTZCtrl/channels/1/continuous"
+        self.timeout = timeout
+        self.sessao = requests.Session()
+        self.sessao.auth = requests.auth.HTTPDigestAuth(user, password)
+        adaptador = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.mount("https://", adaptador)
+        self.fila = deque()
+        self.cond = threading.Condition()
+        self.rodando = True
+        self.histograma_latencia = Histograma(self.LIMITES_LATENCIA)
+        self.estatisticas = {"enviados": 0, "coalescidos": 0, "erros": 0}
+        # Chamado após cada envio com (direção, latência em s, sucesso)
+        self.ao_enviar = None
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    @classmethod
+    def xml(cls, direcao):
+        pan, tilt = cls.VETORES[direcao]
+        return f"""<?xml version="1.0" encoding="UTF-8"?>
+        <PTZData xmlns="http://www.isapi.org/ver20/XMLSchema">
+            <pan>{pan}</pan>
+            <tilt>{tilt}</tilt>
+        </PTZData>"""
+
+    def enviar(self, direcao):
+        if direcao not in self.VETORES: return
+        with self.cond:
+            ultimo = self.fila[-1] if self.fila else None
+            if ultimo is not None and (ultimo == "STOP") == (direcao == "STOP"):
+                # Movimento pendente superado pelo novo (ou STOP repetido): só o último vai para a rede
+                self.fila[-1] = direcao
+                self.estatisticas["coalescidos"] += 1
+            else:
+                self.fila.append(direcao)
+            self.cond.notify()
+
+    def parar(self):
+        with self.cond:
+            self.rodando = False
+            self.cond.notify()
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while self.rodando and not self.fila:
+                    self.cond.wait()
+                if not self.rodando: break
+                direcao = self.fila.popleft()
+            t0 = time.perf_counter()
+            sucesso = False
+            try:
+                resposta = self.sessao.put(self.url, data=self.xml(direcao), timeout=self.timeout)
+                sucesso = resposta.ok
+                if not sucesso: print(f"PTZ {self.ip}: HTTP {resposta.status_code}")
+            except Exception as e:
+                print(f"Erro PTZ {self.ip}: {e}")
+            latencia = time.perf_counter() - t0
+            self.histograma_latencia.observar(latencia)
+            self.estatisticas["enviados" if sucesso else "erros"] += 1
+            if self.ao_enviar is not None: self.ao_enviar(direcao, latencia, sucesso)
+        self.sessao.close()
+
+# --- SINALIZAÇÃO DE FRAMES PRONTOS ---
+class SinalizadorFrames:
+    """Acorda a UI quando há frames novos, coalescendo vários sinais em um único tick.
+
+    As threads de captura apenas setam um threading.Event (nenhuma chamada ao Tk fora da
+    thread da interface); a própria thread da interface confere o Event a cada `intervalo_ms`
+    via after() e chama `ao_sinal`, que agenda o tick de exibição.
+    """
+    def __init__(self, widget, ao_sinal, intervalo_ms=5):
+        self.widget = widget
+        self.ao_sinal = ao_sinal
+        self.intervalo_ms = intervalo_ms
+        self.sinal = threading.Event()
+        # Tick já pedido e ainda não iniciado (limpo no início de cada tick)
+        self.pendente = False
+        self.ativo = True
+        self._agendado = self.widget.after(self.intervalo_ms, self._verificar)
+
+    def sinalizar(self):
+        self.sinal.set()
+
+    def limpar(self):
+        """Chamado no início do tick: os frames publicados até aqui serão consumidos por ele."""
+        self.sinal.clear()
+        self.pendente = False
+
+    def parar(self):
+        self.ativo = False
+        try: self.widget.after_cancel(self._agendado)
+        except Exception: pass
+
+    def _verificar(self):
+        if not self.ativo: return
+        if self.sinal.is_set() and not self.pendente:
+            self.sinal.clear()
+            self.pendente = True
+            try: self.ao_sinal()
+            except Exception as e:
+                self.pendente = False
+                print(f"Erro ao sinalizar frames: {e}")
+        self._agendado = self.widget.after(self.intervalo_ms, self._verificar)
+
+# --- AGENDADOR DE CONEXÕES POR PRIORIDADE ---
+class AgendadorConexoes:
+    """Fila de conexões ordenada por prioridade (menor = primeiro) com concorrência limitada.
+
+    Os workers bloqueiam numa Condition até haver trabalho; cada IP tem no máximo uma entrada
+    pendente, que pode ser reprioritizada ou cancelada (entradas antigas ficam inválidas no heap).
+    """
+    def __init__(self, executar, n_workers=6):
+        self.executar = executar
+        self.condicao = threading.Condition()
+        self.heap = []
+        self.pendentes = {}
+        self.sequencia = itertools.count()
+        self.em_andamento = 0
+        self.rodando = True
+        self.estatisticas = {"agendadas": 0, "iniciadas": 0, "canceladas": 0}
+        # Tempo entre o pedido de conexão e o início efetivo (segundos)
+        self.histograma_espera = Histograma(Histograma.LIMITES_ABERTURA)
+        for _ in range(max(1, n_workers)):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _inserir(self, prioridade, ip, canal, ts):
+        # [prioridade, seq, ip, canal, ts, válida]: seq desempata na ordem de chegada
+        entrada = [prioridade, next(self.sequencia), ip, canal, ts, True]
+        self.pendentes[ip] = entrada
+        heapq.heappush(self.heap, entrada)
+
+    def agendar(self, ip, canal, prioridade):
+        """Enfileira (ou atualiza canal/prioridade de) uma conexão, mantendo o instante original do pedido."""
+        with self.condicao:
+            antiga = self.pendentes.get(ip)
+            if antiga is not None:
+                antiga[-1] = False
+                ts = antiga[4]
+            else:
+                ts = time.perf_counter()
+                self.estatisticas["agendadas"] += 1
+            self._inserir(prioridade, ip, canal, ts)
+            self.condicao.notify()
+
+    def cancelar(self, ip):
+        with self.condicao:
+            entrada = self.pendentes.pop(ip, None)
+            if entrada is None: return False
+            entrada[-1] = False
+            self.estatisticas["canceladas"] += 1
+            return True
+
+    def limpar(self):
+        with self.condicao:
+            for entrada in self.pendentes.values(): entrada[-1] = False
+            self.estatisticas["canceladas"] += len(self.pendentes)
+            self.pendentes.clear()
+            self.heap = []
+
+    def reprioritizar(self, prioridade_de):
+        """Recalcula a prioridade de todas as conexões pendentes (ex.: mudou o slot selecionado)."""
+        with self.condicao:
+            entradas = list(self.pendentes.values())
+            self.pendentes.clear()
+            self.heap = []
+            for entrada in sorted(entradas, key=lambda e: e[1]):
+                self._inserir(prioridade_de(entrada[2]), entrada[2], entrada[3], entrada[4])
+
+    def tamanho(self):
+        return len(self.pendentes)
+
+    def parar(self):
+        with self.condicao:
+            self.rodando = False
+            self.condicao.notify_all()
+
+    def _worker(self):
+        while True:
+            with self.condicao:
+                while self.rodando and not self.pendentes:
+                    self.condicao.wait()
+                if not self.rodando: return
+                entrada = heapq.heappop(self.heap)
+                while not entrada[-1]:
+                    entrada = heapq.heappop(self.heap)
+                _, _, ip, canal, ts, _ = entrada
+                del self.pendentes[ip]
+                self.em_andamento += 1
+                self.estatisticas["iniciadas"] += 1
+                self.histograma_espera.observar(time.perf_counter() - ts)
+            try:
+                self.executar(ip, canal)
+            except Exception as e:
+                print(f"Erro no agendador de conexões ({ip}): {e}")
+            finally:
+                with self.condicao:
+                    self.em_andamento -= 1
+
+# --- POOL DE CONEXÕES AQUECIDAS ---
+class PoolAquecido:
+    """Mantém conectadas (ocultas) as câmeras que saíram do grid há pouco, com despejo LRU.
+
+    Oculto, o handler só drena o stream (no modo PyAV, apenas I-frames), então voltar a
+    câmera para o grid não paga de novo o handshake RTSP.
+    """
+    def __init__(self, max_handlers=4, ociosidade_max=300.0):
+        self.max_handlers = max_handlers
+        self.ociosidade_max = ociosidade_max
+        # ip -> (handler, instante em que entrou no pool); o primeiro é o menos recente
+        self.handlers = OrderedDict()
+        # IPs pré-aquecidos: não contam no limite LRU (só expiram por ociosidade)
+        self.protegidos = set()
+        self.estatisticas = {"guardados": 0, "reusos": 0, "despejos": 0}
+
+    def guardar(self, ip, handler):
+        if (self.max_handlers <= 0 and ip not in self.protegidos) or not getattr(handler, 'rodando', False):
+            handler.parar()
+            return
+        anterior = self.handlers.pop(ip, None)
+        if anterior is not None and anterior[0] is not handler: anterior[0].parar()
+        handler.set_prioridade(False)
+        handler.set_visivel(False)
+        self.handlers[ip] = (handler, time.time())
+        self.estatisticas["guardados"] += 1
+        comuns = [ip for ip in self.handlers if ip not in self.protegidos]
+        while len(comuns) > self.max_handlers:
+            self._despejar(comuns.pop(0))
+
+    def retirar(self, ip):
+        """Handler ainda vivo para o IP (removido do pool), ou None."""
+        item = self.handlers.pop(ip, None)
+        if item is None: return None
+        handler = item[0]
+        if not getattr(handler, 'rodando', False):
+            handler.parar()
+            return None
+        self.estatisticas["reusos"] += 1
+        return handler
+
+    def handlers_ativos(self):
+        """Handlers guardados no pool (sem o instante de entrada)."""
+        return [handler for handler, _ in list(self.handlers.values())]
+
+    def expirar(self):
+        agora = time.time()
+        for ip, (handler, ts) in list(self.handlers.items()):
+            if agora - ts > self.ociosidade_max or not getattr(handler, 'rodando', False):
+                self._despejar(ip)
+
+    def _despejar(self, ip):
+        handler, _ = self.handlers.pop(ip)
+        self.estatisticas["despejos"] += 1
+        try: handler.parar()
+        except: pass
+
+    def esvaziar(self):
+        for ip in list(self.handlers):
+            self._despejar(ip)
+
+# --- COMPOSITOR DO GRID (CANVAS ÚNICO) ---
+class CompositorGrid:
+    """Compõe todos os slots em um buffer único e publica em uma só imagem de Canvas.
+
+    Substitui os 20 CTkLabel/CTkImage: cada frame novo é colado no buffer PIL e,
+    uma vez por tick, apenas as regiões sujas são enviadas ao Tk.
+    """
+    # Acima desta fração de área suja compensa enviar o buffer inteiro em uma única chamada
+    LIMITE_ENVIO_TOTAL = 0.5
+
+    def __init__(self, parent, n_slots=20, cor_fundo="#000000", cor_slot="#1A1A1A",
+                 cor_texto="#E0E0E0", cor_selecao="#D32F2F"):
+        self.n_slots = n_slots
+        self.cor_fundo = cor_fundo
+        self.cor_slot = cor_slot
+        self.cor_selecao = cor_selecao
+        self.canvas = tk.Canvas(parent, bg=cor_fundo, highlightthickness=0, bd=0)
+        self.tamanho = (0, 0)
+        self.buffer = None
+        self.foto = None
+        self.item_imagem = None
+        self.retangulos = [None] * n_slots
+        self.textos = [None] * n_slots
+        self.itens_texto = [self.canvas.create_text(0, 0, text="", fill=cor_texto, font=("Roboto", 12, "bold"),
+                                                    justify="center", state="hidden")
+                            for _ in range(n_slots)]
+        self.item_selecao = self.canvas.create_rectangle(0, 0, 0, 0, outline=cor_selecao, width=2, state="hidden")
+        self.slot_selecionado = None
+        # Imagens Tk intermediárias por slot (reutilizadas) para envio de regiões parciais
+        self.fotos_slot = [None] * n_slots
+        self.sujos = set()
+        self.chamadas_tk = 0
+
+    def destruir(self):
+        try: self.canvas.destroy()
+        except: pass
+        self.foto = None
+        self.fotos_slot = [None] * self.n_slots
+
+    def _redimensionar(self, w, h):
+        if (w, h) == self.tamanho: return False
+        self.tamanho = (w, h)
+        # Buffer de composição pré-alocado (realocado apenas quando o grid muda de tamanho)
+        self.buffer = Image.new("RGB", (w, h), self.cor_fundo)
+        self.foto = ImageTk.PhotoImage("RGB", (w, h), master=self.canvas)
+        if self.item_imagem is None:
+            self.item_imagem = self.canvas.create_image(0, 0, image=self.foto, anchor="nw")
+            self.canvas.tag_lower(self.item_imagem)
+        else:
+            self.canvas.itemconfigure(self.item_imagem, image=self.foto)
+        self.fotos_slot = [None] * self.n_slots
+        return True
+
+    def atualizar_layout(self, slot_frames, retangulos=None):
+        """Recalcula os retângulos de cada slot a partir da geometria dos frames do grid.
+
+        `retangulos` ((x, y, w, h) de cada frame, None se oculto, ex.: GeometriaSlots) evita
+        consultar winfo_* frame a frame.
+        """
+        w, h = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if w < 2 or h < 2: return
+        mudou = self._redimensionar(w, h)
+
+        if retangulos is None:
+            retangulos = [(frm.winfo_x(), frm.winfo_y(), frm.winfo_width(), frm.winfo_height())
+                          if frm.winfo_ismapped() else None for frm in slot_frames]
+        novos = []
+        for rect in retangulos:
+            if rect is None:
+                novos.append(None)
+                continue
+            fx, fy, fw, fh = rect
+            novos.append((fx + 3, fy + 3, max(1, fw - 6), max(1, fh - 6)))
+
+        if not mudou and novos == self.retangulos: return
+        self.retangulos = novos
+
+        # Layout mudou: limpa tudo e redesenha os fundos/textos nas novas posições
+        self.buffer.paste(self.cor_fundo, (0, 0, w, h))
+        for i, rect in enumerate(novos):
+            item = self.itens_texto[i]
+            if rect is None:
+                self.canvas.itemconfigure(item, state="hidden")
+                continue
+            x, y, rw, rh = rect
+            self.buffer.paste(self.cor_slot, (x, y, x + rw, y + rh))
+            self.canvas.coords(item, x + rw // 2, y + rh // 2)
+            self.canvas.itemconfigure(item, state="normal" if self.textos[i] else "hidden")
+            self.sujos.add(i)
+        self.sujos.add(None)  # Marca envio total
+        self.definir_selecao(self.slot_selecionado)
+
+    def tamanho_slot(self, i):
+        rect = self.retangulos[i]
+        if rect is None: return None
+        return rect[2], rect[3]
+
+    def definir_texto(self, i, texto):
+        if self.textos[i] == texto: return
+        self.textos[i] = texto
+        item = self.itens_texto[i]
+        self.canvas.itemconfigure(item, text=texto or "", state="normal" if texto and self.retangulos[i] else "hidden")
+        self.chamadas_tk += 1
+        rect = self.retangulos[i]
+        if texto and rect is not None:
+            x, y, rw, rh = rect
+            self.buffer.paste(self.cor_slot, (x, y, x + rw, y + rh))
+            self.sujos.add(i)
+
+    def atualizar_slot(self, i, pil_img):
+        """Cola um frame no buffer de composição (sem tocar no Tk)."""
+        rect = self.retangulos[i]
+        if rect is None or pil_img is None: return
+        x, y, rw, rh = rect
+        if pil_img.width > rw or pil_img.height > rh:
+            pil_img = pil_img.crop((0, 0, min(rw, pil_img.width), min(rh, pil_img.height)))
+        self.buffer.paste(pil_img, (x, y))
+        if self.textos[i]:
+            self.textos[i] = ""
+            self.canvas.itemconfigure(self.itens_texto[i], text="", state="hidden")
+            self.chamadas_tk += 1
+        self.sujos.add(i)
+
+    def definir_selecao(self, i):
+        self.slot_selecionado = i
+        rect = self.retangulos[i] if i is not None and 0 <= i < self.n_slots else None
+        if rect is None:
+            self.canvas.itemconfigure(self.item_selecao, state="hidden")
+            return
+        x, y, rw, rh = rect
+        self.canvas.coords(self.item_selecao, x - 2, y - 2, x + rw + 1, y + rh + 1)
+        self.canvas.itemconfigure(self.item_selecao, state="normal")
+        self.canvas.tag_raise(self.item_selecao)
+
+    def aplicar(self):
+        """Envia ao Tk as regiões sujas do tick. Retorna o número de chamadas Tk realizadas."""
+        chamadas, self.chamadas_tk = self.chamadas_tk, 0
+        if not self.sujos or self.foto is None: return chamadas
+
+        w, h = self.tamanho
+        sujos = [i for i in self.sujos if i is not None and self.retangulos[i] is not None]
+        area_suja = sum(self.retangulos[i][2] * self.retangulos[i][3] for i in sujos)
+
+        if None in self.sujos or area_suja >= w * h * self.LIMITE_ENVIO_TOTAL:
+            self.foto.paste(self.buffer)
+            chamadas += 1
+        else:
+            nome_foto = str(self.foto)
+            for i in sujos:
+                x, y, rw, rh = self.retangulos[i]
+                parcial = self.fotos_slot[i]
+                if parcial is None or parcial.width() != rw or parcial.height() != rh:
+                    parcial = ImageTk.PhotoImage("RGB", (rw, rh), master=self.canvas)
+                    self.fotos_slot[i] = parcial
+                parcial.paste(self.buffer.crop((x, y, x + rw, y + rh)))
+                self.canvas.tk.call(nome_foto, "copy", str(parcial), "-to", x, y)
+                chamadas += 2
+        self.sujos.clear()
+        return chamadas
+
+# --- GEOMETRIA DOS SLOTS (CACHE ALIMENTADO POR <Configure>) ---
+class GeometriaSlots:
+    """Retângulo (x, y, w, h) de cada slot em pixels, mantido pelos eventos <Configure>/<Map>/<Unmap>.
+
+    O loop de exibição lê os tamanhos daqui em vez de consultar winfo_* a cada tick. O tamanho
+    entregue aos handlers só acompanha o real depois de `atraso` s sem mudanças, para que arrastar
+    a borda da janela não faça todos realocarem buffers a cada tamanho intermediário; depois de
+    uma transição (maximizar, restaurar, tela cheia) a primeira mudança vale na hora.
+    """
+    def __init__(self, n_slots, atraso=0.25, margem=6):
+        self.atraso = atraso
+        self.margem = margem
+        self.retangulos = [None] * n_slots
+        self.mapeados = [False] * n_slots
+        self.alvos = [None] * n_slots
+        self.ultima_mudanca = [0.0] * n_slots
+        self.imediato = [False] * n_slots
+
+    def ao_configurar(self, i, event):
+        """Registra a geometria de um <Configure> do frame; False se nada mudou."""
+        rect = (event.x, event.y, event.width, event.height)
+        if rect == self.retangulos[i]: return False
+        self.retangulos[i] = rect
+        self.ultima_mudanca[i] = time.monotonic()
+        return True
+
+    def ao_mapear(self, i, mapeado):
+        if self.mapeados[i] == mapeado: return False
+        self.mapeados[i] = mapeado
+        return True
+
+    def marcar_transicao(self):
+        self.imediato = [True] * len(self.imediato)
+
+    def retangulos_visiveis(self):
+        return [r if m else None for r, m in zip(self.retangulos, self.mapeados)]
+
+    def _tamanho(self, rect):
+        return max(10, rect[2] - self.margem), max(10, rect[3] - self.margem)
+
+    def tamanho_alvo(self, i, agora=None):
+        """Tamanho (w, h) para a saída do handler do slot, ou None antes do primeiro <Configure>."""
+        rect = self.retangulos[i]
+        if rect is None: return None
+        tamanho = self._tamanho(rect)
+        alvo = self.alvos[i]
+        if tamanho != alvo:
+            if agora is None: agora = time.monotonic()
+            if alvo is None or self.imediato[i] or agora - self.ultima_mudanca[i] >= self.atraso:
+                self.alvos[i] = alvo = tamanho
+                self.imediato[i] = False
+        return alvo
+
+    def espera_pendente(self, agora=None):
+        """Segundos até o próximo tamanho adiado de um slot visível passar a valer (None se nenhum)."""
+        if agora is None: agora = time.monotonic()
+        espera = None
+        for rect, mapeado, alvo, mudanca in zip(self.retangulos, self.mapeados, self.alvos, self.ultima_mudanca):
+            if rect is None or not mapeado or alvo is None or self._tamanho(rect) == alvo: continue
+            restante = mudanca + self.atraso - agora
+            if restante > 0: espera = restante if espera is None else min(espera, restante)
+        return espera
+
+# --- LISTA LATERAL (VIRTUALIZADA E INDEXADA) ---
+class IndiceCameras:
+    """Índice de busca da lista de câmeras (nome e IP), atualizado de forma incremental.
+
+    Mantém a ordem de exibição (nome, ou "IP x" sem nome) com bisect e os caracteres,
+    bigramas e trigramas de nome e IP para achar os candidatos sem varrer a lista. A busca
+    é por substring (o que cobre os prefixos), como a filtragem original.
+    """
+    def __init__(self):
+        self.textos = {}
+        self.chaves = {}
+        self.ordenados = []
+        self.ngramas = {}
+
+    @staticmethod
+    def _ngramas(texto):
+        return {texto[i:i + n] for n in (1, 2, 3) for i in range(len(texto) - n + 1) if "\n" not in texto[i:i + n]}
+
+    def reconstruir(self, ips, nomes):
+        self.__init__()
+        for ip in ips: self._indexar(ip, nomes.get(ip), ordenar=False)
+        self.ordenados.sort()
+
+    def adicionar(self, ip, nome=None):
+        """Inclui o IP ou reindexa após renomear."""
+        if ip in self.textos: self.remover(ip)
+        self._indexar(ip, nome, ordenar=True)
+
+    def _indexar(self, ip, nome, ordenar):
+        # Só o nome real e o IP são pesquisáveis; "IP x" é apenas o rótulo (e a ordem) de quem não tem nome
+        texto = f"{(nome or '').lower()}\n{ip}"
+        chave = ((nome if nome is not None else f"IP {ip}").lower(), ip)
+        self.textos[ip], self.chaves[ip] = texto, chave
+        if ordenar: bisect.insort(self.ordenados, chave)
+        else: self.ordenados.append(chave)
+        for ngrama in self._ngramas(texto):
+            self.ngramas.setdefault(ngrama, set()).add(ip)
+
+    def remover(self, ip):
+        texto = self.textos.pop(ip, None)
+        if texto is None: return
+        chave = self.chaves.pop(ip)
+        del self.ordenados[bisect.bisect_left(self.ordenados, chave)]
+        for ngrama in self._ngramas(texto):
+            conjunto = self.ngramas.get(ngrama)
+            if conjunto is None: continue
+            conjunto.discard(ip)
+            if not conjunto: del self.ngramas[ngrama]
+
+    def buscar(self, termo):
+        """IPs cujo nome ou IP contém o termo, na ordem de exibição da lista."""
+        termo = termo.lower()
+        if not termo: return [ip for _, ip in self.ordenados]
+        if "\n" in termo: return []
+        if len(termo) <= 3:
+            candidatos = self.ngramas.get(termo, ())
+        else:
+            # O trigrama mais raro do termo limita os candidatos; a confirmação é pelo texto completo
+            candidatos = min((self.ngramas.get(termo[i:i + 3], ()) for i in range(len(termo) - 2)), key=len)
+        return sorted((ip for ip in candidatos if termo in self.textos[ip]), key=self.chaves.__getitem__)
+
+class ListaVirtual:
+    """Lista rolável que só cria widgets para as linhas visíveis e os recicla ao rolar.
+
+    `criar_linha(parent)` devolve um dict com o widget 'frame' (altura fixa) e
+    `preencher_linha(linha, item)` atualiza uma linha para o item; a lista guarda o item
+    exibido em linha['item'].
+    """
+    def __init__(self, parent, criar_linha, preencher_linha, altura_linha=54):
+        self.criar_linha = criar_linha
+        self.preencher_linha = preencher_linha
+        self.altura_linha = altura_linha
+        self.itens = []
+        self.linhas = []
+        self.deslocamento = 0
+        self.altura_visivel = 0
+        self.container = ctk.CTkFrame(parent, fg_color="transparent")
+        self.scrollbar = ctk.CTkScrollbar(self.container, command=self._ao_rolar_barra)
+        self.scrollbar.pack(side="right", fill="y")
+        self.area = ctk.CTkFrame(self.container, fg_color="transparent")
+        self.area.pack(side="left", expand=True, fill="both")
+        self.area.bind("<Configure>", self._ao_redimensionar)
+        self._vincular_roda(self.area)
+
+    def _vincular_roda(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self.rolar(-e.delta / 120 * self.altura_linha), add="+")
+        widget.bind("<Button-4>", lambda e: self.rolar(-self.altura_linha), add="+")
+        widget.bind("<Button-5>", lambda e: self.rolar(self.altura_linha), add="+")
+
+    def _ao_redimensionar(self, event):
+        # O <Configure> vem do canvas interno em pixels físicos; linhas, deslocamento e place()
+        # trabalham em unidades lógicas do CTk (escaladas pelo DPI)
+        altura = int(event.height / self.area._get_widget_scaling())
+        if altura == self.altura_visivel: return
+        self.altura_visivel = altura
+        necessarias = altura // self.altura_linha + 2
+        while len(self.linhas) < necessarias:
+            linha = self.criar_linha(self.area)
+            linha['item'] = None
+            linha['y'] = None
+            for widget in linha.values():
+                if isinstance(widget, tk.Misc): self._vincular_roda(widget)
+            self.linhas.append(linha)
+        self._redesenhar()
+
+    def _ao_rolar_barra(self, acao, valor, unidade=None):
+        total = len(self.itens) * self.altura_linha
+        if acao == "moveto":
+            self.deslocamento = int(float(valor) * total)
+            self._redesenhar()
+        elif acao == "scroll":
+            passo = self.altura_visivel if unidade == "pages" else self.altura_linha
+            self.rolar(int(valor) * passo)
+
+    def rolar(self, pixels):
+        self.deslocamento += int(pixels)
+        self._redesenhar()
+
+    def definir_itens(self, itens, manter_rolagem=False):
+        self.itens = list(itens)
+        if not manter_rolagem: self.deslocamento = 0
+        self._redesenhar()
+
+    def atualizar_visiveis(self):
+        """Repreenche as linhas visíveis (ex.: mudou a seleção ou o estado de alcance)."""
+        for linha in self.linhas:
+            if linha['item'] is not None: self.preencher_linha(linha, linha['item'])
+
+    def _redesenhar(self):
+        total = len(self.itens) * self.altura_linha
+        self.deslocamento = max(0, min(self.deslocamento, total - self.altura_visivel))
+        primeiro = self.deslocamento // self.altura_linha
+        for k, linha in enumerate(self.linhas):
+            idx = primeiro + k
+            if idx < len(self.itens):
+                item = self.itens[idx]
+                if linha['item'] != item:
+                    linha['item'] = item
+                    self.preencher_linha(linha, item)
+                y = idx * self.altura_linha - self.deslocamento
+                if linha['y'] != y:
+                    linha['y'] = y
+                    linha['frame'].place(x=0, y=y, relwidth=1.0)
+            elif linha['y'] is not None:
+                linha['frame'].place_forget()
+                linha['item'] = linha['y'] = None
+        if total > self.altura_visivel:
+            self.scrollbar.set(self.deslocamento / total, (self.deslocamento + self.altura_visivel) / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
 
 # --- INTERFACE PRINCIPAL ---
 class CentralMonitoramento(ctk.CTk):
@@ -219,6 +2637,12 @@ class CentralMonitoramento(ctk.CTk):
         except:
             return 1.0
 
+    # Exibição orientada a eventos: intervalo mínimo entre ticks e tick de segurança quando ocioso
+    INTERVALO_MIN_TICK_MS = 15
+    INTERVALO_OCIOSO_MS = 250
+    # Tempo sem <Configure> até um slot redimensionado passar o novo tamanho ao handler
+    ATRASO_REDIMENSIONAMENTO = 0.25
+
     BG_MAIN = "#121212"
     BG_SIDEBAR = "#1A1A1A"
     BG_PANEL = "#1E1E1E"
@@ -241,6 +2665,11 @@ class CentralMonitoramento(ctk.CTk):
 
         self.protocol("WM_DELETE_WINDOW", self.ao_fechar)
 
+        # Minimizar/restaurar a janela suspende/retoma a decodificação das câmeras
+        self.janela_minimizada = False
+        self.bind("<Unmap>", self._ao_minimizar_janela)
+        self.bind("<Map>", self._ao_restaurar_janela)
+
         # Binds de Teclado
         self.bind("<Escape>", lambda event: self.sair_tela_cheia())
 
@@ -262,8 +2691,32 @@ class CentralMonitoramento(ctk.CTk):
         self.arquivo_janela = os.path.join(user_dir, "config_janela_abi.json")
         self.arquivo_predefinicoes = os.path.join(user_dir, "predefinicoes_grid_abi.json")
         self.arquivo_ips = os.path.join(user_dir, "lista_ips_abi.json")
-
-        self.botoes_referencia = {}
+        # Todas as gravações de configuração passam por aqui (fora da thread da UI, atômicas)
+        self.persistencia = PersistenciaAdiada()
+        # Último frame de cada câmera em disco: exibido (esmaecido) na abertura até o vídeo chegar
+        self.cache_miniaturas = CacheMiniaturas(os.path.join(user_dir, "Miniaturas_ABI"))
+        self.miniaturas_antigas = {}
+        self.miniatura_slot = [None] * 20
+        # Gravação por cópia de stream (uma subpasta por câmera)
+        self.pasta_gravacoes = os.path.join(user_dir, "Gravacoes_ABI")
+        self.cameras_gravadas = []
+        self.gravadores = {}
+        self.canal_gravacao = 101
+        self.formato_gravacao = "mkv"
+        self.gravacao_duracao_segmento = 60
+        self.gravacao_retencao_horas = 24
+        self.gravacao_cota_mb = 2048
+        # Replay instantâneo: anel de pacotes comprimidos por câmera (limites por câmera e global)
+        self.replay_ativo = False
+        self.replay_segundos = 30
+        self.replay_mb_camera = 24
+        self.replay_mb_total = 384
+        self.velocidade_replay = 1.0
+        self.replays_slot = {}
+
+        # Cor de fundo das linhas da lista lateral que não seguem o padrão (ex.: câmera selecionada)
+        self.cores_lista = {}
+        self.indice_cameras = IndiceCameras()
         self.ip_selecionado = None
         self.predefinicao_widgets = {}
         self.camera_handlers = {}
@@ -274,26 +2727,95 @@ class CentralMonitoramento(ctk.CTk):
         self.octet_entries = []
         self.press_data = None
         self.fila_conexoes = queue.Queue()
-        self.fila_pendente_conexoes = queue.Queue()
-        self.ips_em_fila = set()
+        # IP -> (instante da falha, erro, atraso até a próxima tentativa)
         self.cooldown_conexoes = {}
+        self.backoff_conexoes = {}
+        self.reconexoes_por_segundo = 2.0
+        # Câmeras que saíram do grid continuam conectadas por um tempo (0 desliga)
+        self.pool_aquecido_max = 4
+        self.pool_aquecido_ociosidade = 300.0
+        # Pré-aquecimento da próxima predefinição: histórico {anterior: {próxima: contagem}},
+        # ordem explícita de ronda e orçamento (câmeras extras conectadas só com I-frames)
+        self.transicoes_predefinicoes = {}
+        self.ordem_ronda = []
+        self.intervalo_ronda = 30
+        self.ronda_ativa = False
+        self._ronda_agendada = None
+        self.preaquecimento_max = 4
+        self.ips_preaquecimento = set()
+        # Conexões abertas em paralelo pelo agendador
+        self.conexoes_simultaneas = 6
+        # Varredura de alcance da lista de IPs (segundos entre varreduras)
+        self.intervalo_varredura = 15.0
+        self._versao_alcance_ui = -1
         self.tecla_pressionada = None
+        # Um canal PTZ (thread + conexão HTTP) por câmera, criado no primeiro comando
+        self.controles_ptz = {}
         self.ultima_predefinicao = None
         self.aba_ativa = "Câmeras"
         self.forcar_baixa_qualidade = False
+        self.modo_compositor = False
+        self.compositor = None
+        # Backend de decodificação: "thread" (padrão) ou "processos" (PoolDecodificacao)
+        self.backend_decodificacao = "thread"
+        self.processos_decodificacao = 0
+        self.pool_decodificacao = None
+        # Miniaturas econômicas: slots sem prioridade decodificam só I-frames (requer PyAV)
+        self.miniaturas_keyframe = False
+        self.layout_sujo = True
+        # Geometria dos slots vinda dos eventos do Tk (o loop de exibição não consulta winfo_*)
+        self.geometria_slots = GeometriaSlots(20, atraso=self.ATRASO_REDIMENSIONAMENTO)
+        # Estatísticas da UI (ticks vs. frames exibidos, tempo de tick e tempo gasto em chamadas Tk)
+        self.estatisticas_ui = {"ticks": 0, "frames_renderizados": 0, "tempo_tick": 0.0, "tempo_tk": 0.0, "chamadas_tk": 0}
+        self.log_estatisticas = False
+        self._ultimo_log_estatisticas = (time.time(), dict(self.estatisticas_ui))
+        # Taxa máxima de exibição por slot (grid e maximizado)
+        self.fps_max_slot = 25
+        self.fps_max_maximizado = 30
+        self.ultimo_render_slot = [0.0] * 20
+        self._exibicao_agendada = None
+        self._exibicao_alvo = 0.0
+        self._ultimo_tick = 0.0
+        # Endpoint /metrics opcional (porta 0 = desligado)
+        self.porta_metricas = 0
+        self.endereco_metricas = "0.0.0.0"
+        self.servidor_metricas = None
+        self.histograma_tick = Histograma()
 
         self.carregar_posicao_janela()
         self.predefinicoes = self.carregar_predefinicoes()
         self.ips_unicos = self.carregar_lista_ips()
         self.dados_cameras = self.carregar_config()
+        self.indice_cameras.reconstruir(self.ips_unicos, self.dados_cameras)
         self.grid_cameras = self.carregar_grid()
 
-        # Cache persistente de CTkImage por slot para evitar "pyimage" explosion
-        self.slot_ctk_images = [None] * 20
+        if self.backend_decodificacao == "processos":
+            try: self.pool_decodificacao = PoolDecodificacao(self.processos_decodificacao)
+            except Exception as e: print(f"Erro ao iniciar pool de decodificação, usando threads: {e}")
+
+        # Threads de captura sinalizam frames novos; a UI só acorda quando há algo para exibir
+        self.sinalizador = SinalizadorFrames(self, self._ao_frames_prontos)
+        # Conexões por prioridade: maximizado > selecionado > visíveis (ordem de leitura) > demais
+        self.agendador_conexoes = AgendadorConexoes(self._executar_conexao, self.conexoes_simultaneas)
+        self.monitor_alcance = MonitorAlcance(intervalo=self.intervalo_varredura)
+        self.pool_aquecido = PoolAquecido(self.pool_aquecido_max, self.pool_aquecido_ociosidade)
+        for ip in self.cameras_gravadas: self.iniciar_gravacao(ip)
+        orcamento_replay.limite = self.replay_mb_total * 1024 * 1024
+        limitador_reconexoes.taxa = max(0.1, float(self.reconexoes_por_segundo))
+        self.monitor_alcance.definir_ips(self.ips_unicos + self.grid_cameras)
+
+        if self.porta_metricas:
+            try: self.servidor_metricas = ServidorMetricas(self.texto_metricas, self.porta_metricas, self.endereco_metricas)
+            except Exception as e: print(f"Erro ao iniciar servidor de métricas: {e}")
+
+        # PhotoImage persistente por slot (no tamanho físico do frame), atualizada com paste
+        self.fotos_slot = [None] * 20
         # Cache de estado da UI para evitar chamadas redundantes ao Tcl/Tk
         self.cache_ui_text = [None] * 20
         self.cache_ui_image = [None] * 20
         self.cache_ui_size = [None] * 20
+        # Handler ao qual cada slot está inscrito como consumidor de frames
+        self.consumidores_slot = [None] * 20
         # Imagem 1x1 transparente para resets seguros
         self.img_vazia = ctk.CTkImage(Image.new('RGBA', (1, 1), (0,0,0,0)), size=(1, 1))
 
@@ -330,6 +2852,35 @@ class CentralMonitoramento(ctk.CTk):
                                                    command=self.alternar_baixa_qualidade)
         self.switch_baixa_qualidade.pack(pady=10)
 
+        # Toggle do Compositor (Canvas único em vez de um Label por slot)
+        self.switch_compositor = ctk.CTkSwitch(tab_cams, text="Modo Compositor",
+                                               progress_color=self.ACCENT_RED,
+                                               command=self.alternar_modo_compositor)
+        self.switch_compositor.pack(pady=(0, 10))
+        if self.modo_compositor: self.switch_compositor.select()
+
+        # Toggle das Miniaturas Econômicas (apenas I-frames nos slots sem prioridade)
+        self.switch_miniaturas = ctk.CTkSwitch(tab_cams, text="Miniaturas Econômicas (I-frames)",
+                                               progress_color=self.ACCENT_RED,
+                                               command=self.alternar_miniaturas_keyframe)
+        self.switch_miniaturas.pack(pady=(0, 10))
+        if av is None:
+            self.miniaturas_keyframe = False
+            self.switch_miniaturas.configure(state="disabled")
+        elif self.miniaturas_keyframe:
+            self.switch_miniaturas.select()
+
+        # Toggle do Buffer de Replay (últimos N segundos comprimidos em memória)
+        self.switch_replay = ctk.CTkSwitch(tab_cams, text=f"Buffer de Replay ({self.replay_segundos}s)",
+                                           progress_color=self.ACCENT_RED,
+                                           command=self.alternar_buffer_replay)
+        self.switch_replay.pack(pady=(0, 10))
+        if av is None:
+            self.replay_ativo = False
+            self.switch_replay.configure(state="disabled")
+        elif self.replay_ativo:
+            self.switch_replay.select()
+
         self.frame_busca = ctk.CTkFrame(tab_cams, fg_color="transparent")
         self.frame_busca.pack(fill="x", padx=5, pady=5)
 
@@ -342,8 +2893,8 @@ class CentralMonitoramento(ctk.CTk):
                                           command=self.abrir_modal_adicionar_camera)
         self.btn_add_cam.pack(side="right")
 
-        self.scroll_frame = ctk.CTkScrollableFrame(tab_cams, fg_color="transparent")
-        self.scroll_frame.pack(expand=True, fill="both", padx=0, pady=5)
+        self.lista_cameras = ListaVirtual(tab_cams, self._criar_linha_camera, self._preencher_linha_camera)
+        self.lista_cameras.container.pack(expand=True, fill="both", padx=0, pady=5)
 
         # Conteúdo da Sidebar (Predefinições)
         tab_predefinicoes = self.tabview.tab("Predefinições")
@@ -352,6 +2903,12 @@ class CentralMonitoramento(ctk.CTk):
                                                 command=self.salvar_predefinicao_atual)
         self.btn_salvar_predefinicao.pack(fill="x", padx=10, pady=10)
 
+        # Ronda automática: alterna as predefinições em ordem (a próxima fica pré-aquecida)
+        self.switch_ronda = ctk.CTkSwitch(tab_predefinicoes, text="Ronda Automática",
+                                          progress_color=self.ACCENT_RED,
+                                          command=self.alternar_ronda)
+        self.switch_ronda.pack(pady=(0, 10))
+
         ctk.CTkLabel(tab_predefinicoes, text="LISTA DE PREDEFINIÇÕES", font=("Roboto", 14, "bold"), text_color=self.TEXT_S).pack(pady=5)
         self.scroll_predefinicoes = ctk.CTkScrollableFrame(tab_predefinicoes, fg_color="transparent")
         self.scroll_predefinicoes.pack(expand=True, fill="both", padx=5, pady=5)
@@ -416,22 +2973,28 @@ class CentralMonitoramento(ctk.CTk):
                 widget.bind("<Button-1>", lambda e, idx=i: self.ao_pressionar_slot(e, idx))
                 widget.bind("<ButtonRelease-1>", lambda e, idx=i: self.ao_soltar_slot(e, idx))
 
+            # Direto no frame Tk (o bind do CTkFrame vai para o canvas interno, que não tem x/y no grid)
+            tk.Misc.bind(frm, "<Configure>", lambda e, idx=i: self._ao_configurar_slot(idx, e), add="+")
+            tk.Misc.bind(frm, "<Map>", lambda e, idx=i: self._ao_mapear_slot(idx, True), add="+")
+            tk.Misc.bind(frm, "<Unmap>", lambda e, idx=i: self._ao_mapear_slot(idx, False), add="+")
+
             self.slot_frames.append(frm)
             self.slot_labels.append(lbl)
 
+        if self.modo_compositor:
+            self._ativar_compositor()
+
         self.atualizar_lista_cameras_ui()
         # Restaura estado inicial
         for i, ip in enumerate(self.grid_cameras):
             if ip and ip != "0.0.0.0":
                 # O IP é ocultado por padrão se não selecionado
                 self.slot_labels[i].configure(text="AGUARDANDO")
+        self.carregar_miniaturas_antigas()
 
         self.selecionar_slot(self.slot_selecionado)
         self.restaurar_grid()
 
-        # Inicia thread de processamento de conexões staggered
-        threading.Thread(target=self._processar_fila_conexoes_pendentes, daemon=True).start()
-
         self.alternar_todos_streams()
         
         def safe_zoom():
@@ -452,43 +3015,80 @@ class CentralMonitoramento(ctk.CTk):
             self.after(500, lambda: self.aplicar_predefinicao(self.ultima_predefinicao))
 
         self.loop_exibicao()
+        # Primeira pintura com o layout já calculado; depois importa cv2/requests em segundo plano
+        self.after(100, self.loop_exibicao)
+        self.after(300, lambda: threading.Thread(target=precarregar_modulos, daemon=True).start())
 
-    def _processar_fila_conexoes_pendentes(self):
-        while True:
-            try:
-                if not self.fila_pendente_conexoes.empty():
-                    ip, canal = self.fila_pendente_conexoes.get()
-                    self.ips_em_fila.discard(ip)
-
-                    # Verifica se o IP ainda está no grid
-                    if ip not in self.grid_cameras:
-                        if self.camera_handlers.get(ip) == "CONECTANDO":
-                            del self.camera_handlers[ip]
-                        continue
-
-                    # Se já tiver um handler rodando, não faz nada
-                    handler = self.camera_handlers.get(ip)
-                    if handler and handler != "CONECTANDO" and getattr(handler, 'rodando', False):
-                        continue
+    def carregar_miniaturas_antigas(self):
+        """Lê as miniaturas salvas das câmeras do grid e as marca como imagem antiga."""
+        for ip in set(self.grid_cameras):
+            if not ip or ip == "0.0.0.0": continue
+            self._carregar_miniatura_antiga(ip)
+
+    def _carregar_miniatura_antiga(self, ip):
+        """Carrega do CacheMiniaturas a última imagem salva do IP (False se não houver)."""
+        if ip in self.miniaturas_antigas: return True
+        dados = self.cache_miniaturas.carregar(ip)
+        if dados is None: return False
+        img, mtime = dados
+        img = ImageEnhance.Brightness(img).enhance(0.5)
+        desenho = ImageDraw.Draw(img)
+        texto = "ÚLTIMA IMAGEM " + time.strftime("%d/%m %H:%M", time.localtime(mtime))
+        desenho.rectangle((0, 0, img.width, 16), fill=(0, 0, 0))
+        desenho.text((4, 2), texto, fill=(230, 230, 230))
+        self.miniaturas_antigas[ip] = img
+        return True
+
+    def _exibir_miniatura_antiga(self, i, ip):
+        """Mostra a miniatura salva no slot enquanto o vídeo não chega (False se não houver)."""
+        img = self.miniaturas_antigas.get(ip)
+        if img is None: return False
+        wf, hf = self._tamanho_slot(i)
+        chave = (ip, wf, hf)
+        if self.miniatura_slot[i] != chave:
+            self._exibir_frame_slot(i, img.resize((wf, hf)))
+            self.miniatura_slot[i] = chave
+        return True
+
+    def _prioridade_conexao(self, ip):
+        """Prioridade de conexão do IP (menor conecta primeiro)."""
+        if self.slot_maximized is not None and self.grid_cameras[self.slot_maximized] == ip: return 0
+        if self.slot_selecionado is not None and self.grid_cameras[self.slot_selecionado] == ip: return 1
+        # Slots visíveis em ordem de leitura (o grid é preenchido linha a linha)
+        indices = [i for i, grid_ip in enumerate(self.grid_cameras) if grid_ip == ip]
+        if indices and self.slot_maximized is None and not self.janela_minimizada:
+            return 2 + min(indices)
+        # Pré-aquecimento da próxima predefinição fica atrás de qualquer câmera do grid
+        if not indices and ip in self.ips_preaquecimento: return 200
+        return 100
+
+    def _reprioritizar_conexoes(self):
+        agendador = getattr(self, "agendador_conexoes", None)
+        if agendador: agendador.reprioritizar(self._prioridade_conexao)
+
+    def _executar_conexao(self, ip, canal):
+        """Executado por um worker do agendador: valida o pedido e conecta (bloqueante)."""
+        # O IP pode ter saído do grid enquanto esperava
+        if ip not in self.grid_cameras:
+            if self.camera_handlers.get(ip) == "CONECTANDO":
+                del self.camera_handlers[ip]
+            elif ip in self.ips_preaquecimento and ip not in self.pool_aquecido.handlers:
+                self._thread_conectar(ip, canal, preaquecer=True)
+            return
 
-                    # Se o estado for "CONECTANDO" mas não tivermos o objeto,
-                    # significa que este item da fila é o que deve iniciar a thread.
-                    # Mas se por algum motivo já houver uma thread, evitamos duplicar.
-                    # (Embora ips_em_fila já ajude a evitar duplicados na fila)
+        # Se já tiver um handler rodando, não faz nada
+        handler = self.camera_handlers.get(ip)
+        if handler and handler != "CONECTANDO" and getattr(handler, 'rodando', False):
+            return
 
-                    # Inicia a conexão real
-                    # print(f"LOG: Iniciando thread de conexão para {ip} (Queue size: {self.fila_pendente_conexoes.qsize()})")
-                    threading.Thread(target=self._thread_conectar, args=(ip, canal), daemon=True).start()
+        # Nova tentativa após falha: passa pelo limitador global para não sincronizar a frota
+        if ip in self.backoff_conexoes and not limitador_reconexoes.adquirir(lambda: ip in self.grid_cameras):
+            if self.camera_handlers.get(ip) == "CONECTANDO":
+                del self.camera_handlers[ip]
+            return
 
-                    # Pausa maior para evitar picos de CPU/Rede durante trocas de predefinicoes
-                    time.sleep(0.05)
-                else:
-                    time.sleep(0.02)
-            except Exception as e:
-                print(f"Erro no processador de conexões: {e}")
-                time.sleep(1)
+        self._thread_conectar(ip, canal)
 
-    # --- LÓGICA DO TOGGLE DA SIDEBAR ---
     def toggle_sidebar(self):
         if self.sidebar_visible:
             self.sidebar.grid_forget()
@@ -499,6 +3099,57 @@ class CentralMonitoramento(ctk.CTk):
             self.btn_toggle_sidebar.configure(text="◀")
             self.sidebar_visible = True
 
+    # --- LÓGICA DO COMPOSITOR ---
+    def alternar_modo_compositor(self):
+        self.modo_compositor = bool(self.switch_compositor.get())
+        if self.modo_compositor: self._ativar_compositor()
+        else: self._desativar_compositor()
+
+    def _ativar_compositor(self):
+        if self.compositor: return
+        self.compositor = CompositorGrid(self.grid_frame, n_slots=20, cor_fundo="#000000", cor_slot=self.BG_SIDEBAR,
+                                         cor_texto=self.TEXT_P, cor_selecao=self.ACCENT_RED)
+        self.compositor.canvas.place(x=0, y=0, relwidth=1, relheight=1)
+        self.compositor.canvas.lift()
+        self.compositor.canvas.bind("<Button-1>", self._ao_pressionar_compositor)
+        self.compositor.canvas.bind("<ButtonRelease-1>", self._ao_soltar_compositor)
+        self.compositor.slot_selecionado = self.slot_selecionado
+        self.btn_expandir.lift()
+        self.btn_mais_opcoes.lift()
+        self._marcar_layout_sujo()
+
+    def _desativar_compositor(self):
+        if not self.compositor: return
+        self.compositor.destruir()
+        self.compositor = None
+        # Força os labels a serem repintados no próximo tick
+        self.cache_ui_text = [None] * 20
+        self.cache_ui_image = [None] * 20
+        self.fotos_slot = [None] * 20
+
+    def _marcar_layout_sujo(self):
+        self.layout_sujo = True
+        self._agendar_exibicao(self.INTERVALO_MIN_TICK_MS)
+
+    def _ao_configurar_slot(self, i, event):
+        if self.geometria_slots.ao_configurar(i, event): self._marcar_layout_sujo()
+
+    def _ao_mapear_slot(self, i, mapeado):
+        if self.geometria_slots.ao_mapear(i, mapeado): self._marcar_layout_sujo()
+
+    def _transicao_layout(self):
+        """Maximizar/restaurar/tela cheia: o próximo tamanho de cada slot vale sem esperar o atraso."""
+        self.geometria_slots.marcar_transicao()
+        self._marcar_layout_sujo()
+
+    def _ao_pressionar_compositor(self, event):
+        idx = self.encontrar_slot_por_coords(event.x_root, event.y_root)
+        if idx is not None: self.ao_pressionar_slot(event, idx)
+
+    def _ao_soltar_compositor(self, event):
+        idx = self.encontrar_slot_por_coords(event.x_root, event.y_root)
+        self.ao_soltar_slot(event, idx)
+
     # --- LÓGICA PTZ ---
     def comando_ptz(self, direcao):
         ip = self.ip_selecionado
@@ -510,34 +3161,10 @@ class CentralMonitoramento(ctk.CTk):
         else:
             self.tecla_pressionada = None
 
-        mapa = {
-            "UP": {"pan": 0, "tilt": 100},
-            "DOWN": {"pan": 0, "tilt": -100},
-            "LEFT": {"pan": -100, "tilt": 0},
-            "RIGHT": {"pan": 100, "tilt": 0},
-            "STOP": {"pan": 0, "tilt": 0}
-        }
-
-        valores = mapa.get(direcao)
-        xml_data = f"""<?xml version="1.0" encoding="UTF-8"?>
-        <PTZData xmlns="http://www.isapi.org/ver20/XMLSchema">
-            <pan>{valores['pan']}</pan>
-            <tilt>{valores['tilt']}</tilt>
-        </PTZData>"""
-
-        threading.Thread(target=self._enviar_request_ptz, args=(ip, xml_data), daemon=True).start()
-
-    def _enviar_request_ptz(self, ip, xml):
-        url = f"http://{ip}/ISAPI/PTZCtrl/channels/1/continuous"
-        try:
-            requests.put(
-                url,
-                data=xml,
-                auth=HTTPDigestAuth(self.user_ptz, self.pass_ptz),
-                timeout=1
-            )
-        except Exception as e:
-            print(f"Erro PTZ {ip}: {e}")
+        controle = self.controles_ptz.get(ip)
+        if controle is None:
+            controle = self.controles_ptz[ip] = ControlePTZ(ip, self.user_ptz, self.pass_ptz)
+        controle.enviar(direcao)
 
     # --- TELA CHEIA ATUALIZADO ---
     def entrar_tela_cheia(self):
@@ -566,6 +3193,8 @@ class CentralMonitoramento(ctk.CTk):
                                          fg_color=self.ACCENT_RED, hover_color=self.ACCENT_WINE, command=self.sair_tela_cheia)
         self.btn_sair_fs.place(relx=0.98, rely=0.02, anchor="ne")
         self.btn_sair_fs.lift()
+        self._transicao_layout()
+        self.atualizar_visibilidade_streams()
 
     def sair_tela_cheia(self):
         if not self.em_tela_cheia: return
@@ -595,6 +3224,8 @@ class CentralMonitoramento(ctk.CTk):
                     child.pack_configure(padx=p_child, pady=p_child)
             else:
                 frm.grid_forget()
+        self._transicao_layout()
+        self.atualizar_visibilidade_streams()
 
     def carregar_posicao_janela(self):
         if os.path.exists(self.arquivo_janela):
@@ -606,6 +3237,36 @@ class CentralMonitoramento(ctk.CTk):
                     self.aba_ativa = dados.get("active_tab", "Câmeras")
                     self.ultima_predefinicao = dados.get("last_predefinicao") or dados.get("last_preset")
                     self.slot_selecionado = dados.get("slot_selecionado", 0)
+                    self.modo_compositor = dados.get("modo_compositor", False)
+                    self.backend_decodificacao = dados.get("backend_decodificacao", "thread")
+                    self.processos_decodificacao = dados.get("processos_decodificacao", 0)
+                    self.miniaturas_keyframe = dados.get("miniaturas_keyframe", False)
+                    self.fps_max_slot = dados.get("fps_max_slot", 25)
+                    self.fps_max_maximizado = dados.get("fps_max_maximizado", 30)
+                    self.log_estatisticas = dados.get("log_estatisticas", False)
+                    self.porta_metricas = dados.get("porta_metricas", 0)
+                    self.conexoes_simultaneas = dados.get("conexoes_simultaneas", 6)
+                    self.intervalo_varredura = dados.get("intervalo_varredura", 15.0)
+                    self.reconexoes_por_segundo = dados.get("reconexoes_por_segundo", 2.0)
+                    self.pool_aquecido_max = dados.get("pool_aquecido_max", 4)
+                    self.pool_aquecido_ociosidade = dados.get("pool_aquecido_ociosidade", 300.0)
+                    self.transicoes_predefinicoes = dados.get("transicoes_predefinicoes", {})
+                    self.ordem_ronda = dados.get("ordem_ronda", [])
+                    self.intervalo_ronda = dados.get("intervalo_ronda", 30)
+                    self.preaquecimento_max = dados.get("preaquecimento_max", 4)
+                    self.pasta_gravacoes = dados.get("pasta_gravacoes", self.pasta_gravacoes)
+                    self.cameras_gravadas = dados.get("cameras_gravadas", [])
+                    self.canal_gravacao = dados.get("canal_gravacao", 101)
+                    self.formato_gravacao = dados.get("formato_gravacao", "mkv")
+                    self.gravacao_duracao_segmento = dados.get("gravacao_duracao_segmento", 60)
+                    self.gravacao_retencao_horas = dados.get("gravacao_retencao_horas", 24)
+                    self.gravacao_cota_mb = dados.get("gravacao_cota_mb", 2048)
+                    self.replay_ativo = dados.get("replay_ativo", False)
+                    self.replay_segundos = dados.get("replay_segundos", 30)
+                    self.replay_mb_camera = dados.get("replay_mb_camera", 24)
+                    self.replay_mb_total = dados.get("replay_mb_total", 384)
+                    self.velocidade_replay = dados.get("velocidade_replay", 1.0)
+                    self.endereco_metricas = dados.get("endereco_metricas", "0.0.0.0")
             except Exception as e: print(f"Erro ao carregar janela: {e}")
 
     def ao_fechar(self):
@@ -615,10 +3276,55 @@ class CentralMonitoramento(ctk.CTk):
                     "geometry": self.geometry(),
                     "active_tab": self.tabview.get(),
                     "last_predefinicao": self.ultima_predefinicao,
-                    "slot_selecionado": self.slot_selecionado
+                    "slot_selecionado": self.slot_selecionado,
+                    "modo_compositor": self.modo_compositor,
+                    "backend_decodificacao": self.backend_decodificacao,
+                    "processos_decodificacao": self.processos_decodificacao,
+                    "miniaturas_keyframe": self.miniaturas_keyframe,
+                    "fps_max_slot": self.fps_max_slot,
+                    "fps_max_maximizado": self.fps_max_maximizado,
+                    "log_estatisticas": self.log_estatisticas,
+                    "porta_metricas": self.porta_metricas,
+                    "conexoes_simultaneas": self.conexoes_simultaneas,
+                    "intervalo_varredura": self.intervalo_varredura,
+                    "reconexoes_por_segundo": self.reconexoes_por_segundo,
+                    "pool_aquecido_max": self.pool_aquecido_max,
+                    "pool_aquecido_ociosidade": self.pool_aquecido_ociosidade,
+                    "transicoes_predefinicoes": self.transicoes_predefinicoes,
+                    "ordem_ronda": self.ordem_ronda,
+                    "intervalo_ronda": self.intervalo_ronda,
+                    "preaquecimento_max": self.preaquecimento_max,
+                    "pasta_gravacoes": self.pasta_gravacoes,
+                    "cameras_gravadas": list(self.gravadores.keys()),
+                    "canal_gravacao": self.canal_gravacao,
+                    "formato_gravacao": self.formato_gravacao,
+                    "gravacao_duracao_segmento": self.gravacao_duracao_segmento,
+                    "gravacao_retencao_horas": self.gravacao_retencao_horas,
+                    "gravacao_cota_mb": self.gravacao_cota_mb,
+                    "replay_ativo": self.replay_ativo,
+                    "replay_segundos": self.replay_segundos,
+                    "replay_mb_camera": self.replay_mb_camera,
+                    "replay_mb_total": self.replay_mb_total,
+                    "velocidade_replay": self.velocidade_replay,
+                    "endereco_metricas": self.endereco_metricas
                 }
-                with open(self.arquivo_janela, "w") as f: json.dump(dados, f)
+                self.persistencia.agendar(self.arquivo_janela, dados)
         except Exception as e: print(f"Erro ao salvar janela: {e}")
+        self.persistencia.parar()
+        self.cache_miniaturas.parar()
+        self.sinalizador.parar()
+        self.agendador_conexoes.parar()
+        self.monitor_alcance.parar()
+        for gravador in self.gravadores.values(): gravador.parar()
+        for controle in self.controles_ptz.values(): controle.parar()
+        # Dá tempo aos gravadores de fechar o segmento atual
+        for gravador in self.gravadores.values(): gravador.parar(aguardar=2.0)
+        if self.servidor_metricas:
+            try: self.servidor_metricas.encerrar()
+            except: pass
+        if self.pool_decodificacao:
+            try: self.pool_decodificacao.encerrar()
+            except: pass
         self.destroy()
         os._exit(0)
 
@@ -635,6 +3341,29 @@ class CentralMonitoramento(ctk.CTk):
 
         return 102
 
+    def obter_ips_visiveis(self):
+        """IPs que aparecem em algum slot efetivamente visível na tela."""
+        if self.janela_minimizada: return set()
+        indices = [self.slot_maximized] if self.slot_maximized is not None else range(20)
+        return {self.grid_cameras[i] for i in indices if self.grid_cameras[i] and self.grid_cameras[i] != "0.0.0.0"}
+
+    def atualizar_visibilidade_streams(self):
+        visiveis = self.obter_ips_visiveis()
+        for ip, handler in self.camera_handlers.items():
+            if handler == "CONECTANDO": continue
+            handler.set_visivel(ip in visiveis)
+        self._reprioritizar_conexoes()
+
+    def _ao_minimizar_janela(self, event):
+        if event.widget is not self: return
+        self.janela_minimizada = True
+        self.atualizar_visibilidade_streams()
+
+    def _ao_restaurar_janela(self, event):
+        if event.widget is not self: return
+        self.janela_minimizada = False
+        self.atualizar_visibilidade_streams()
+
     def maximizar_slot(self, index):
         self.grid_frame.pack_configure(padx=0, pady=0)
 
@@ -650,6 +3379,7 @@ class CentralMonitoramento(ctk.CTk):
                 frm.grid_forget()
 
         self.slot_maximized = index
+        self._transicao_layout()
 
         # Gerenciamento de Prioridade e Qualidade
         for ip, handler in self.camera_handlers.items():
@@ -660,6 +3390,7 @@ class CentralMonitoramento(ctk.CTk):
             else:
                 handler.set_prioridade(False)
                 handler.set_canal(self.obter_canal_alvo(ip))
+        self.atualizar_visibilidade_streams()
         self.btn_expandir.lift()
         self.btn_mais_opcoes.lift()
 
@@ -690,10 +3421,8 @@ class CentralMonitoramento(ctk.CTk):
                 ip_src = self.grid_cameras[source_idx]
                 ip_tgt = self.grid_cameras[target_idx]
 
-                # Agora atualiza visualmente e gerencia handlers
-                # Note: 'atribuir_ip_ao_slot' agora gerencia 'ultima_predefinicao' internamente
-                self.atribuir_ip_ao_slot(source_idx, ip_tgt, atualizar_ui=False)
-                self.atribuir_ip_ao_slot(target_idx, ip_src, atualizar_ui=False)
+                # Troca atômica: os dois handlers só mudam de slot, nenhum stream é reiniciado
+                self.transacao_grid({source_idx: ip_tgt, target_idx: ip_src})
 
                 self.selecionar_slot(target_idx)
                 self.update_idletasks()
@@ -729,6 +3458,8 @@ class CentralMonitoramento(ctk.CTk):
             handler.set_canal(self.obter_canal_alvo(ip))
 
         self.slot_maximized = None
+        self._transicao_layout()
+        self.atualizar_visibilidade_streams()
         self.btn_expandir.lift()
         self.btn_mais_opcoes.lift()
 
@@ -743,7 +3474,9 @@ class CentralMonitoramento(ctk.CTk):
 
         ip_anterior = self.ip_selecionado
         self.slot_selecionado = index
+        self._reprioritizar_conexoes()
         self.slot_frames[index].configure(border_color=self.ACCENT_RED, border_width=2)
+        if self.compositor: self.compositor.definir_selecao(index)
 
         self.title(f"Monitoramento ABI - Espaço {index + 1} selecionado")
 
@@ -800,9 +3533,7 @@ class CentralMonitoramento(ctk.CTk):
         self.selecionar_slot(idx)
 
     def salvar_grid(self):
-        try:
-            with open(self.arquivo_grid, "w", encoding='utf-8') as f:
-                json.dump(self.grid_cameras, f, ensure_ascii=False, indent=4)
+        try: self.persistencia.agendar(self.arquivo_grid, self.grid_cameras)
         except: pass
 
     def carregar_grid(self):
@@ -842,7 +3573,7 @@ class CentralMonitoramento(ctk.CTk):
         # Cria a janela modal
         modal = ctk.CTkToplevel(self)
         modal.title(f"Opções - {ip}")
-        modal.geometry("400x350")
+        modal.geometry("400x480")
         modal.resizable(False, False)
         modal.attributes("-topmost", True)
 
@@ -869,11 +3600,56 @@ class CentralMonitoramento(ctk.CTk):
                                     command=lambda: [modal.destroy(), self.alternar_edicao_nome()])
         btn_editar.pack(fill="x", padx=40, pady=5)
 
+        gravando = ip in self.gravadores
+        btn_gravar = ctk.CTkButton(modal, text="Parar Gravação" if gravando else "Gravar",
+                                    fg_color=self.ACCENT_WINE if gravando else self.GRAY_DARK, hover_color=self.TEXT_S,
+                                    corner_radius=0, height=40,
+                                    command=lambda: [self.alternar_gravacao(ip), modal.destroy()])
+        btn_gravar.pack(fill="x", padx=40, pady=5)
+        if av is None: btn_gravar.configure(state="disabled", text="Gravar (requer PyAV)")
+        elif not gravando:
+            # O gravador não reaproveita a conexão do grid: abre outra sessão RTSP no canal de gravação
+            ctk.CTkLabel(modal, text=f"A gravação abre uma conexão extra com a câmera (canal {self.canal_gravacao})",
+                         font=("Roboto", 11), text_color=self.TEXT_S, wraplength=320).pack(padx=40)
+
+        idx = self.slot_selecionado
+        em_replay = idx in self.replays_slot
+        frm_replay = ctk.CTkFrame(modal, fg_color="transparent")
+        frm_replay.pack(fill="x", padx=40, pady=5)
+        btn_replay = ctk.CTkButton(frm_replay, text="Voltar ao Vivo" if em_replay else f"Replay ({self.replay_segundos}s)",
+                                   fg_color=self.ACCENT_WINE if em_replay else self.GRAY_DARK, hover_color=self.TEXT_S,
+                                   corner_radius=0, height=40,
+                                   command=lambda: [self.encerrar_replay(idx) if em_replay else self.iniciar_replay(idx),
+                                                    modal.destroy()])
+        btn_replay.pack(side="left", fill="x", expand=True)
+        seletor_velocidade = ctk.CTkSegmentedButton(frm_replay, values=["0.5x", "1x", "2x", "4x"], corner_radius=0,
+                                                    command=self.definir_velocidade_replay)
+        seletor_velocidade.set(f"{self.velocidade_replay:g}x")
+        seletor_velocidade.pack(side="left", padx=(5, 0))
+        if not em_replay and not (self.replay_ativo and ip in self.grid_cameras):
+            btn_replay.configure(state="disabled", text="Replay (ative o buffer)")
+
         btn_fechar = ctk.CTkButton(modal, text="Fechar", fg_color="#444444", hover_color="#666666",
                                     corner_radius=0, height=40,
                                     command=modal.destroy)
         btn_fechar.pack(fill="x", padx=40, pady=(20, 0))
 
+    def iniciar_gravacao(self, ip):
+        if av is None or not ip or ip == "0.0.0.0" or ip in self.gravadores: return
+        handler = CameraHandler(ip, self.canal_gravacao, user=self.user_ptz, password=self.pass_ptz)
+        try:
+            self.gravadores[ip] = GravadorCamera(handler.url, os.path.join(self.pasta_gravacoes, ip.replace(":", "_")),
+                                                 duracao_segmento=self.gravacao_duracao_segmento,
+                                                 retencao_horas=self.gravacao_retencao_horas,
+                                                 cota_mb=self.gravacao_cota_mb, formato=self.formato_gravacao,
+                                                 nome=self.dados_cameras.get(ip, ip))
+        except Exception as e: print(f"Erro ao iniciar gravação de {ip}: {e}")
+
+    def alternar_gravacao(self, ip):
+        gravador = self.gravadores.pop(ip, None)
+        if gravador is not None: gravador.parar()
+        else: self.iniciar_gravacao(ip)
+
     def abrir_modal_input(self, titulo, mensagem, callback, valor_inicial=""):
         modal = ctk.CTkToplevel(self)
         modal.title(titulo)
@@ -978,7 +3754,7 @@ class CentralMonitoramento(ctk.CTk):
             lbl.bind("<ButtonRelease-1>", lambda e, x=idx: self.ao_soltar_slot(e, x))
 
             self.slot_labels[idx] = lbl
-            self.slot_ctk_images[idx] = None
+            self.fotos_slot[idx] = None
             self.cache_ui_text[idx] = None
             self.cache_ui_image[idx] = None
             return lbl
@@ -1011,12 +3787,7 @@ class CentralMonitoramento(ctk.CTk):
 
         try:
             # Tenta configurar o label existente
-            self.slot_labels[idx].configure(image=self.img_vazia, text=txt)
-            self.slot_labels[idx].image = self.img_vazia
-            self.cache_ui_text[idx] = txt
-            self.cache_ui_image[idx] = self.img_vazia
-            # Limpa cache do slot para evitar fantasmas ou falhas de sincronia
-            self.slot_ctk_images[idx] = None
+            self._exibir_texto_slot(idx, txt, forcar=True)
         except Exception as e:
             print(f"Erro visual ao atualizar texto slot {idx}: {e}")
             lbl = self.recriar_label_slot(idx)
@@ -1033,16 +3804,57 @@ class CentralMonitoramento(ctk.CTk):
         # 2. Gerenciamento de conexões (se solicitado)
         if gerenciar_conexoes:
             if ip_antigo and ip_antigo != "0.0.0.0" and ip_antigo != ip and ip_antigo not in self.grid_cameras:
-                if ip_antigo in self.camera_handlers:
-                    try: self.camera_handlers[ip_antigo].parar()
-                    except: pass
-                    del self.camera_handlers[ip_antigo]
+                self._liberar_handler(ip_antigo)
 
             if ip != "0.0.0.0":
                 if ip in self.cooldown_conexoes: del self.cooldown_conexoes[ip]
                 canal_alvo = self.obter_canal_alvo(ip)
                 self.iniciar_conexao_assincrona(ip, canal_alvo)
 
+        if ip_antigo != ip:
+            self.atualizar_visibilidade_streams()
+
+    def transacao_grid(self, atribuicoes, manual=True):
+        """Aplica várias atribuições {slot: ip} de uma vez, como uma única transação do grid.
+
+        Handlers de IPs que continuam no grid apenas mudam de slot (o loop de exibição reinscreve
+        o slot com o novo tamanho); só as câmeras que saíram são liberadas e só as novas conectam.
+        """
+        if manual and self.ultima_predefinicao:
+            self.pintar_predefinicao(self.ultima_predefinicao, self.BG_SIDEBAR)
+            self.ultima_predefinicao = None
+
+        for idx, ip in atribuicoes.items():
+            ip = ip or "0.0.0.0"
+            if not (0 <= idx < 20) or self.grid_cameras[idx] == ip: continue
+            handler = self.camera_handlers.get(ip)
+            if (handler is not None and handler != "CONECTANDO") or ip in self.pool_aquecido.handlers:
+                self.grid_cameras[idx] = ip
+                # O slot ainda mostra o frame da câmera anterior: até o primeiro frame desta
+                # (o leitor é acordado ao reinscrever o slot), exibe a miniatura salva ou um texto
+                self._liberar_consumidor_slot(idx)
+                self._carregar_miniatura_antiga(ip)
+                if not self._exibir_miniatura_antiga(idx, ip):
+                    texto = f"CARREGANDO...\n{ip}" if idx == self.slot_selecionado else "CARREGANDO..."
+                    self._exibir_texto_slot(idx, texto, forcar=True)
+            else:
+                self.atribuir_ip_ao_slot(idx, ip, atualizar_ui=False, gerenciar_conexoes=False, salvar=False, forcado=True)
+
+        no_grid = {ip for ip in self.grid_cameras if ip and ip != "0.0.0.0"}
+        for ip in list(self.camera_handlers.keys()):
+            if ip not in no_grid: self._liberar_handler(ip)
+
+        self.salvar_grid()
+
+        # O agendador ordena por prioridade; IPs já conectados ou na fila são ignorados
+        for ip in sorted(no_grid, key=self._prioridade_conexao):
+            self.iniciar_conexao_assincrona(ip, self.obter_canal_alvo(ip))
+
+        # Handlers mantidos: canal e visibilidade conforme o novo layout
+        for ip, handler in self.camera_handlers.items():
+            if handler != "CONECTANDO": handler.set_canal(self.obter_canal_alvo(ip))
+        self.atualizar_visibilidade_streams()
+
     def selecionar_camera(self, ip):
         # Esta função é chamada ao clicar na lista lateral
         if self.slot_selecionado is not None:
@@ -1050,7 +3862,11 @@ class CentralMonitoramento(ctk.CTk):
             self.selecionar_slot(self.slot_selecionado)
 
     def pintar_botao(self, ip, cor):
-        if ip and ip in self.botoes_referencia: self.botoes_referencia[ip]['frame'].configure(fg_color=cor)
+        if not ip: return
+        if cor == "transparent": self.cores_lista.pop(ip, None)
+        else: self.cores_lista[ip] = cor
+        for linha in self.lista_cameras.linhas:
+            if linha['item'] == ip: self._preencher_linha_camera(linha, ip)
 
     def pintar_predefinicao(self, nome, cor):
         if nome and nome in self.predefinicao_widgets:
@@ -1065,6 +3881,47 @@ class CentralMonitoramento(ctk.CTk):
             if handler != "CONECTANDO":
                 handler.set_canal(self.obter_canal_alvo(ip))
 
+    def alternar_miniaturas_keyframe(self):
+        self.miniaturas_keyframe = bool(self.switch_miniaturas.get())
+        for ip, handler in self.camera_handlers.items():
+            if handler != "CONECTANDO":
+                handler.set_modo_miniatura(self.miniaturas_keyframe)
+
+    def _configurar_replay(self, handler):
+        segundos = self.replay_segundos if self.replay_ativo else 0
+        if isinstance(handler, CameraHandlerRemoto):
+            # Cada processo do pool tem o próprio orçamento: divide o global entre eles
+            total = self.replay_mb_total * 1024 * 1024 // len(self.pool_decodificacao.processos)
+            handler.set_replay(segundos, self.replay_mb_camera * 1024 * 1024, total)
+        else:
+            handler.set_replay(segundos, self.replay_mb_camera * 1024 * 1024)
+
+    def alternar_buffer_replay(self):
+        self.replay_ativo = bool(self.switch_replay.get())
+        for handler in list(self.camera_handlers.values()) + self.pool_aquecido.handlers_ativos():
+            if handler != "CONECTANDO":
+                self._configurar_replay(handler)
+
+    def iniciar_replay(self, idx):
+        """Reproduz no slot os últimos segundos do anel da câmera, sem interromper a captura ao vivo."""
+        ip = self.grid_cameras[idx]
+        handler = self.camera_handlers.get(ip)
+        if not handler or handler == "CONECTANDO":
+            self.abrir_modal_alerta("Replay", "A câmera precisa estar conectada.")
+            return
+        self.encerrar_replay(idx)
+        self.replays_slot[idx] = ReprodutorReplay(ip, handler.copiar_replay, self.velocidade_replay,
+                                                  self.sinalizador.sinalizar)
+
+    def encerrar_replay(self, idx):
+        replay = self.replays_slot.pop(idx, None)
+        if replay is not None: replay.parar()
+        if self.consumidores_slot[idx] is replay and replay is not None: self._liberar_consumidor_slot(idx)
+
+    def definir_velocidade_replay(self, texto):
+        self.velocidade_replay = float(texto.rstrip("x"))
+        for replay in self.replays_slot.values(): replay.set_velocidade(self.velocidade_replay)
+
     def trocar_qualidade(self, ip, novo_canal):
         if not ip: return
         handler = self.camera_handlers.get(ip)
@@ -1079,15 +3936,20 @@ class CentralMonitoramento(ctk.CTk):
         if len(nome) > max_chars: return nome[:max_chars-3] + "..."
         return nome
 
+    def _liberar_handler(self, ip):
+        """Tira a câmera de uso: cancela a conexão pendente ou guarda o handler no pool aquecido."""
+        self.agendador_conexoes.cancelar(ip)
+        handler = self.camera_handlers.pop(ip, None)
+        if handler is None or handler == "CONECTANDO": return
+        try: self.pool_aquecido.guardar(ip, handler)
+        except Exception as e: print(f"Erro ao liberar handler {ip}: {e}")
+
     def iniciar_conexao_assincrona(self, ip, canal=102):
         if not ip or ip == "0.0.0.0": return
         agora = time.time()
 
         # Respeita cooldown de falha
-        if ip in self.cooldown_conexoes:
-            cooldown_data = self.cooldown_conexoes[ip]
-            ts = cooldown_data[0] if isinstance(cooldown_data, tuple) else cooldown_data
-            if agora - ts < 10: return
+        if self._erro_em_cooldown(ip, agora) is not None: return
 
         # Verifica se já está conectando ou rodando
         if ip in self.camera_handlers:
@@ -1096,17 +3958,48 @@ class CentralMonitoramento(ctk.CTk):
             if getattr(handler, 'rodando', False): return
             del self.camera_handlers[ip]
 
-        # Evita duplicar na fila
-        if ip in self.ips_em_fila: return
+        # Câmera ainda aquecida: reaproveita a conexão sem novo handshake
+        handler = self.pool_aquecido.retirar(ip)
+        if handler is not None:
+            self._adotar_handler(ip, handler, canal)
+            self.sinalizador.sinalizar()
+            return
 
         self.camera_handlers[ip] = "CONECTANDO"
-        self.ips_em_fila.add(ip)
-        self.fila_pendente_conexoes.put((ip, canal))
-
-    def _thread_conectar(self, ip, canal):
+        self.agendador_conexoes.agendar(ip, canal, self._prioridade_conexao(ip))
+
+    def _adotar_handler(self, ip, handler, canal):
+        """Instala o handler como o ativo do IP com as configurações do grid.
+
+        Handlers vindos do pool aquecido ou do pré-aquecimento foram abertos ocultos e só com
+        I-frames; aqui voltam ao modo de miniatura, canal e replay atuais.
+        """
+        self.camera_handlers[ip] = handler
+        handler.set_modo_miniatura(self.miniaturas_keyframe)
+        self._configurar_replay(handler)
+        handler.set_canal(canal)
+        handler.set_visivel(ip in self.obter_ips_visiveis())
+
+    def _erro_em_cooldown(self, ip, agora):
+        """Erro da última falha se o IP ainda estiver aguardando o backoff, senão None."""
+        cooldown_data = self.cooldown_conexoes.get(ip)
+        if cooldown_data is None: return None
+        ts, erro, atraso = cooldown_data
+        return (erro or "FALHA CONEXÃO") if agora - ts < atraso else None
+
+    def _thread_conectar(self, ip, canal, preaquecer=False):
         try:
-            nova_cam = CameraHandler(ip, canal, user=self.user_ptz, password=self.pass_ptz)
-            nova_cam.nome_display = self.dados_cameras.get(ip, "")
+            if self.pool_decodificacao:
+                nova_cam = CameraHandlerRemoto(self.pool_decodificacao, ip, canal, user=self.user_ptz, password=self.pass_ptz)
+            else:
+                nova_cam = CameraHandler(ip, canal, user=self.user_ptz, password=self.pass_ptz)
+            nova_cam.set_nome_display(self.dados_cameras.get(ip, ""))
+            # Pré-aquecida: abre com o leitor PyAV e já oculta, decodificando só I-frames
+            nova_cam.set_modo_miniatura(self.miniaturas_keyframe or preaquecer)
+            if preaquecer: nova_cam.set_visivel(False)
+            self._configurar_replay(nova_cam)
+            nova_cam.monitor_alcance = self.monitor_alcance
+            nova_cam.ao_frame_pronto = self.sinalizador.sinalizar
             sucesso = nova_cam.iniciar()
             # Passa o erro detalhado se houver
             erro = getattr(nova_cam, 'ultimo_erro', None)
@@ -1114,27 +4007,158 @@ class CentralMonitoramento(ctk.CTk):
         except Exception as e:
             print(f"Erro crítico na thread de conexão ({ip}): {e}")
             self.fila_conexoes.put((False, None, ip, "ERRO CRITICO"))
+        self.sinalizador.sinalizar()
 
     def _pos_conexao(self, sucesso, camera_obj, ip, erro=None):
+        atual = self.camera_handlers.get(ip)
+        if sucesso and ((atual is not None and atual != "CONECTANDO" and atual is not camera_obj
+                         and getattr(atual, 'rodando', False)) or ip in self.pool_aquecido.handlers):
+            # Conexão duplicada (ex.: pré-aquecimento e predefinição ao mesmo tempo): mantém a existente
+            camera_obj.parar()
+            return
+        if sucesso and ip not in self.grid_cameras:
+            # Pré-aquecida ou removida do grid durante a conexão: fica no pool aquecido
+            if atual == "CONECTANDO": del self.camera_handlers[ip]
+            self.pool_aquecido.guardar(ip, camera_obj)
+            return
         if sucesso:
             # print(f"LOG: Conexão bem-sucedida com {ip}")
-            self.camera_handlers[ip] = camera_obj
+            # Pode ser uma conexão de pré-aquecimento que terminou depois de o IP entrar no grid
+            self._adotar_handler(ip, camera_obj, self.obter_canal_alvo(ip))
             if ip in self.cooldown_conexoes: del self.cooldown_conexoes[ip]
+            self.backoff_conexoes.pop(ip, None)
         else:
             # print(f"LOG: Falha na conexão final com {ip}")
             if ip in self.camera_handlers: del self.camera_handlers[ip]
-            self.cooldown_conexoes[ip] = (time.time(), erro)
+            # Backoff por câmera (5 s dobrando até 2 min, com jitter) no lugar do cooldown fixo
+            backoff = self.backoff_conexoes.setdefault(ip, BackoffExponencial(base=5.0, maximo=120.0))
+            self.cooldown_conexoes[ip] = (time.time(), erro, backoff.proximo())
             for i, grid_ip in enumerate(self.grid_cameras):
                 if grid_ip == ip:
                     try:
                         msg = f"{erro}\n{ip}" if erro else f"FALHA CONEXÃO\n{ip}"
-                        self.slot_labels[i].configure(image=None, text=msg)
-                        self.slot_labels[i].image = None
-                        self.slot_ctk_images[i] = None
+                        self._exibir_texto_slot(i, msg, forcar=True)
                     except: pass
         self.atualizar_botoes_controle()
 
+    def _contabilizar_tk(self, t0, chamadas=1):
+        self.estatisticas_ui["tempo_tk"] += time.perf_counter() - t0
+        self.estatisticas_ui["chamadas_tk"] += chamadas
+
+    def _exibir_texto_slot(self, i, texto, forcar=False):
+        """Mostra um texto de status no slot (sem imagem), evitando chamadas redundantes ao Tcl/Tk."""
+        self.miniatura_slot[i] = None
+        if self.compositor:
+            self.compositor.definir_texto(i, texto)
+            return
+        if forcar or self.cache_ui_text[i] != texto or self.cache_ui_image[i] != self.img_vazia:
+            t0 = time.perf_counter()
+            self.slot_labels[i].configure(image=self.img_vazia, text=texto)
+            self.slot_labels[i].image = self.img_vazia
+            self._contabilizar_tk(t0)
+            self.cache_ui_text[i] = texto
+            self.cache_ui_image[i] = self.img_vazia
+            # Limpa cache do slot para evitar fantasmas ou falhas de sincronia
+            self.fotos_slot[i] = None
+
+    def _exibir_frame_slot(self, i, pil_img):
+        if self.compositor:
+            self.compositor.atualizar_slot(i, pil_img)
+            return
+
+        t0 = time.perf_counter()
+        try:
+            # O handler já entrega o frame no tamanho físico do slot (_tamanho_slot), então não
+            # passa pelo CTkImage (que reescalaria e criaria uma PhotoImage nova a cada frame):
+            # uma PhotoImage por slot, recriada só quando o tamanho muda, recebe o frame via paste.
+            foto = self.fotos_slot[i]
+            if foto is None or (foto.width(), foto.height()) != pil_img.size:
+                foto = self.fotos_slot[i] = ImageTk.PhotoImage("RGB", pil_img.size, master=self.slot_labels[i])
+            foto.paste(pil_img)
+
+            # SEMPRE garante que o label está apontando para a foto do slot e sem texto
+            if self.cache_ui_image[i] is not foto or self.cache_ui_text[i] != "":
+                with warnings.catch_warnings():
+                    # A foto já está em pixels físicos; o aviso de HighDPI do CTk não se aplica
+                    warnings.simplefilter("ignore")
+                    self.slot_labels[i].configure(image=foto, text="")
+                self.slot_labels[i].image = foto
+                self.cache_ui_image[i] = foto
+                self.cache_ui_text[i] = ""
+        except Exception as e:
+            # Se falhar, recria a foto do slot no próximo frame
+            self.fotos_slot[i] = None
+        self._contabilizar_tk(t0)
+
+    def _liberar_consumidor_slot(self, i):
+        handler = self.consumidores_slot[i]
+        self.consumidores_slot[i] = None
+        self.cache_ui_size[i] = None
+        if handler is not None:
+            try: handler.remover_consumidor(i)
+            except: pass
+
+    def _tamanho_slot(self, i):
+        """Tamanho físico (pixels) disponível para o vídeo do slot (cache de GeometriaSlots)."""
+        tam = self.geometria_slots.tamanho_alvo(i)
+        if tam: return tam
+        # Slot ainda sem <Configure> (não desenhado)
+        wf = self.slot_frames[i].winfo_width()
+        hf = self.slot_frames[i].winfo_height()
+        return int(max(10, wf - 6)), int(max(10, hf - 6))
+
+    def _agendar_exibicao(self, atraso_ms):
+        """Agenda o próximo tick de exibição, antecipando um já agendado se este for mais cedo."""
+        alvo = time.perf_counter() + atraso_ms / 1000.0
+        if self._exibicao_agendada is not None:
+            if self._exibicao_alvo <= alvo: return
+            try: self.after_cancel(self._exibicao_agendada)
+            except: pass
+        self._exibicao_alvo = alvo
+        self._exibicao_agendada = self.after(int(atraso_ms), self.loop_exibicao)
+
+    def _ao_frames_prontos(self):
+        # Coalesce: respeita o intervalo mínimo desde o último tick
+        decorrido = (time.perf_counter() - self._ultimo_tick) * 1000.0
+        self._agendar_exibicao(max(0, self.INTERVALO_MIN_TICK_MS - decorrido))
+
+    def resumo_estatisticas_ui(self):
+        e = self.estatisticas_ui
+        ticks = max(1, e["ticks"])
+        return {"ticks": e["ticks"], "frames_renderizados": e["frames_renderizados"],
+                "frames_por_tick": e["frames_renderizados"] / ticks,
+                "tick_ms_medio": e["tempo_tick"] * 1000.0 / ticks,
+                "tk_ms_medio": e["tempo_tk"] * 1000.0 / ticks,
+                "chamadas_tk_por_tick": e["chamadas_tk"] / ticks}
+
+    def texto_metricas(self):
+        """Conteúdo do /metrics (chamado pela thread do servidor HTTP)."""
+        return formatar_metricas(self.camera_handlers, dict(self.estatisticas_ui), self.histograma_tick.copia(),
+                                 self.agendador_conexoes, self.pool_aquecido, self.gravadores, self.controles_ptz)
+
+    def _registrar_log_estatisticas(self):
+        ts_anterior, anterior = self._ultimo_log_estatisticas
+        agora = time.time()
+        if agora - ts_anterior < 30: return
+        atual = dict(self.estatisticas_ui)
+        dt = agora - ts_anterior
+        ticks = max(1, atual["ticks"] - anterior["ticks"])
+        print(f"LOG UI: {ticks / dt:.1f} ticks/s, {(atual['frames_renderizados'] - anterior['frames_renderizados']) / dt:.1f} frames/s, "
+              f"Tk {(atual['tempo_tk'] - anterior['tempo_tk']) * 1000.0 / ticks:.2f} ms/tick")
+        self._ultimo_log_estatisticas = (agora, atual)
+
     def loop_exibicao(self):
+        inicio_tick = time.perf_counter()
+        # Evita cadeias duplicadas se o tick for chamado diretamente com outro já agendado
+        if self._exibicao_agendada is not None:
+            try: self.after_cancel(self._exibicao_agendada)
+            except: pass
+        self._exibicao_agendada = None
+        self._ultimo_tick = inicio_tick
+        # Frames publicados a partir daqui geram um novo evento
+        self.sinalizador.limpar()
+        # Atraso (s) até algum slot limitado pela taxa máxima poder exibir o frame pendente
+        proximo_pendente = None
         try:
             # Processa novas conexões
             while not self.fila_conexoes.empty():
@@ -1148,142 +4172,137 @@ class CentralMonitoramento(ctk.CTk):
                         self._pos_conexao(sucesso, camera_obj, ip)
                 except: pass
 
+            if self.layout_sujo:
+                t0 = time.perf_counter()
+                if self.compositor:
+                    self.compositor.atualizar_layout(self.slot_frames, self.geometria_slots.retangulos_visiveis())
+                # Empilhamento só muda com o layout (a seleção já ergue os botões ao posicioná-los)
+                if self.btn_expandir.winfo_ismapped():
+                    self.btn_expandir.lift()
+                if self.btn_mais_opcoes.winfo_ismapped():
+                    self.btn_mais_opcoes.lift()
+                self._contabilizar_tk(t0)
+                self.layout_sujo = False
+
             agora = time.time()
-            scaling = self._get_window_scaling()
             indices_trabalho = [self.slot_maximized] if self.slot_maximized is not None else range(20)
 
-            # Mapeia quais IPs estão sendo processados para compartilhar frames se possível (IP -> PIL Image)
-            current_ips_pil = {}
-
             for i in range(20):
                 ip = self.grid_cameras[i]
 
+                # Slot deixou de exibir o handler ao qual estava inscrito: libera a saída dele
+                consumidor = self.consumidores_slot[i]
+                replay = self.replays_slot.get(i)
+                if replay is not None and (not replay.rodando or replay.ip != ip):
+                    # Replay terminou (ou o slot mudou de câmera): volta ao vivo
+                    if replay.ultimo_erro: print(f"Replay de {replay.ip}: {replay.ultimo_erro}")
+                    self.encerrar_replay(i)
+                    replay = None
+                fonte = replay if replay is not None else self.camera_handlers.get(ip)
+                if consumidor is not None and (i not in indices_trabalho or fonte is not consumidor):
+                    self._liberar_consumidor_slot(i)
+
                 # Caso o slot deva estar vazio ou não esteja no foco de atualização
                 if not ip or ip == "0.0.0.0" or i not in indices_trabalho:
                     # Segurança: se o slot deveria estar vazio, garante texto e imagem vazia
                     if ip == "0.0.0.0":
-                        try:
-                            target_text = f"Espaço {i+1}"
-                            # Verifica se precisa atualizar para evitar cintilação (usando cache)
-                            if (self.cache_ui_text[i] != target_text or
-                                self.cache_ui_image[i] != self.img_vazia):
-                                self.slot_labels[i].configure(image=self.img_vazia, text=target_text)
-                                self.slot_labels[i].image = self.img_vazia
-                                self.cache_ui_text[i] = target_text
-                                self.cache_ui_image[i] = self.img_vazia
-                                self.slot_ctk_images[i] = None
+                        try: self._exibir_texto_slot(i, f"Espaço {i+1}")
                         except: pass
                     continue
 
-                # Verifica erro de conexão
-                if ip in self.cooldown_conexoes:
-                    cooldown_data = self.cooldown_conexoes[ip]
-                    ts = cooldown_data[0] if isinstance(cooldown_data, tuple) else cooldown_data
-                    erro = cooldown_data[1] if isinstance(cooldown_data, tuple) else "FALHA CONEXÃO"
-
-                    if agora - ts < 10:
-                        try:
-                            target_status = f"{erro}\n{ip}" if i == self.slot_selecionado else erro
-                            if self.cache_ui_image[i] != self.img_vazia or self.cache_ui_text[i] != target_status:
-                                self.slot_labels[i].configure(image=self.img_vazia, text=target_status)
-                                self.slot_labels[i].image = self.img_vazia
-                                self.cache_ui_text[i] = target_status
-                                self.cache_ui_image[i] = self.img_vazia
-                                self.slot_ctk_images[i] = None
-                        except: pass
-                        continue
+                # Verifica erro de conexão (o replay segue exibindo mesmo com o ao vivo em falha)
+                erro = self._erro_em_cooldown(ip, agora) if replay is None else None
+                if erro is not None:
+                    try:
+                        target_status = f"{erro}\n{ip}" if i == self.slot_selecionado else erro
+                        self._exibir_texto_slot(i, target_status)
+                    except: pass
+                    continue
 
-                handler = self.camera_handlers.get(ip)
+                handler = fonte
                 if handler is None:
                     # Decide canal inicial dependendo se está maximizado ou não
                     canal_alvo = self.obter_canal_alvo(ip)
                     self.iniciar_conexao_assincrona(ip, canal_alvo)
+                    self._exibir_miniatura_antiga(i, ip)
                     continue
                 if handler == "CONECTANDO":
+                    if self._exibir_miniatura_antiga(i, ip): continue
                     target_status = f"CONECTANDO...\n{ip}" if i == self.slot_selecionado else "CONECTANDO..."
-                    if self.cache_ui_text[i] != target_status:
-                        self.slot_labels[i].configure(text=target_status)
-                        self.cache_ui_text[i] = target_status
+                    self._exibir_texto_slot(i, target_status)
                     continue
 
                 try:
                     # Calcula tamanhos físicos
-                    wf = self.slot_frames[i].winfo_width()
-                    hf = self.slot_frames[i].winfo_height()
-                    wf = int(max(10, wf - 6))
-                    hf = int(max(10, hf - 6))
+                    wf, hf = self._tamanho_slot(i)
 
                     # Se baixa qualidade ativada e não é prioridade, limita resolução
                     if self.forcar_baixa_qualidade and i != self.slot_maximized:
                         wf, hf = min(wf, 320), min(hf, 240)
 
-                    # Só atualiza handler se o tamanho mudou (evita locks desnecessários)
-                    if self.cache_ui_size[i] != (wf, hf):
-                        handler.tamanho_alvo = (wf, hf)
+                    # Cada slot é um consumidor próprio do handler: o mesmo IP em dois slots
+                    # decodifica uma vez e recebe duas saídas no tamanho certo de cada slot.
+                    # A interpolação (LINEAR na maximizada, que tem prioridade) fica a cargo da
+                    # thread de leitura. Só atualiza o handler se algo mudou (evita locks desnecessários)
+                    if self.consumidores_slot[i] is not handler or self.cache_ui_size[i] != (wf, hf):
+                        handler.registrar_consumidor(i, (wf, hf))
+                        self.consumidores_slot[i] = handler
                         self.cache_ui_size[i] = (wf, hf)
 
-                    # Usa LINEAR para maximizada e NEAREST para miniaturas (melhor performance)
-                    handler.interpolation = cv2.INTER_LINEAR if self.slot_maximized == i else cv2.INTER_NEAREST
-
-                    # Verifica se já processamos este IP neste loop
-                    pil_img = current_ips_pil.get(ip)
-                    if pil_img is None and handler.novo_frame:
-                        pil_img = handler.pegar_frame()
-                        if pil_img:
-                            current_ips_pil[ip] = pil_img
+                    pil_img = None
+                    if handler.tem_frame_novo(i):
+                        fps_max = self.fps_max_maximizado if self.slot_maximized == i else self.fps_max_slot
+                        espera = self.ultimo_render_slot[i] + 1.0 / fps_max - inicio_tick
+                        if espera > 0:
+                            proximo_pendente = espera if proximo_pendente is None else min(proximo_pendente, espera)
+                        else:
+                            pil_img = handler.pegar_frame(i)
 
                     if pil_img:
-                        wl, hl = wf / scaling, hf / scaling
-
-                        try:
-                            # Abordagem de criação direta para garantir atualização (testando se resolve 'dark screen')
-                            # Mas mantendo cache para não explodir pyimages
-                            if self.slot_ctk_images[i] is None:
-                                self.slot_ctk_images[i] = ctk.CTkImage(light_image=pil_img, dark_image=pil_img, size=(wl, hl))
-                                # print(f"DEBUG: Slot {i} ({ip}) - Primeiro Frame ({pil_img.size})")
-                            else:
-                                # Tenta atualizar o objeto existente
-                                self.slot_ctk_images[i].configure(light_image=pil_img, dark_image=pil_img, size=(wl, hl))
-
-                            # SEMPRE garante que o label está apontando para o objeto de cache e sem texto
-                            if self.cache_ui_image[i] != self.slot_ctk_images[i] or self.cache_ui_text[i] != "":
-                                self.slot_labels[i].configure(image=self.slot_ctk_images[i], text="")
-                                self.slot_labels[i].image = self.slot_ctk_images[i]
-                                self.cache_ui_image[i] = self.slot_ctk_images[i]
-                                self.cache_ui_text[i] = ""
-                        except Exception as e:
-                                # print(f"DEBUG: Erro ao renderizar frame no slot {i}: {e}")
-                                # Se falhar muito, tentamos recriar o cache do slot
-                                self.slot_ctk_images[i] = None
-                    else:
-                        # Stream aberto mas sem frames (pode estar carregando ou com erro de codec)
-                        # if i % 100 == 0: # Log esparso para não inundar
-                        #     print(f"DEBUG: Slot {i} ({ip}) - Aguardando frame válido...")
-                        pass
+                        self._exibir_frame_slot(i, pil_img)
+                        self.ultimo_render_slot[i] = inicio_tick
+                        self.estatisticas_ui["frames_renderizados"] += 1
+                        self.miniatura_slot[i] = None
+                        if handler is not replay:
+                            self.miniaturas_antigas.pop(ip, None)
+                            self.cache_miniaturas.oferecer(ip, pil_img)
+                    elif handler is not replay:
+                        # Stream aberto mas ainda sem frames (carregando ou com erro de codec): miniatura salva
+                        self._exibir_miniatura_antiga(i, ip)
 
                 except Exception as e:
                     # print(f"Erro render slot {i}: {e}")
                     pass
 
-            if self.btn_expandir.winfo_ismapped():
-                self.btn_expandir.lift()
-            if self.btn_mais_opcoes.winfo_ismapped():
-                self.btn_mais_opcoes.lift()
+            if self.compositor:
+                t0 = time.perf_counter()
+                chamadas = self.compositor.aplicar()
+                self._contabilizar_tk(t0, chamadas)
+
+            if self.monitor_alcance.versao != self._versao_alcance_ui:
+                self.atualizar_indicadores_alcance()
+            if self.pool_aquecido.handlers: self.pool_aquecido.expirar()
 
         except Exception as e: print(f"Erro no loop de exibição: {e}")
-        finally: self.after(50, self.loop_exibicao) # Ajustado para 50ms para equilibrar fluidez e CPU
-
-    def filtrar_lista(self):
-        termo = self.entry_busca.get().lower()
-        for item in self.botoes_referencia.values(): item['frame'].pack_forget()
-        for ip in self.obter_ips_ordenados():
-            item = self.botoes_referencia.get(ip)
-            if not item: continue
-            nome = self.dados_cameras.get(ip, "").lower()
-            if termo in ip or termo in nome: item['frame'].pack(fill="x", pady=2)
-        try:
-            if hasattr(self.scroll_frame, "_parent_canvas"): self.scroll_frame._parent_canvas.yview_moveto(0)
-        except: pass
+        finally:
+            duracao_tick = time.perf_counter() - inicio_tick
+            self.estatisticas_ui["ticks"] += 1
+            self.estatisticas_ui["tempo_tick"] += duracao_tick
+            self.histograma_tick.observar(duracao_tick)
+            if self.log_estatisticas: self._registrar_log_estatisticas()
+            # Próximo tick: quando um slot limitado liberar, quando um tamanho adiado passar a valer,
+            # ou o tick de segurança (conexões/status)
+            espera_geometria = self.geometria_slots.espera_pendente()
+            if espera_geometria is not None:
+                proximo_pendente = espera_geometria if proximo_pendente is None else min(proximo_pendente, espera_geometria)
+            if proximo_pendente is not None:
+                self._agendar_exibicao(max(self.INTERVALO_MIN_TICK_MS, proximo_pendente * 1000.0))
+            else:
+                self._agendar_exibicao(self.INTERVALO_OCIOSO_MS)
+
+    def filtrar_lista(self, manter_rolagem=False):
+        termo = self.entry_busca.get()
+        self.lista_cameras.definir_itens(self.indice_cameras.buscar(termo), manter_rolagem=manter_rolagem)
 
     def alternar_edicao_nome(self):
         if not self.ip_selecionado: return
@@ -1293,18 +4312,15 @@ class CentralMonitoramento(ctk.CTk):
     def salvar_nome(self, novo_nome):
         if self.ip_selecionado:
             self.dados_cameras[self.ip_selecionado] = novo_nome
-            with open(self.arquivo_config, "w", encoding='utf-8') as f:
-                json.dump(self.dados_cameras, f, ensure_ascii=False, indent=4)
+            self.salvar_config()
 
             # Atualiza handler se existir
             handler = self.camera_handlers.get(self.ip_selecionado)
             if handler and handler != "CONECTANDO":
-                handler.nome_display = novo_nome
+                handler.set_nome_display(novo_nome)
 
-            # Atualiza UI se estiver visível
-            if self.ip_selecionado in self.botoes_referencia:
-                self.botoes_referencia[self.ip_selecionado]['lbl_nome'].configure(text=novo_nome)
-            self.filtrar_lista()
+            self.indice_cameras.adicionar(self.ip_selecionado, novo_nome)
+            self.filtrar_lista(manter_rolagem=True)
 
     def abrir_modal_adicionar_camera(self):
         modal = ctk.CTkToplevel(self)
@@ -1360,12 +4376,11 @@ class CentralMonitoramento(ctk.CTk):
 
         if nome:
             self.dados_cameras[ip] = nome
-            with open(self.arquivo_config, "w", encoding='utf-8') as f:
-                json.dump(self.dados_cameras, f, ensure_ascii=False, indent=4)
+            self.salvar_config()
 
         self.salvar_lista_ips()
+        self.indice_cameras.adicionar(ip, self.dados_cameras.get(ip))
         self.atualizar_lista_cameras_ui()
-        self.filtrar_lista()
 
     def confirmar_exclusao_camera_da_lista(self, ip):
         self.abrir_modal_confirmacao("Excluir Câmera", f"Deseja remover o IP {ip} da lista de câmeras?",
@@ -1376,12 +4391,12 @@ class CentralMonitoramento(ctk.CTk):
             self.ips_unicos.remove(ip)
             if ip in self.dados_cameras:
                 del self.dados_cameras[ip]
-                with open(self.arquivo_config, "w", encoding='utf-8') as f:
-                    json.dump(self.dados_cameras, f, ensure_ascii=False, indent=4)
+                self.salvar_config()
 
             self.salvar_lista_ips()
+            self.indice_cameras.remover(ip)
+            self.cores_lista.pop(ip, None)
             self.atualizar_lista_cameras_ui()
-            self.filtrar_lista()
 
     def gerar_lista_ips(self):
         base = ["192.168.7.2", "192.168.7.3", "192.168.7.4", "192.168.7.20", "192.168.7.21",
@@ -1407,12 +4422,14 @@ class CentralMonitoramento(ctk.CTk):
 
     def salvar_lista_ips(self, ips=None):
         if ips is None: ips = self.ips_unicos
-        try:
-            with open(self.arquivo_ips, "w", encoding='utf-8') as f:
-                json.dump(ips, f, ensure_ascii=False, indent=4)
+        try: self.persistencia.agendar(self.arquivo_ips, ips)
         except Exception as e:
             print(f"Erro ao salvar lista de IPs: {e}")
 
+    def salvar_config(self):
+        try: self.persistencia.agendar(self.arquivo_config, self.dados_cameras)
+        except Exception as e: print(f"Erro ao salvar nomes das câmeras: {e}")
+
     def carregar_config(self):
         if os.path.exists(self.arquivo_config):
             try:
@@ -1421,8 +4438,7 @@ class CentralMonitoramento(ctk.CTk):
         return {}
 
     def obter_ips_ordenados(self):
-        def chave_ordenacao(ip): return self.dados_cameras.get(ip, f"IP {ip}").lower()
-        return sorted(self.ips_unicos, key=chave_ordenacao)
+        return self.indice_cameras.buscar("")
 
     def criar_seletor_ip(self, parent):
         frame_seletor = ctk.CTkFrame(parent, fg_color="transparent")
@@ -1505,36 +4521,76 @@ class CentralMonitoramento(ctk.CTk):
             pass
 
     def atualizar_lista_cameras_ui(self):
-        for child in self.scroll_frame.winfo_children():
-            child.destroy()
-        self.botoes_referencia = {}
-
-        for ip in self.obter_ips_ordenados():
-            nome = self.dados_cameras.get(ip, f"IP {ip}")
-            cor = self.ACCENT_WINE if ip == self.ip_selecionado else "transparent"
-            frm = ctk.CTkFrame(self.scroll_frame, height=50, fg_color=cor, border_width=1, border_color=self.GRAY_DARK)
-            frm.pack(fill="x", pady=2); frm.pack_propagate(False)
-
-            # Container para o texto (Label)
-            txt_container = ctk.CTkFrame(frm, fg_color="transparent")
-            txt_container.pack(side="left", fill="both", expand=True)
-
-            lbl_nome = ctk.CTkLabel(txt_container, text=nome, font=("Roboto", 13, "bold"), text_color=self.TEXT_P, anchor="w")
-            lbl_nome.pack(fill="x", padx=10, pady=(4, 0))
-            lbl_ip = ctk.CTkLabel(txt_container, text=ip, font=("Roboto", 11), text_color=self.TEXT_S, anchor="w")
-            lbl_ip.pack(fill="x", padx=10, pady=(0, 4))
-
-            # Botão de Deletar
-            btn_del = ctk.CTkButton(frm, text="X", width=30, height=30, fg_color="transparent",
-                                     text_color=self.TEXT_S, hover_color=self.ACCENT_RED,
-                                     command=lambda x=ip: self.confirmar_exclusao_camera_da_lista(x))
-            btn_del.pack(side="right", padx=5)
-
-            for widget in [txt_container, lbl_nome, lbl_ip]:
-                widget.bind("<Button-1>", lambda e, x=ip: self.selecionar_camera(x))
-                widget.configure(cursor="hand2")
+        self.monitor_alcance.definir_ips(self.ips_unicos + self.grid_cameras)
+        self.filtrar_lista(manter_rolagem=True)
+        self._versao_alcance_ui = -1
+        self.atualizar_indicadores_alcance()
+
+    def _criar_linha_camera(self, parent):
+        """Widgets de uma linha da lista lateral (reutilizados pela ListaVirtual ao rolar)."""
+        linha = {}
+        frm = ctk.CTkFrame(parent, height=50, fg_color="transparent", border_width=1, border_color=self.GRAY_DARK)
+        frm.pack_propagate(False)
+
+        # Indicador de alcance (atualizado pela varredura do MonitorAlcance)
+        lbl_status = ctk.CTkLabel(frm, text="●", width=14, font=("Roboto", 14), text_color=self.GRAY_DARK)
+        lbl_status.pack(side="left", padx=(8, 0))
+
+        # Container para o texto (Label)
+        txt_container = ctk.CTkFrame(frm, fg_color="transparent")
+        txt_container.pack(side="left", fill="both", expand=True)
+
+        lbl_nome = ctk.CTkLabel(txt_container, text="", font=("Roboto", 13, "bold"), text_color=self.TEXT_P, anchor="w")
+        lbl_nome.pack(fill="x", padx=10, pady=(4, 0))
+        lbl_ip = ctk.CTkLabel(txt_container, text="", font=("Roboto", 11), text_color=self.TEXT_S, anchor="w")
+        lbl_ip.pack(fill="x", padx=10, pady=(0, 4))
+
+        # Botão de Deletar
+        btn_del = ctk.CTkButton(frm, text="X", width=30, height=30, fg_color="transparent",
+                                 text_color=self.TEXT_S, hover_color=self.ACCENT_RED,
+                                 command=lambda: self.confirmar_exclusao_camera_da_lista(linha['item']))
+        btn_del.pack(side="right", padx=5)
+
+        for widget in [txt_container, lbl_nome, lbl_ip]:
+            widget.bind("<Button-1>", lambda e: self.selecionar_camera(linha['item']))
+            widget.configure(cursor="hand2")
+
+        linha.update({'frame': frm, 'txt_container': txt_container, 'lbl_nome': lbl_nome, 'lbl_ip': lbl_ip,
+                      'lbl_status': lbl_status, 'btn_del': btn_del, 'cor': None, 'nome': None, 'status': None})
+        return linha
+
+    def _status_alcance(self, ip):
+        estado = self.monitor_alcance.consultar(ip)
+        if estado is None:
+            return (self.GRAY_DARK, ip)
+        if estado[0]:
+            return ("#2E7D32", f"{ip}  ·  {estado[1]:.0f} ms" if estado[1] is not None else ip)
+        return (self.ACCENT_RED, f"{ip}  ·  offline")
+
+    def _preencher_linha_camera(self, linha, ip):
+        """Aponta uma linha reciclada para o IP (só reconfigura o que mudou)."""
+        cor = self.cores_lista.get(ip, "transparent")
+        nome = self.dados_cameras.get(ip, f"IP {ip}")
+        status = self._status_alcance(ip)
+        try:
+            if linha['cor'] != cor:
+                linha['cor'] = cor
+                linha['frame'].configure(fg_color=cor)
+            if linha['nome'] != nome:
+                linha['nome'] = nome
+                linha['lbl_nome'].configure(text=nome)
+            if linha['status'] != status:
+                linha['status'] = status
+                linha['lbl_status'].configure(text_color=status[0])
+                linha['lbl_ip'].configure(text=status[1])
+        except: pass
 
-            self.botoes_referencia[ip] = {'frame': frm, 'lbl_nome': lbl_nome, 'lbl_ip': lbl_ip}
+    def atualizar_indicadores_alcance(self):
+        """Pinta os indicadores das linhas visíveis com o último resultado da varredura."""
+        versao = self.monitor_alcance.versao
+        if versao == self._versao_alcance_ui: return
+        self._versao_alcance_ui = versao
+        self.lista_cameras.atualizar_visiveis()
 
     # --- MÉTODOS DE PREDEFINIÇÕES ---
     def carregar_predefinicoes(self):
@@ -1551,18 +4607,15 @@ class CentralMonitoramento(ctk.CTk):
             try:
                 with open(arquivo_legado, "r", encoding='utf-8') as f:
                     dados = json.load(f)
-                    # Salva no novo local imediatamente
-                    with open(self.arquivo_predefinicoes, "w", encoding='utf-8') as f_new:
-                        json.dump(dados, f_new, ensure_ascii=False, indent=4)
+                    # Salva no novo local
+                    self.persistencia.agendar(self.arquivo_predefinicoes, dados)
                     return dados
             except: pass
 
         return {}
 
     def salvar_predefinicoes(self):
-        try:
-            with open(self.arquivo_predefinicoes, "w", encoding='utf-8') as f:
-                json.dump(self.predefinicoes, f, ensure_ascii=False, indent=4)
+        try: self.persistencia.agendar(self.arquivo_predefinicoes, self.predefinicoes)
         except Exception as e:
             print(f"Erro ao salvar predefinicoes: {e}")
 
@@ -1597,51 +4650,91 @@ class CentralMonitoramento(ctk.CTk):
         # Gerencia cores na lista de predefinicoes
         if self.ultima_predefinicao:
             self.pintar_predefinicao(self.ultima_predefinicao, self.BG_SIDEBAR)
+            if self.ultima_predefinicao != nome:
+                self._registrar_transicao(self.ultima_predefinicao, nome)
         self.ultima_predefinicao = nome
         self.pintar_predefinicao(nome, self.ACCENT_WINE)
 
         # print(f"Aplicando predefinição: {nome}")
 
-        # 1. Fecha TODAS as conexões atuais para começar do zero (conforme solicitado pelo usuário)
-        for ip_h in list(self.camera_handlers.keys()):
-            h = self.camera_handlers[ip_h]
-            if h != "CONECTANDO":
-                try: h.parar()
-                except: pass
-            del self.camera_handlers[ip_h]
-
-        # 2. Limpa filas e estados de conexão
-        while not self.fila_pendente_conexoes.empty():
-            try: self.fila_pendente_conexoes.get_nowait()
-            except: pass
-        self.ips_em_fila.clear()
-
-        # 3. Atualiza os dados do grid primeiro (silenciosamente)
-        novos_ips = ["0.0.0.0"] * 20
-        ips_novos_set = set()
-        for i in range(20):
-            ip = predefinicao[i] if i < len(predefinicao) else "0.0.0.0"
-            novos_ips[i] = ip
-            if ip and ip != "0.0.0.0":
-                ips_novos_set.add(ip)
-
-            # Atualiza visualmente cada slot de forma segura
-            self.atribuir_ip_ao_slot(i, ip, atualizar_ui=False, gerenciar_conexoes=False, salvar=False, forcado=True)
-
-        self.salvar_grid()
-
-        # 4. Inicia conexões para os novos IPs (o staggered cuidará do resto)
-        for ip in ips_novos_set:
-            self.iniciar_conexao_assincrona(ip, self.obter_canal_alvo(ip))
-
-        # 5. Restaura layout se necessário e seleciona slot
+        # 1. Volta ao grid se estiver maximizado
         if self.slot_maximized is not None:
             self.restaurar_grid()
 
+        # 2. Aplica só a diferença: câmeras em comum continuam conectadas
+        novos_ips = [(predefinicao[i] if i < len(predefinicao) else "0.0.0.0") or "0.0.0.0" for i in range(20)]
+        self.transacao_grid(dict(enumerate(novos_ips)), manual=False)
+
         self.selecionar_slot(self.slot_selecionado)
         self.update_idletasks()
+
+        # 3. Deixa conectadas (ocultas, só I-frames) as câmeras extras da provável próxima predefinição
+        self.preaquecer_proxima_predefinicao()
         # print(f"Predefinição '{nome}' aplicada!")
 
+    def _registrar_transicao(self, anterior, proxima):
+        contagens = self.transicoes_predefinicoes.setdefault(anterior, {})
+        contagens[proxima] = contagens.get(proxima, 0) + 1
+
+    def _ordem_ronda_efetiva(self):
+        ordem = [nome for nome in self.ordem_ronda if nome in self.predefinicoes]
+        return ordem or list(self.predefinicoes.keys())
+
+    def prever_proxima_predefinicao(self):
+        """Próxima predefinição provável: a da ronda (ativa ou configurada) ou a transição mais frequente."""
+        atual = self.ultima_predefinicao
+        if self.ronda_ativa or self.ordem_ronda:
+            ordem = self._ordem_ronda_efetiva()
+            if atual in ordem: return ordem[(ordem.index(atual) + 1) % len(ordem)]
+            if self.ronda_ativa and ordem: return ordem[0]
+        contagens = {nome: n for nome, n in self.transicoes_predefinicoes.get(atual, {}).items()
+                     if nome in self.predefinicoes and nome != atual}
+        if not contagens: return None
+        nome, n = max(contagens.items(), key=lambda item: item[1])
+        # Uma única ocorrência ainda não é padrão
+        return nome if n >= 2 else None
+
+    def preaquecer_proxima_predefinicao(self):
+        """Conecta em segundo plano (substream, oculto) as câmeras da próxima predefinição fora do grid."""
+        proxima = self.prever_proxima_predefinicao()
+        alvo = []
+        if proxima and self.preaquecimento_max > 0:
+            no_grid = set(self.grid_cameras)
+            for ip in self.predefinicoes.get(proxima, []):
+                if ip and ip != "0.0.0.0" and ip not in no_grid and ip not in alvo:
+                    alvo.append(ip)
+            alvo = alvo[:self.preaquecimento_max]
+
+        # Pré-aquecimentos que deixaram de interessar voltam a ser entradas comuns do pool (LRU)
+        for ip in self.ips_preaquecimento - set(alvo):
+            self.agendador_conexoes.cancelar(ip)
+        self.ips_preaquecimento = set(alvo)
+        self.pool_aquecido.protegidos = set(alvo)
+
+        for ip in alvo:
+            if ip in self.pool_aquecido.handlers or ip in self.camera_handlers: continue
+            if self._erro_em_cooldown(ip, time.time()) is not None: continue
+            self.agendador_conexoes.agendar(ip, 102, self._prioridade_conexao(ip))
+
+    def alternar_ronda(self):
+        self.ronda_ativa = bool(self.switch_ronda.get())
+        if self._ronda_agendada is not None:
+            try: self.after_cancel(self._ronda_agendada)
+            except: pass
+            self._ronda_agendada = None
+        if self.ronda_ativa:
+            self.preaquecer_proxima_predefinicao()
+            self._ronda_agendada = self.after(int(self.intervalo_ronda * 1000), self._avancar_ronda)
+
+    def _avancar_ronda(self):
+        self._ronda_agendada = None
+        if not self.ronda_ativa: return
+        proxima = self.prever_proxima_predefinicao()
+        if proxima:
+            try: self.aplicar_predefinicao(proxima)
+            except Exception as e: print(f"Erro na ronda automática: {e}")
+        self._ronda_agendada = self.after(int(self.intervalo_ronda * 1000), self._avancar_ronda)
+
     def sobrescrever_predefinicao(self, nome):
         self.abrir_modal_confirmacao("Confirmar", f"Deseja sobrescrever o predefinição '{nome}' com a configuração atual?",
                                      lambda: self._sobrescrever_predefinicao(nome))
@@ -1725,5 +4818,6 @@ class CentralMonitoramento(ctk.CTk):
             self.predefinicao_widgets[nome] = frm
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = CentralMonitoramento()
     app.mainloop()
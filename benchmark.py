@@ -0,0 +1,614 @@
+"""Benchmarks do pipeline de exibição da Central de Monitoramento.
+
+Uso:
+    python benchmark.py tk [--ticks 300] [--saida resultado.json]
+    python benchmark.py keyframe amostra1.mp4 [amostra2.mkv ...] [--saida resultado.json]
+    python benchmark.py pipeline --sub sub.mp4 [--main main.mp4] [--streams 1,4,16,64]
+                                 [--modos grid,maximizado] [--duracao 10] [--saida resultado.json]
+    python benchmark.py gravacao --sub sub.mp4 --main main.mp4 [--streams 20] [--duracao 10]
+                                 [--saida resultado.json]
+    python benchmark.py ptz [--toques 50] [--atraso-ms 15] [--saida resultado.json]
+
+No cenário "pipeline" cada stream é um CameraHandler real lendo uma gravação local (ou um
+RTSP local de testes via --url), ritmada no FPS nominal e reiniciada ao chegar ao fim.
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import warnings
+
+import cv2
+import customtkinter as ctk
+from PIL import Image, ImageTk
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.auth import HTTPDigestAuth
+
+from Cameras import CameraHandler, CompositorGrid, ControlePTZ, GravadorCamera, LeitorPyAV, av
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def _gerar_frames(tamanho, quantidade=4):
+    """Gera alguns frames sintéticos (ruído colorido) para alternar a cada atualização."""
+    frames = []
+    for _ in range(quantidade):
+        cor = tuple(random.randint(0, 255) for _ in range(3))
+        img = Image.new("RGB", tamanho, cor)
+        img.paste(Image.effect_noise(tamanho, 64).convert("RGB"), (0, 0))
+        frames.append(img)
+    return frames
+
+
+def _montar_grid(root, n_slots):
+    grid_frame = ctk.CTkFrame(root, fg_color="#000000")
+    grid_frame.pack(expand=True, fill="both")
+    for i in range(4): grid_frame.grid_rowconfigure(i, weight=1)
+    for i in range(5): grid_frame.grid_columnconfigure(i, weight=1)
+    frames, labels = [], []
+    for i in range(n_slots):
+        frm = ctk.CTkFrame(grid_frame, fg_color="#1A1A1A", corner_radius=2, border_width=2, border_color="black")
+        frm.grid(row=i // 5, column=i % 5, padx=1, pady=1, sticky="nsew")
+        frm.pack_propagate(False)
+        lbl = ctk.CTkLabel(frm, text="", corner_radius=0)
+        lbl.pack(expand=True, fill="both", padx=2, pady=2)
+        frames.append(frm)
+        labels.append(lbl)
+    return grid_frame, frames, labels
+
+
+def benchmark_tk(ticks=300, fps_camera=7, tick_ms=50, n_slots=20):
+    """Mede o tempo gasto no Tk por tick.
+
+    "labels_ctkimage": caminho antigo (CTkImage reescalado a cada frame); "labels": caminho
+    atual do modo labels (uma PhotoImage por slot atualizada com paste); "compositor": CompositorGrid.
+    """
+    resultados = {}
+    for modo in ("labels_ctkimage", "labels", "compositor"):
+        root = ctk.CTk()
+        root.geometry("1600x900")
+        grid_frame, slot_frames, slot_labels = _montar_grid(root, n_slots)
+        root.update()
+
+        compositor = None
+        if modo == "compositor":
+            compositor = CompositorGrid(grid_frame, n_slots=n_slots)
+            compositor.canvas.place(x=0, y=0, relwidth=1, relheight=1)
+            compositor.canvas.lift()
+            root.update()
+            compositor.atualizar_layout(slot_frames)
+
+        tamanhos = [(max(10, f.winfo_width() - 6), max(10, f.winfo_height() - 6)) for f in slot_frames]
+        frames = [_gerar_frames(t) for t in tamanhos]
+        ctk_images = [None] * n_slots
+        fotos = [None] * n_slots
+        # Cada câmera entrega frames a fps_camera; o tick da UI roda a cada tick_ms
+        intervalo = 1.0 / fps_camera
+        proximo = [random.random() * intervalo for _ in range(n_slots)]
+
+        tempos_tk = []
+        t_sim = 0.0
+        for tick in range(ticks):
+            t_sim += tick_ms / 1000.0
+            t0 = time.perf_counter()
+            for i in range(n_slots):
+                if t_sim < proximo[i]: continue
+                proximo[i] += intervalo
+                img = frames[i][tick % len(frames[i])]
+                if compositor:
+                    compositor.atualizar_slot(i, img)
+                elif modo == "labels":
+                    # Como _exibir_frame_slot: a PhotoImage é criada uma vez e recebe cada frame via paste
+                    if fotos[i] is None:
+                        fotos[i] = ImageTk.PhotoImage("RGB", img.size, master=slot_labels[i])
+                        with warnings.catch_warnings():
+                            warnings.simplefilter("ignore")
+                            slot_labels[i].configure(image=fotos[i], text="")
+                    fotos[i].paste(img)
+                else:
+                    w, h = tamanhos[i]
+                    if ctk_images[i] is None:
+                        ctk_images[i] = ctk.CTkImage(light_image=img, dark_image=img, size=(w, h))
+                        slot_labels[i].configure(image=ctk_images[i], text="")
+                    else:
+                        ctk_images[i].configure(light_image=img, dark_image=img, size=(w, h))
+            if compositor:
+                compositor.aplicar()
+            # Inclui o redesenho efetivo (idle tasks) no tempo medido
+            root.update_idletasks()
+            tempos_tk.append((time.perf_counter() - t0) * 1000.0)
+            root.update()
+
+        root.destroy()
+        tempos_tk.sort()
+        resultados[modo] = {
+            "ticks": ticks,
+            "tk_ms_medio": sum(tempos_tk) / len(tempos_tk),
+            "tk_ms_p50": tempos_tk[len(tempos_tk) // 2],
+            "tk_ms_p95": tempos_tk[int(len(tempos_tk) * 0.95)],
+            "tk_ms_max": tempos_tk[-1],
+        }
+    return resultados
+
+
+def _decodificar_arquivo(leitor):
+    """Consome o arquivo inteiro (grab + retrieve) e devolve (frames, segundos de CPU)."""
+    frames = 0
+    cpu0 = time.process_time()
+    while leitor.grab():
+        ok, _ = leitor.retrieve()
+        if ok: frames += 1
+    cpu = time.process_time() - cpu0
+    leitor.release()
+    return frames, cpu
+
+
+def benchmark_keyframe(arquivos):
+    """Custo de CPU: OpenCV completo vs. PyAV completo vs. PyAV só I-frames (modo miniatura)."""
+    if av is None:
+        raise SystemExit("PyAV não instalado: pip install av")
+    # Mesmo cenário da aplicação: decodificação em uma única thread
+    cv2.setNumThreads(1)
+    resultados = {}
+    for arquivo in arquivos:
+        res = {}
+        res["opencv"] = _decodificar_arquivo(cv2.VideoCapture(arquivo, cv2.CAP_FFMPEG))
+        res["pyav_completo"] = _decodificar_arquivo(LeitorPyAV(arquivo))
+        leitor = LeitorPyAV(arquivo)
+        leitor.set_somente_keyframes(True)
+        res["pyav_keyframes"] = _decodificar_arquivo(leitor)
+
+        base = res["opencv"][1] or 1e-9
+        resultados[arquivo] = {
+            modo: {"frames": frames, "cpu_s": cpu, "cpu_relativa": cpu / base}
+            for modo, (frames, cpu) in res.items()
+        }
+    return resultados
+
+
+class CapturaRitmada:
+    """Envolve uma captura de arquivo: entrega frames no ritmo do FPS nominal e reinicia no fim."""
+    def __init__(self, abrir):
+        self.abrir = abrir
+        self.cap = abrir()
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0
+        self.intervalo = 1.0 / fps if fps and 1 <= fps <= 120 else 1.0 / 25
+        self.proximo = time.perf_counter()
+
+    def grab(self):
+        espera = self.proximo - time.perf_counter()
+        if espera > 0: time.sleep(espera)
+        self.proximo = max(self.proximo + self.intervalo, time.perf_counter() - self.intervalo)
+        if self.cap.grab(): return True
+        # Fim do arquivo: reabre para simular um stream contínuo
+        self.cap.release()
+        self.cap = self.abrir()
+        return self.cap.grab()
+
+    def __getattr__(self, nome):
+        return getattr(self.cap, nome)
+
+
+class HandlerArquivo(CameraHandler):
+    """CameraHandler que lê uma gravação local no lugar da câmera."""
+    def _abrir_captura(self, url=None):
+        return CapturaRitmada(functools.partial(super()._abrir_captura, url))
+
+
+class EntradaRitmada:
+    """Entrada PyAV de um arquivo que entrega pacotes no ritmo dos timestamps e recomeça no fim."""
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.container = av.open(arquivo)
+        self.streams = self.container.streams
+
+    def demux(self, stream):
+        deslocamento, inicio = 0, time.perf_counter()
+        while True:
+            ultimo = None
+            for pacote in self.container.demux(stream):
+                if pacote.dts is None: continue
+                # Timestamps crescem entre as voltas, como num stream ao vivo
+                atraso = float((pacote.dts + deslocamento) * stream.time_base) - (time.perf_counter() - inicio)
+                if atraso > 0: time.sleep(atraso)
+                ultimo = pacote.dts
+                pacote.dts += deslocamento
+                if pacote.pts is not None: pacote.pts += deslocamento
+                yield pacote
+            if ultimo is None: return
+            deslocamento += ultimo + 1
+            self.container.seek(0, stream=stream)
+
+    def close(self):
+        self.container.close()
+
+
+class GravadorArquivo(GravadorCamera):
+    """GravadorCamera que lê uma gravação local (ritmada e em loop) no lugar da câmera."""
+    def _abrir_entrada(self):
+        return EntradaRitmada(self.url)
+
+
+def _memoria_rss():
+    """RSS atual do processo em MB (psutil se disponível, senão /proc ou o pico via resource)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1e6
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except Exception: pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+    except Exception:
+        return None
+
+
+def _versao():
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def _percentil(valores, p):
+    if not valores: return None
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _executar_pipeline(fontes, modo, duracao, tela, tick_ms, miniaturas):
+    """Roda len(fontes) handlers e um consumidor no papel do loop de exibição (sem Tk)."""
+    n = len(fontes)
+    colunas = 1 if n == 1 else min(5, n)
+    linhas = (n + colunas - 1) // colunas
+    tamanho_slot = (max(16, tela[0] // colunas - 6), max(16, tela[1] // linhas - 6))
+
+    handlers = []
+    for i, url in enumerate(fontes):
+        h = HandlerArquivo(f"bench-{i}", url=url)
+        h.set_modo_miniatura(miniaturas)
+        if modo == "maximizado":
+            h.set_prioridade(i == 0)
+            h.set_visivel(i == 0)
+            h.set_tamanho_alvo(tela if i == 0 else tamanho_slot)
+        else:
+            h.set_tamanho_alvo(tamanho_slot)
+        handlers.append(h)
+
+    abertos = []
+    threads = [threading.Thread(target=lambda h=h: h.iniciar() and abertos.append(h)) for h in handlers]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    if not abertos:
+        raise SystemExit("Nenhuma fonte pôde ser aberta")
+
+    buffer = Image.new("RGB", tela, (0, 0, 0))
+    idades = {h: [] for h in abertos}
+    exibidos = {h: 0 for h in abertos}
+    tempos_tick = []
+    parar = threading.Event()
+
+    def consumidor():
+        while not parar.is_set():
+            t0 = time.perf_counter()
+            for i, h in enumerate(handlers):
+                if h not in idades or not h.visivel or not h.tem_frame_novo(): continue
+                idade = h.idade_frame()
+                img = h.pegar_frame()
+                if img is None: continue
+                if idade is not None: idades[h].append(idade * 1000.0)
+                exibidos[h] += 1
+                pos = (0, 0) if modo == "maximizado" else \
+                    ((i % colunas) * (tamanho_slot[0] + 6), (i // colunas) * (tamanho_slot[1] + 6))
+                buffer.paste(img, pos)
+            tempos_tick.append((time.perf_counter() - t0) * 1000.0)
+            parar.wait(tick_ms / 1000.0)
+
+    # Descarta o aquecimento (abertura, primeiro GOP) antes de medir
+    time.sleep(min(2.0, duracao / 4))
+    for h in abertos:
+        with h.lock:
+            for k in h.estatisticas: h.estatisticas[k] = type(h.estatisticas[k])()
+    t_consumidor = threading.Thread(target=consumidor, daemon=True)
+    rss_inicio = _memoria_rss()
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    t_consumidor.start()
+    time.sleep(duracao)
+    parar.set()
+    t_consumidor.join()
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - t0
+    rss = _memoria_rss()
+    for h in abertos: h.parar()
+    # Dá tempo às threads de leitura de saírem do grab e liberarem a captura
+    time.sleep(0.5)
+
+    por_stream = []
+    for h in abertos:
+        e = h.copiar_metricas()[0]
+        frames = e["frames"] or 1
+        por_stream.append({
+            "fonte": h.url,
+            "visivel": h.visivel,
+            "fps_decodificado": e["frames"] / wall,
+            "fps_exibido": exibidos[h] / wall,
+            "grabs_por_s": e["grabs"] / wall,
+            "descartados_fps": e["descartados_fps"],
+            "grab_ms": e["cpu_grab"] * 1000.0 / max(1, e["grabs"]),
+            "decode_ms": e["cpu_retrieve"] * 1000.0 / frames,
+            "resize_ms": e["tempo_resize"] * 1000.0 / max(1, e["saidas"]),
+            "conversao_ms": e["tempo_conversao"] * 1000.0 / max(1, e["saidas"]),
+            # Em regime (tamanho fixo) os buffers de saída são reaproveitados: ~0 alocações por segundo
+            "alocacoes_por_s": e["buffers_alocados"] / wall,
+            "mb_alocados_por_s": e["bytes_alocados"] / 1e6 / wall,
+            "idade_frame_ms_p50": _percentil(idades[h], 0.5),
+            "idade_frame_ms_p95": _percentil(idades[h], 0.95),
+        })
+
+    def media(campo):
+        # Streams ocultos (modo maximizado) ficam fora da média, que descreve o que chega à tela
+        valores = [s[campo] for s in por_stream if s["visivel"] and s[campo] is not None]
+        return sum(valores) / len(valores) if valores else None
+
+    return {
+        "streams": n,
+        "abertos": len(abertos),
+        "modo": modo,
+        "tamanho_slot": list(tamanho_slot),
+        "duracao_s": wall,
+        "cpu_percentual": 100.0 * cpu / wall,
+        "rss_mb_inicio": rss_inicio,
+        "rss_mb": rss,
+        "tick_ms_p50": _percentil(tempos_tick, 0.5),
+        "tick_ms_p95": _percentil(tempos_tick, 0.95),
+        "media": {campo: media(campo) for campo in ("fps_decodificado", "fps_exibido", "decode_ms", "resize_ms",
+                                                    "conversao_ms", "alocacoes_por_s", "idade_frame_ms_p50",
+                                                    "idade_frame_ms_p95")},
+        "por_stream": por_stream,
+    }
+
+
+def benchmark_pipeline(canais, streams, modos, duracao=10.0, tela=(1600, 900), tick_ms=50, miniaturas=False):
+    """Mede o pipeline completo para cada combinação canal (sub/main) x modo x nº de streams."""
+    cv2.setNumThreads(1)
+    resultado = {"versao": _versao(), "tick_ms": tick_ms, "tela": list(tela), "miniaturas": miniaturas,
+                 "cenarios": []}
+    for canal, arquivos in canais.items():
+        for modo in modos:
+            for n in streams:
+                fontes = [arquivos[i % len(arquivos)] for i in range(n)]
+                print(f"pipeline: canal={canal} modo={modo} streams={n}...")
+                cenario = _executar_pipeline(fontes, modo, duracao, tela, tick_ms, miniaturas)
+                cenario["canal"] = canal
+                resultado["cenarios"].append(cenario)
+    return resultado
+
+
+def benchmark_gravacao(sub, main, streams=20, duracao=10.0, tela=(1600, 900), tick_ms=50):
+    """Exibição com N streams do substream, sem e com N gravadores copiando o stream principal."""
+    if av is None:
+        raise SystemExit("O cenário de gravação requer PyAV")
+    cv2.setNumThreads(1)
+    fontes = [sub[i % len(sub)] for i in range(streams)]
+    resultado = {"versao": _versao(), "streams": streams, "tick_ms": tick_ms, "tela": list(tela)}
+
+    print(f"gravacao: {streams} streams sem gravação...")
+    resultado["sem_gravacao"] = _executar_pipeline(fontes, "grid", duracao, tela, tick_ms, False)
+
+    pasta = tempfile.mkdtemp(prefix="bench_gravacao_")
+    try:
+        print(f"gravacao: {streams} streams com {streams} gravadores...")
+        gravadores = [GravadorArquivo(main[i % len(main)], os.path.join(pasta, str(i)), duracao_segmento=5)
+                      for i in range(streams)]
+        cenario = _executar_pipeline(fontes, "grid", duracao, tela, tick_ms, False)
+        for g in gravadores: g.parar()
+        for g in gravadores: g.parar(aguardar=2.0)
+        cenario["gravacao"] = {campo: sum(g.estatisticas[campo] for g in gravadores)
+                               for campo in ("pacotes", "bytes", "descartados", "segmentos")}
+        cenario["gravacao"]["erros"] = [g.ultimo_erro for g in gravadores if g.ultimo_erro]
+        resultado["com_gravacao"] = cenario
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    base, grav = resultado["sem_gravacao"], resultado["com_gravacao"]
+    resultado["comparacao"] = {
+        "fps_exibido": [base["media"]["fps_exibido"], grav["media"]["fps_exibido"]],
+        "cpu_percentual": [base["cpu_percentual"], grav["cpu_percentual"]],
+        "cpu_gravacao_percentual": grav["cpu_percentual"] - base["cpu_percentual"],
+    }
+    return resultado
+
+
+class StubISAPI:
+    """Servidor HTTP local que imita o PTZ ISAPI (digest + keep-alive) e registra a ordem dos comandos."""
+    NONCE = "4e6f6e63652d7374756221"
+
+    def __init__(self, atraso=0.015):
+        self.recebidos = []
+        self.requisicoes = 0
+        self.conexoes = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Requisicao(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Cabeçalho e corpo saem em writes separados; sem isso o Nagle + ACK atrasado somam ~40 ms
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub.lock: stub.conexoes += 1
+
+            def do_PUT(self):
+                corpo = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+                # Tempo de processamento de um servidor HTTP embarcado
+                time.sleep(atraso)
+                with stub.lock: stub.requisicoes += 1
+                if f'nonce="{stub.NONCE}"' not in self.headers.get("Authorization", ""):
+                    self.send_response(401)
+                    self.send_header("WWW-Authenticate",
+                                     f'Digest realm="stub", qop="auth", nonce="{stub.NONCE}", algorithm=MD5')
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                pan = corpo.split("<pan>")[1].split("<")[0]
+                tilt = corpo.split("<tilt>")[1].split("<")[0]
+                with stub.lock: stub.recebidos.append("STOP" if pan == tilt == "0" else "MOVE")
+                resposta = b"<ResponseStatus><statusCode>1</statusCode></ResponseStatus>"
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(resposta)))
+                self.end_headers()
+                self.wfile.write(resposta)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Requisicao)
+        self.servidor.daemon_threads = True
+        self.porta = self.servidor.server_address[1]
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def encerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+def _ptz_caminho_antigo(url, latencias):
+    """Caminho anterior: uma thread e um requests.put (conexão e desafio digest novos) por comando."""
+    def enviar(direcao):
+        def tarefa():
+            t0 = time.perf_counter()
+            try: requests.put(url, data=ControlePTZ.xml(direcao),
+                              auth=HTTPDigestAuth("admin", "senha"), timeout=1)
+            except Exception: pass
+            latencias.append(time.perf_counter() - t0)
+        threading.Thread(target=tarefa, daemon=True).start()
+    return enviar
+
+
+def benchmark_ptz(toques=50, atraso=0.015, segurar=0.12, intervalo=0.08):
+    """Toques de direção (move, segura, STOP) contra o stub: latência, requisições e ordem na câmera.
+
+    Cada caminho usa um stub próprio e uma URL fixa. A ordem é medida pela sequência recebida:
+    um MOVE que não é seguido de STOP deixou a câmera girando (STOP chegou antes do movimento).
+    """
+    direcoes = ["UP", "DOWN", "LEFT", "RIGHT"]
+    resultado = {"versao": _versao(), "toques": toques, "atraso_servidor_ms": atraso * 1000.0,
+                 "segurar_ms": segurar * 1000.0, "caminhos": {}}
+    for caminho in ("antigo", "persistente"):
+        stub = StubISAPI(atraso)
+        url = f"http://127.0.0.1:{stub.porta}/ISAPI/PTZCtrl/channels/1/continuous"
+        latencias = []
+        controle = None
+        try:
+            if caminho == "antigo":
+                enviar = _ptz_caminho_antigo(url, latencias)
+            else:
+                controle = ControlePTZ("127.0.0.1", "admin", "senha", url=url)
+                controle.ao_enviar = lambda direcao, latencia, ok: latencias.append(latencia)
+                enviar = controle.enviar
+            print(f"ptz: caminho {caminho}...")
+            for toque in range(toques):
+                enviar(direcoes[toque % 4])
+                time.sleep(segurar)
+                enviar("STOP")
+                time.sleep(intervalo)
+            time.sleep(1.0)
+
+            with stub.lock: recebidos = list(stub.recebidos)
+            sem_stop = sum(1 for i, tipo in enumerate(recebidos)
+                           if tipo == "MOVE" and (i + 1 == len(recebidos) or recebidos[i + 1] != "STOP"))
+            resultado["caminhos"][caminho] = {
+                "comandos_aplicados": len(recebidos),
+                "requisicoes_http": stub.requisicoes,
+                "conexoes_tcp": stub.conexoes,
+                "movimentos_sem_stop": sem_stop,
+                "latencia_ms_p50": (_percentil(latencias, 0.5) or 0) * 1000.0,
+                "latencia_ms_p95": (_percentil(latencias, 0.95) or 0) * 1000.0,
+            }
+        finally:
+            if controle is not None: controle.parar()
+            stub.encerrar()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks da Central de Monitoramento")
+    sub = parser.add_subparsers(dest="cenario", required=True)
+
+    p_tk = sub.add_parser("tk", help="Tempo de Tk por tick: labels (CTkImage e PhotoImage.paste) vs. compositor")
+    p_tk.add_argument("--ticks", type=int, default=300)
+    p_tk.add_argument("--fps-camera", type=int, default=7)
+    p_tk.add_argument("--saida", default=None, help="Arquivo JSON de saída")
+
+    p_kf = sub.add_parser("keyframe", help="CPU de decodificação completa vs. apenas I-frames")
+    p_kf.add_argument("arquivos", nargs="+", help="Gravações H.264/H.265 de exemplo")
+    p_kf.add_argument("--saida", default=None, help="Arquivo JSON de saída")
+
+    p_pl = sub.add_parser("pipeline", help="Pipeline completo (handler + exibição) com N streams locais")
+    p_pl.add_argument("--sub", nargs="+", default=[], help="Gravações/URLs do substream (canal 102)")
+    p_pl.add_argument("--main", nargs="+", default=[], help="Gravações/URLs do stream principal (canal 101)")
+    p_pl.add_argument("--url", nargs="+", default=[], help="RTSP local de testes (tratado como substream)")
+    p_pl.add_argument("--streams", default="1,4,16,64", help="Quantidades de streams, separadas por vírgula")
+    p_pl.add_argument("--modos", default="grid,maximizado", help="grid e/ou maximizado")
+    p_pl.add_argument("--duracao", type=float, default=10.0, help="Segundos medidos por cenário")
+    p_pl.add_argument("--tick-ms", type=int, default=50, help="Intervalo do consumidor (loop de exibição)")
+    p_pl.add_argument("--miniaturas", action="store_true", help="Liga o modo miniatura (só I-frames)")
+    p_pl.add_argument("--saida", default=None, help="Arquivo JSON de saída")
+
+    p_gr = sub.add_parser("gravacao", help="FPS exibido e CPU sem e com gravação por cópia de stream")
+    p_gr.add_argument("--sub", nargs="+", required=True, help="Gravações do substream (exibição)")
+    p_gr.add_argument("--main", nargs="+", required=True, help="Gravações do stream principal (gravação)")
+    p_gr.add_argument("--streams", type=int, default=20)
+    p_gr.add_argument("--duracao", type=float, default=10.0, help="Segundos medidos por cenário")
+    p_gr.add_argument("--tick-ms", type=int, default=50, help="Intervalo do consumidor (loop de exibição)")
+    p_gr.add_argument("--saida", default=None, help="Arquivo JSON de saída")
+
+    p_ptz = sub.add_parser("ptz", help="Latência PTZ: thread+requests.put por comando vs. canal persistente")
+    p_ptz.add_argument("--toques", type=int, default=50, help="Toques de direção (move + STOP)")
+    p_ptz.add_argument("--atraso-ms", type=float, default=15.0, help="Tempo de resposta simulado da câmera")
+    p_ptz.add_argument("--segurar-ms", type=float, default=120.0, help="Tempo entre o movimento e o STOP")
+    p_ptz.add_argument("--saida", default=None, help="Arquivo JSON de saída")
+
+    args = parser.parse_args()
+    if args.cenario == "tk":
+        resultado = benchmark_tk(ticks=args.ticks, fps_camera=args.fps_camera)
+    elif args.cenario == "keyframe":
+        resultado = benchmark_keyframe(args.arquivos)
+    elif args.cenario == "pipeline":
+        canais = {}
+        if args.sub or args.url: canais["sub"] = args.sub + args.url
+        if args.main: canais["main"] = args.main
+        if not canais:
+            parser.error("informe ao menos um --sub, --main ou --url")
+        resultado = benchmark_pipeline(canais, [int(n) for n in args.streams.split(",") if n.strip()],
+                                       [m.strip() for m in args.modos.split(",") if m.strip()],
+                                       duracao=args.duracao, tick_ms=args.tick_ms, miniaturas=args.miniaturas)
+    elif args.cenario == "ptz":
+        resultado = benchmark_ptz(toques=args.toques, atraso=args.atraso_ms / 1000.0, segurar=args.segurar_ms / 1000.0)
+    elif args.cenario == "gravacao":
+        resultado = benchmark_gravacao(args.sub, args.main, streams=args.streams, duracao=args.duracao,
+                                       tick_ms=args.tick_ms)
+
+    texto = json.dumps(resultado, indent=4, ensure_ascii=False)
+    print(texto)
+    if args.saida:
+        with open(args.saida, "w", encoding='utf-8') as f:
+            f.write(texto)
+
+
+if __name__ == "__main__":
+    main()
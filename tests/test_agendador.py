@@ -0,0 +1,74 @@
+import threading
+from types import SimpleNamespace
+
+from Cameras import AgendadorConexoes, CentralMonitoramento
+
+
+def _agendador_bloqueado():
+    """Agendador de um worker, preso na primeira conexão até `liberar.set()`."""
+    ordem = []
+    liberar = threading.Event()
+    iniciou = threading.Event()
+    terminou = threading.Event()
+
+    def executar(ip, canal):
+        ordem.append(ip)
+        if ip == "bloqueio":
+            iniciou.set()
+            liberar.wait(5)
+        if ip == "fim": terminou.set()
+
+    agendador = AgendadorConexoes(executar, n_workers=1)
+    agendador.agendar("bloqueio", 102, 0)
+    assert iniciou.wait(5)
+    return agendador, ordem, liberar, terminou
+
+
+def _executar_fila(agendador, ordem, liberar, terminou):
+    agendador.agendar("fim", 102, 10 ** 6)
+    liberar.set()
+    assert terminou.wait(5)
+    agendador.parar()
+    return ordem[1:-1]
+
+
+def _central(grid, preaquecimento=()):
+    return SimpleNamespace(slot_maximized=None, slot_selecionado=None, janela_minimizada=False,
+                           grid_cameras=list(grid) + ["0.0.0.0"] * (20 - len(grid)),
+                           ips_preaquecimento=set(preaquecimento))
+
+
+def test_preaquecimento_continua_atras_do_grid_ao_reprioritizar():
+    central = _central(["a", "b"], preaquecimento=["p"])
+    prioridade = lambda ip: CentralMonitoramento._prioridade_conexao(central, ip)
+    assert prioridade("p") == 200 and prioridade("fora") == 100
+
+    agendador, ordem, liberar, terminou = _agendador_bloqueado()
+    agendador.agendar("p", 102, prioridade("p"))
+    agendador.agendar("fora", 102, prioridade("fora"))
+    agendador.agendar("b", 102, prioridade("b"))
+    agendador.reprioritizar(prioridade)
+    assert _executar_fila(agendador, ordem, liberar, terminou) == ["b", "fora", "p"]
+
+
+def test_ordem_por_prioridade_e_chegada():
+    agendador, ordem, liberar, terminou = _agendador_bloqueado()
+    agendador.agendar("visivel_3", 102, 5)
+    agendador.agendar("fora_a", 102, 100)
+    agendador.agendar("maximizado", 101, 0)
+    agendador.agendar("visivel_1", 102, 3)
+    agendador.agendar("fora_b", 102, 100)
+    # Mesmo IP de novo: atualiza a prioridade sem duplicar
+    agendador.agendar("fora_b", 102, 2)
+    agendador.agendar("cancelado", 102, 1)
+    assert agendador.cancelar("cancelado")
+    assert _executar_fila(agendador, ordem, liberar, terminou) == ["maximizado", "fora_b", "visivel_1",
+                                                                 "visivel_3", "fora_a"]
+    assert agendador.estatisticas["canceladas"] == 1
+
+
+def test_reprioritizar_mantem_a_chegada_nos_empates():
+    agendador, ordem, liberar, terminou = _agendador_bloqueado()
+    for ip in ("a", "b", "c", "d"): agendador.agendar(ip, 102, 100)
+    agendador.reprioritizar(lambda ip: 1 if ip == "c" else 100)
+    assert _executar_fila(agendador, ordem, liberar, terminou) == ["c", "a", "b", "d"]
@@ -0,0 +1,33 @@
+from Cameras import BackoffExponencial
+
+
+def test_proximo_limitado_apos_muitas_falhas():
+    backoff = BackoffExponencial(base=1.0, maximo=30.0)
+    for _ in range(1100):
+        atraso = backoff.proximo()
+        assert 0 < atraso <= 30.0
+    assert backoff.falhas > 0
+    backoff.resetar()
+    assert backoff.falhas == 0
+    assert backoff.proximo() <= 1.0
+
+
+def test_dobra_ate_o_teto_e_para_de_contar():
+    backoff = BackoffExponencial(base=1.0, maximo=30.0)
+    for falhas in range(5):
+        # Equal jitter: entre metade e o total de base * 2^falhas
+        esperado = 2.0 ** falhas
+        assert esperado / 2 <= backoff.proximo() <= esperado
+    for _ in range(50):
+        assert 15.0 <= backoff.proximo() <= 30.0
+    # O expoente fica parado no teto (sem OverflowError depois de milhares de falhas)
+    assert backoff.falhas == 5
+
+
+def test_resetar_volta_ao_atraso_base():
+    backoff = BackoffExponencial(base=5.0, maximo=120.0)
+    for _ in range(20): backoff.proximo()
+    backoff.resetar()
+    assert backoff.falhas == 0
+    assert 2.5 <= backoff.proximo() <= 5.0
+    assert 5.0 <= backoff.proximo() <= 10.0
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from Cameras import BackoffExponencial, GravadorCamera
+
+
+class _Fila:
+    """Fila do disco com tamanho controlado pelo teste."""
+    def __init__(self):
+        self.tamanho = 0
+        self.itens = []
+
+    def qsize(self):
+        return self.tamanho
+
+    def put(self, item):
+        self.itens.append(item)
+
+
+class _Saida:
+    def mux(self, pacote):
+        pass
+
+
+def _gravador(fila):
+    gravador = GravadorCamera.__new__(GravadorCamera)
+    gravador.url = gravador.nome = "rtsp://teste"
+    gravador.duracao_segmento = 3600
+    gravador.max_blocos_pendentes = 100
+    gravador.min_blocos_pendentes = 25
+    gravador.fila_disco = fila
+    gravador.rodando = True
+    gravador.backoff = BackoffExponencial()
+    gravador.estatisticas = {"pacotes": 0, "bytes": 0, "descartados": 0, "segmentos": 0, "removidos": 0}
+    gravador.abertos = []
+    gravador.fechados = []
+
+    def abrir(stream, agora):
+        segmento = (f"seg{len(gravador.abertos)}", _Saida(), stream)
+        gravador.abertos.append(segmento[0])
+        return segmento
+
+    gravador._abrir_segmento = abrir
+    gravador._fechar_segmento = lambda segmento: gravador.fechados.append(segmento[0])
+    return gravador
+
+
+def test_fila_atrasada_nao_abre_segmentos_vazios():
+    fila = _Fila()
+    gravador = _gravador(fila)
+    # Tamanho da fila antes de cada pacote; I-frame a cada 5 pacotes
+    tamanhos = [0] * 5 + [150] * 20 + [60] * 10 + [20] * 10
+
+    def demux(stream):
+        for n, tamanho in enumerate(tamanhos):
+            fila.tamanho = tamanho
+            yield SimpleNamespace(dts=n, pts=n, size=10, is_keyframe=n % 5 == 0, stream=None)
+        gravador.rodando = False
+
+    entrada = SimpleNamespace(streams=SimpleNamespace(video=["video"]), demux=demux, close=lambda: None)
+    gravador._abrir_entrada = lambda: entrada
+    gravador._loop_rede()
+
+    # Um segmento antes do atraso e outro só depois que a fila baixou ao mínimo (pacote 35)
+    assert gravador.abertos == ["seg0", "seg1"]
+    assert gravador.fechados == ["seg0", "seg1"]
+    assert gravador.estatisticas["descartados"] == 30
+    assert gravador.estatisticas["pacotes"] == 15
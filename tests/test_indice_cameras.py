@@ -0,0 +1,48 @@
+import random
+
+from Cameras import IndiceCameras
+
+
+def _busca_linear(ips, nomes, termo):
+    """Filtragem original: substring no nome real ou no IP, na ordem de exibição da lista."""
+    termo = termo.lower()
+    ordem = sorted(ips, key=lambda ip: (nomes.get(ip, f"IP {ip}").lower(), ip))
+    return [ip for ip in ordem if termo in ip or termo in (nomes.get(ip) or "").lower()]
+
+
+def test_busca_igual_a_varredura_linear():
+    aleatorio = random.Random(7)
+    palavras = ["Portão", "Garagem", "Recepção", "Doca", "Corredor", "Pátio", "Sala", "IP"]
+    ips = [f"192.168.{aleatorio.randint(0, 3)}.{n}" for n in range(1, 400)]
+    ips = list(dict.fromkeys(ips))
+    nomes = {}
+    for ip in ips:
+        if aleatorio.random() < 0.8:
+            nomes[ip] = " ".join(aleatorio.sample(palavras, 2)) + f" {aleatorio.randint(1, 30)}"
+
+    indice = IndiceCameras()
+    indice.reconstruir(ips, nomes)
+    # Alterações incrementais: renomeia, inclui e remove
+    for ip in aleatorio.sample(ips, 40):
+        nomes[ip] = aleatorio.choice(palavras) + " nova"
+        indice.adicionar(ip, nomes[ip])
+    for n in range(20):
+        ip = f"10.0.0.{n}"
+        ips.append(ip)
+        indice.adicionar(ip, nomes.get(ip))
+    for ip in aleatorio.sample(ips, 30):
+        ips.remove(ip)
+        nomes.pop(ip, None)
+        indice.remover(ip)
+
+    termos = ["", "p", "ip", "IP 1", "192", "168.2", ".1", "1", "porta", "ão ", "sala 1", "nova", "doca 2",
+              "garagem corredor", "xyz", "10.0.0.1", "a\nb"]
+    for termo in termos:
+        assert indice.buscar(termo) == _busca_linear(ips, nomes, termo), termo
+
+
+def test_camera_sem_nome_nao_casa_com_o_rotulo_ip():
+    indice = IndiceCameras()
+    indice.reconstruir(["10.0.0.5", "10.0.0.6"], {"10.0.0.6": "IP externo"})
+    assert indice.buscar("ip") == ["10.0.0.6"]
+    assert indice.buscar("10.0.0") == ["10.0.0.5", "10.0.0.6"]
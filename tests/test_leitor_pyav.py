@@ -0,0 +1,93 @@
+from Cameras import CameraHandler, LeitorPyAV
+
+
+class _Pacote:
+    def __init__(self, indice, keyframe):
+        self.indice = indice
+        self.is_keyframe = keyframe
+        self.size = 100
+
+
+class _Codec:
+    skip_frame = "DEFAULT"
+
+    def decode(self, pacote):
+        return [("frame", pacote.indice)] if pacote is not None else []
+
+    def flush_buffers(self):
+        pass
+
+
+class _Stream:
+    codec_context = _Codec()
+
+
+def _leitor(pacotes):
+    leitor = LeitorPyAV.__new__(LeitorPyAV)
+    leitor.container = object()
+    leitor.stream = _Stream()
+    leitor.pacotes = pacotes
+    leitor.frame = None
+    leitor.somente_keyframes = True
+    leitor.aguardando_keyframe = False
+    leitor.intervalo_keyframes = 0.0
+    leitor.ultimo_keyframe = None
+    leitor.anel = None
+    leitor.acordar_pedido = False
+    return leitor
+
+
+def _fonte_gop(gop, consumidos, ao_consumir=None):
+    """I-frame a cada `gop` pacotes; chama ao_consumir(n) após cada pacote entregue."""
+    n = 0
+    while True:
+        yield _Pacote(n, n % gop == 0)
+        consumidos.append(n)
+        n += 1
+        if ao_consumir: ao_consumir(n)
+
+
+def test_retomada_nao_espera_o_proximo_keyframe():
+    consumidos = []
+    leitor = None
+
+    def ao_consumir(n):
+        # set_visivel(True) chega da interface poucos pacotes depois do primeiro I-frame
+        if n == 5: leitor.acordar()
+
+    leitor = _leitor(_fonte_gop(50, consumidos, ao_consumir))
+    assert leitor.grab()
+    assert leitor.frame == ("frame", 0)
+
+    assert leitor.grab()
+    # Devolveu o último I-frame sem consumir o GOP inteiro até o pacote 50
+    assert leitor.frame == ("frame", 0)
+    assert len(consumidos) < 10
+    assert not leitor.acordar_pedido
+
+
+def test_sem_acordar_espera_o_proximo_keyframe():
+    consumidos = []
+    leitor = _leitor(_fonte_gop(50, consumidos))
+    assert leitor.grab()
+    assert leitor.grab()
+    assert leitor.frame == ("frame", 50)
+
+
+def test_acordar_sem_frame_decodificado_nao_retorna_vazio():
+    leitor = _leitor(_fonte_gop(50, []))
+    leitor.acordar()
+    assert leitor.grab()
+    assert leitor.frame == ("frame", 0)
+
+
+def test_set_visivel_e_novo_consumidor_acordam_o_leitor():
+    handler = CameraHandler("10.0.0.1")
+    handler.cap = _leitor(iter(()))
+    handler.set_visivel(False)
+    handler.set_visivel(True)
+    assert handler.cap.acordar_pedido and handler.forcar_frame
+
+    handler.cap.acordar_pedido = False
+    handler.registrar_consumidor(3, (320, 180))
+    assert handler.cap.acordar_pedido
@@ -0,0 +1,28 @@
+import threading
+
+from Cameras import CameraHandler, formatar_metricas
+
+
+def test_metricas_vem_de_uma_copia_feita_sob_o_lock():
+    handler = CameraHandler("10.0.0.1")
+    handler.estatisticas["frames"] = 5
+    handler.histogramas["resize"].observar(0.002)
+
+    estatisticas, histogramas = handler.copiar_metricas()
+    handler.estatisticas["frames"] += 1
+    handler.histogramas["resize"].observar(0.002)
+    assert estatisticas["frames"] == 5 and histogramas["resize"].total == 1
+
+    # Com o lock em mãos (thread de leitura no meio de uma atualização) o /metrics espera
+    handler.lock.acquire()
+    try:
+        resultado = []
+        leitor = threading.Thread(target=lambda: resultado.append(formatar_metricas({"10.0.0.1": handler}, {})))
+        leitor.start()
+        leitor.join(0.2)
+        assert leitor.is_alive()
+        handler.estatisticas["frames"] = 7
+    finally:
+        handler.lock.release()
+    leitor.join(5)
+    assert 'central_camera_frames_total{ip="10.0.0.1",canal="102"} 7' in resultado[0]
@@ -0,0 +1,44 @@
+import json
+import threading
+
+from Cameras import PersistenciaAdiada
+
+
+def test_rajada_grava_so_o_ultimo_estado(tmp_path):
+    caminho = str(tmp_path / "config.json")
+    persistencia = PersistenciaAdiada(atraso=60.0, atraso_max=60.0)
+    for versao in range(5): persistencia.agendar(caminho, {"versao": versao})
+    persistencia.parar()
+    with open(caminho, encoding="utf-8") as f: assert json.load(f) == {"versao": 4}
+    assert persistencia.estatisticas == {"agendados": 5, "gravados": 1, "erros": 0}
+
+
+def test_descarregar_nao_e_sobrescrito_por_instantaneo_antigo(tmp_path, monkeypatch):
+    caminho = str(tmp_path / "grid.json")
+    gravando = threading.Event()
+    continuar = threading.Event()
+    gravados = []
+    original = PersistenciaAdiada.gravar_atomico
+
+    def gravar_lento(caminho, texto):
+        if not gravados:
+            # A thread da persistência para no meio da gravação da versão antiga
+            gravando.set()
+            continuar.wait(5)
+        gravados.append(json.loads(texto)["versao"])
+        original(caminho, texto)
+
+    monkeypatch.setattr(PersistenciaAdiada, "gravar_atomico", staticmethod(gravar_lento))
+    persistencia = PersistenciaAdiada(atraso=0.0, atraso_max=0.0)
+    persistencia.agendar(caminho, {"versao": 1})
+    assert gravando.wait(5)
+
+    # Encerramento com uma versão mais nova pendente enquanto a antiga ainda está sendo gravada
+    persistencia.agendar(caminho, {"versao": 2})
+    encerramento = threading.Thread(target=persistencia.parar)
+    encerramento.start()
+    continuar.set()
+    encerramento.join(5)
+
+    assert gravados == [1, 2]
+    with open(caminho, encoding="utf-8") as f: assert json.load(f) == {"versao": 2}
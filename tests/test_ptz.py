@@ -0,0 +1,44 @@
+import threading
+import time
+
+from Cameras import ControlePTZ
+
+_XMLS = {ControlePTZ.xml(direcao): direcao for direcao in ControlePTZ.VETORES}
+
+
+class _Sessao:
+    """Session falsa: registra a direção de cada PUT e segura o primeiro até `liberar`."""
+    def __init__(self):
+        self.enviados = []
+        self.primeiro = threading.Event()
+        self.liberar = threading.Event()
+
+    def put(self, url, data, timeout):
+        if not self.enviados:
+            self.primeiro.set()
+            self.liberar.wait(5)
+        self.enviados.append(_XMLS[data])
+        return type("Resposta", (), {"ok": True, "status_code": 200})()
+
+    def close(self):
+        pass
+
+
+def test_stop_nunca_passa_a_frente_do_movimento():
+    controle = ControlePTZ("10.0.0.1", "admin", "senha")
+    sessao = controle.sessao = _Sessao()
+    controle.enviar("UP")
+    assert sessao.primeiro.wait(5)
+
+    # Com o UP ainda na rede: movimentos pendentes coalescem e STOPs seguidos viram um só
+    for direcao in ("LEFT", "RIGHT", "STOP", "STOP", "DOWN", "STOP", "UP"):
+        controle.enviar(direcao)
+    sessao.liberar.set()
+
+    esperado = ["UP", "RIGHT", "STOP", "DOWN", "STOP", "UP"]
+    limite = time.monotonic() + 5
+    while len(sessao.enviados) < len(esperado) and time.monotonic() < limite:
+        time.sleep(0.01)
+    controle.parar()
+    assert sessao.enviados == esperado
+    assert controle.estatisticas["coalescidos"] == 2
@@ -0,0 +1,49 @@
+import threading
+
+from Cameras import SinalizadorFrames
+
+
+class _Widget:
+    """Simula o after() do Tk: o teste roda os callbacks agendados na própria thread."""
+    def __init__(self):
+        self.agendados = []
+
+    def after(self, ms, callback):
+        self.agendados.append(callback)
+        return len(self.agendados)
+
+    def after_cancel(self, ident):
+        pass
+
+    def rodar(self):
+        agendados, self.agendados = self.agendados, []
+        for callback in agendados: callback()
+
+
+def test_sinal_de_outra_thread_so_chama_a_ui_no_poll():
+    widget = _Widget()
+    chamadas = []
+    sinalizador = SinalizadorFrames(widget, lambda: chamadas.append(threading.current_thread()))
+
+    threads = [threading.Thread(target=sinalizador.sinalizar) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert chamadas == []
+
+    widget.rodar()
+    widget.rodar()
+    # Vários sinais viram um único pedido de tick, na thread que roda o after()
+    assert chamadas == [threading.current_thread()]
+
+    sinalizador.limpar()
+    widget.rodar()
+    assert len(chamadas) == 1
+    sinalizador.sinalizar()
+    widget.rodar()
+    assert len(chamadas) == 2
+
+    sinalizador.parar()
+    sinalizador.limpar()
+    sinalizador.sinalizar()
+    widget.rodar()
+    assert len(chamadas) == 2 and widget.agendados == []